@@ -29,6 +29,8 @@ from apps.utils.local import get_request
 from apps.utils.time_handler import timestamp_to_datetime
 from .exception import DataAPIException
 from .utils.params import add_esb_info_before_request
+from .utils.rate_limit import rate_limiter
+from .utils.session import session_manager
 
 logger = logging.getLogger("component")
 
@@ -94,6 +96,8 @@ class DataAPI(object):
         cache_time=0,
         default_timeout=30,
         max_retry_times=3,
+        rate_limit=0,
+        biz_rate_limit=0,
     ):
         """
         初始化一个请求句柄
@@ -111,6 +115,8 @@ class DataAPI(object):
         @param {array.<string>} url_keys 请求地址中存在未赋值的 KEYS
         @param {int} cache_time 缓存时间
         @param {int} default_timeout 默认超时时间
+        @param {int} rate_limit 该 API 的每秒请求预算，0 表示不限速
+        @param {int} biz_rate_limit 单个业务下该 API 的每秒请求预算，0 表示不限速
         """
         self.url = url
         self.module = module
@@ -133,6 +139,9 @@ class DataAPI(object):
         self.default_timeout = default_timeout
         self.max_retry_times = max_retry_times
 
+        self.rate_limit = rate_limit
+        self.biz_rate_limit = biz_rate_limit
+
     def __call__(
         self,
         params=None,
@@ -164,6 +173,20 @@ class DataAPI(object):
             if raw:
                 return response.response
 
+            # 触发 ESB 频率限制，令牌桶冷却后重试
+            if self.is_rate_limit_exceeded(response) and current_retry_times + 1 < self.max_retry_times:
+                rate_limiter.penalize(self.url, self.rate_limit, self.biz_rate_limit, params.get("bk_biz_id"))
+                return self.__call__(
+                    params=params,
+                    data=data,
+                    raw=raw,
+                    timeout=timeout,
+                    raise_exception=raise_exception,
+                    use_admin=use_admin,
+                    headers=headers,
+                    current_retry_times=current_retry_times + 1,
+                )
+
             # 统一处理返回内容，根据平台既定规则，断定成功与否
             if raise_exception and not response.is_success():
                 raise ApiResultError(
@@ -192,6 +215,14 @@ class DataAPI(object):
             logger.exception(f"{error.error_message}, url => {self.url}, params => {params}, headers => {headers}")
             raise ApiRequestError(error.error_message, self.request_id)
 
+    def is_rate_limit_exceeded(self, response: DataResponse) -> bool:
+        if not (self.rate_limit or self.biz_rate_limit) or response.is_success():
+            return False
+        # 模块间存在循环引用，在调用时导入
+        from .modules.esb import _ESBApi
+
+        return response.code in _ESBApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST
+
     def get_error_message(self, error_message):
         url_path = ""
         try:
@@ -234,6 +265,10 @@ class DataAPI(object):
         response = None
         error_message = ""
 
+        # 按令牌桶预算限速，等待时间不计入请求耗时
+        if self.rate_limit or self.biz_rate_limit:
+            rate_limiter.acquire(self.url, self.rate_limit, self.biz_rate_limit, params.get("bk_biz_id"))
+
         # 发送请求
         # 开始时记录请求时间
         start_time = time.time()
@@ -368,10 +403,11 @@ class DataAPI(object):
         @return: requests response
         """
 
+        # 共享连接池会话，请求级的 headers/cookies 通过参数传入，不修改会话状态
+        session = session_manager.session
+        request_headers = dict(headers)
         # 增加request id
-        session = requests.session()
-        session.headers.update(headers)
-        session.headers.update(
+        request_headers.update(
             {
                 "X-Bkapi-Request-Id": self.request_id,
                 "X-Bkapi-App-Code": params.get("bk_app_code"),
@@ -387,28 +423,28 @@ class DataAPI(object):
         except AppBaseException:
             local_request = None
 
+        cookies = None
         if local_request and local_request.COOKIES and not use_admin:
-            session.cookies.update(local_request.COOKIES)
+            cookies = local_request.COOKIES
 
         # headers 申明重载请求方法
         if self.method_override is not None:
-            session.headers.update({"X-METHOD-OVERRIDE": self.method_override})
+            request_headers.update({"X-METHOD-OVERRIDE": self.method_override})
 
         url = self.build_actual_url(params)
         # 发出请求并返回结果
         non_file_data, file_data = self._split_file_data(params)
         request_method = self.method.upper()
+        request_kwargs = {"headers": request_headers, "cookies": cookies, "verify": False, "timeout": self.timeout}
 
         if request_method == "GET":
-            result = session.request(method=self.method, url=url, params=params, verify=False, timeout=self.timeout)
+            result = session.request(method=self.method, url=url, params=params, **request_kwargs)
         elif request_method == "DELETE":
-            session.headers.update({"Content-Type": "application/json; charset=utf-8"})
-            result = session.request(
-                method=self.method, url=url, data=json.dumps(non_file_data), verify=False, timeout=self.timeout
-            )
+            request_headers.update({"Content-Type": "application/json; charset=utf-8"})
+            result = session.request(method=self.method, url=url, data=json.dumps(non_file_data), **request_kwargs)
         elif request_method in ["PUT", "PATCH", "POST"]:
             if not file_data:
-                session.headers.update({"Content-Type": "application/json; charset=utf-8"})
+                request_headers.update({"Content-Type": "application/json; charset=utf-8"})
                 params = json.dumps(non_file_data)
             else:
                 params = non_file_data
@@ -416,11 +452,9 @@ class DataAPI(object):
             # PUT 方法上传文件时，data需作为
             if request_method == "PUT" and file_data:
                 data = list(file_data.values())[0]
-                result = session.request(method=self.method, url=url, data=data, verify=False, timeout=self.timeout)
+                result = session.request(method=self.method, url=url, data=data, **request_kwargs)
             else:
-                result = session.request(
-                    method=self.method, url=url, data=params, files=file_data, verify=False, timeout=self.timeout
-                )
+                result = session.request(method=self.method, url=url, data=params, files=file_data, **request_kwargs)
         else:
             raise ApiRequestError("异常请求方式，{method}".format(method=self.method))
 
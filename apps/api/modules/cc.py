@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from ..base import BaseApi, DataAPI
@@ -161,6 +162,12 @@ class _CCApi(BaseApi):
             module=self.MODULE,
             description="获取主机与拓扑的关系",
         )
+        self.find_host_biz_relations = DataAPI(
+            method="POST",
+            url=CC_APIGATEWAY_ROOT + "find_host_biz_relations/",
+            module=self.MODULE,
+            description="查询主机业务关系信息",
+        )
         self.delete_process_instance = DataAPI(
             method="POST",
             url=CC_APIGATEWAY_ROOT + "delete_process_instance/",
@@ -175,6 +182,7 @@ class _CCApi(BaseApi):
             url=CC_APIGATEWAY_ROOT + "list_service_template_difference/",
             module=self.MODULE,
             description="列出服务模版和服务实例之间的差异",
+            rate_limit=settings.CC_SERVICE_TEMPLATE_DIFFERENCE_RATE_LIMIT,
         )
         self.resource_watch = DataAPI(
             method="POST", url=CC_APIGATEWAY_ROOT + "resource_watch/", module=self.MODULE, description="监听资源变化事件",
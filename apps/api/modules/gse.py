@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from ..base import BaseApi, DataAPI
@@ -19,21 +20,42 @@ class _GseApi(BaseApi):
     MODULE = _("管控平台")
 
     def __init__(self):
+        rate_limit_kwargs = {
+            "rate_limit": settings.GSE_API_RATE_LIMIT,
+            "biz_rate_limit": settings.GSE_API_BIZ_RATE_LIMIT,
+        }
         self.operate_proc = DataAPI(
-            method="POST", url=GSE_APIGATEWAY_ROOT + "operate_proc_v2/", module=self.MODULE, description="进程操作",
+            method="POST",
+            url=GSE_APIGATEWAY_ROOT + "operate_proc_v2/",
+            module=self.MODULE,
+            description="进程操作",
+            **rate_limit_kwargs,
         )
         self.operate_proc_multi = DataAPI(
-            method="POST", url=GSE_APIGATEWAY_ROOT + "operate_proc_multi/", module=self.MODULE, description="批量进程操作",
+            method="POST",
+            url=GSE_APIGATEWAY_ROOT + "operate_proc_multi/",
+            module=self.MODULE,
+            description="批量进程操作",
+            **rate_limit_kwargs,
         )
         self.get_proc_operate_result = DataAPI(
             method="POST",
             url=GSE_APIGATEWAY_ROOT + "get_proc_operate_result_v2/",
             module=self.MODULE,
             description="查询进程操作结果",
+            **rate_limit_kwargs,
         )
         self.get_proc_status = DataAPI(
-            method="POST", url=GSE_APIGATEWAY_ROOT + "get_proc_status_v2/", module=self.MODULE, description="查询进程状态信息",
+            method="POST",
+            url=GSE_APIGATEWAY_ROOT + "get_proc_status_v2/",
+            module=self.MODULE,
+            description="查询进程状态信息",
+            **rate_limit_kwargs,
         )
         self.sync_proc_status = DataAPI(
-            method="POST", url=GSE_APIGATEWAY_ROOT + "sync_proc_status/", module=self.MODULE, description="同步进程状态信息",
+            method="POST",
+            url=GSE_APIGATEWAY_ROOT + "sync_proc_status/",
+            module=self.MODULE,
+            description="同步进程状态信息",
+            **rate_limit_kwargs,
         )
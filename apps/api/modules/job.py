@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from ..base import BaseApi, DataAPI
@@ -19,27 +20,42 @@ class _JobApi(BaseApi):
     MODULE = _("作业平台")
 
     def __init__(self):
+        rate_limit_kwargs = {
+            "rate_limit": settings.JOB_API_RATE_LIMIT,
+            "biz_rate_limit": settings.JOB_API_BIZ_RATE_LIMIT,
+        }
         self.fast_execute_script = DataAPI(
             method="POST",
             url=JOB_APIGATEWAY_ROOT_V3 + "fast_execute_script/",
             module=self.MODULE,
             description="快速执行脚本",
+            **rate_limit_kwargs,
         )
         self.fast_transfer_file = DataAPI(
-            method="POST", url=JOB_APIGATEWAY_ROOT_V3 + "fast_transfer_file/", module=self.MODULE, description="快速分发文件",
+            method="POST",
+            url=JOB_APIGATEWAY_ROOT_V3 + "fast_transfer_file/",
+            module=self.MODULE,
+            description="快速分发文件",
+            **rate_limit_kwargs,
         )
         self.push_config_file = DataAPI(
-            method="POST", url=JOB_APIGATEWAY_ROOT_V3 + "push_config_file/", module=self.MODULE, description="快速分发配置",
+            method="POST",
+            url=JOB_APIGATEWAY_ROOT_V3 + "push_config_file/",
+            module=self.MODULE,
+            description="快速分发配置",
+            **rate_limit_kwargs,
         )
         self.get_job_instance_status = DataAPI(
             method="GET",
             url=JOB_APIGATEWAY_ROOT_V3 + "get_job_instance_status/",
             module=self.MODULE,
             description="查询作业执行状态",
+            **rate_limit_kwargs,
         )
         self.get_job_instance_ip_log = DataAPI(
             method="GET",
             url=JOB_APIGATEWAY_ROOT_V3 + "get_job_instance_ip_log/",
             module=self.MODULE,
             description="根据作业实例ID查询作业执行日志",
+            **rate_limit_kwargs,
         )
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.prometheus.models import api_rate_limit_waits
+
+logger = logging.getLogger("component")
+
+
+class RateLimitBackend(object):
+    LOCAL = "local"
+    CACHE = "cache"
+
+
+class LocalTokenBucket(object):
+    """
+    进程内令牌桶，令牌按 rate 匀速补充，桶容量为 1 秒的预算
+    """
+
+    def __init__(self, key: str, rate: int):
+        self.key = key
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self.cooldown_until = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """尝试获取一个令牌，返回还需等待的秒数，0 表示已获取"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.cooldown_until:
+                return self.cooldown_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def penalize(self, seconds: float):
+        """触发平台频率限制，清空令牌并冷却一段时间"""
+        with self._lock:
+            self.tokens = 0
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+
+class CacheTokenBucket(object):
+    """
+    基于 Django 缓存的跨 worker 令牌桶，以秒为窗口分配预算
+    依赖缓存 incr 的原子性，仅在缓存后端为 Redis 时启用
+    """
+
+    WINDOW_TIMEOUT = 2
+
+    def __init__(self, key: str, rate: int):
+        self.key = key
+        self.rate = rate
+        digest = hashlib.md5(key.encode()).hexdigest()
+        self.cache_key_prefix = f"gsekit:rate_limit:{digest}"
+        self.cooldown_cache_key = f"{self.cache_key_prefix}:cooldown"
+
+    def try_acquire(self) -> float:
+        now = time.time()
+        window = int(now)
+        window_cache_key = f"{self.cache_key_prefix}:{window}"
+        values = cache.get_many([self.cooldown_cache_key, window_cache_key])
+
+        cooldown_until = values.get(self.cooldown_cache_key) or 0
+        if now < cooldown_until:
+            return cooldown_until - now
+        if values.get(window_cache_key, 0) >= self.rate:
+            return window + 1 - now
+
+        cache.add(window_cache_key, 0, self.WINDOW_TIMEOUT)
+        try:
+            count = cache.incr(window_cache_key)
+        except ValueError:
+            # 窗口已过期，下一窗口重新分配
+            return window + 1 - now
+        if count > self.rate:
+            return window + 1 - now
+        return 0
+
+    def penalize(self, seconds: float):
+        cache.set(self.cooldown_cache_key, time.time() + seconds, int(seconds) + 1)
+
+    @staticmethod
+    def is_supported() -> bool:
+        """数据库等缓存后端的 incr 非原子操作，且每次获取令牌都会增加读写及淘汰开销"""
+        return "redis" in settings.CACHES["default"]["BACKEND"].lower()
+
+
+class RateLimiter(object):
+    """
+    组件 API 令牌桶调度器
+    - 单个 API 与单个业务下的单个 API 各有一个令牌桶，请求需依次获取两者的令牌
+    - 令牌不足时仅等待至下一个令牌可用，使吞吐维持在预算上限，而不是在过载与空等之间来回震荡
+    - 触发平台频率限制时，对应令牌桶进入冷却，同一 API 的全部并发请求一起退避
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, int], Union[LocalTokenBucket, CacheTokenBucket]] = {}
+        if hasattr(os, "register_at_fork"):
+            # 子进程不能继承父进程的锁及令牌状态
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def get_bucket(self, key: str, rate: int):
+        bucket_key = (key, rate)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(bucket_key)
+                if bucket is None:
+                    if settings.API_RATE_LIMIT_BACKEND == RateLimitBackend.CACHE and CacheTokenBucket.is_supported():
+                        bucket = CacheTokenBucket(key, rate)
+                    else:
+                        bucket = LocalTokenBucket(key, rate)
+                    self._buckets[bucket_key] = bucket
+        return bucket
+
+    def get_buckets(self, api_key: str, rate_limit: int, biz_rate_limit: int, bk_biz_id: Optional[int] = None) -> List:
+        buckets = []
+        if biz_rate_limit and bk_biz_id:
+            buckets.append(self.get_bucket(f"{api_key}:biz:{bk_biz_id}", biz_rate_limit))
+        if rate_limit:
+            buckets.append(self.get_bucket(api_key, rate_limit))
+        return buckets
+
+    def acquire(self, api_key: str, rate_limit: int, biz_rate_limit: int, bk_biz_id: Optional[int] = None) -> float:
+        """
+        阻塞至获取令牌，返回等待时长
+        等待超过 API_RATE_LIMIT_MAX_WAIT 后直接放行，由平台侧的频率限制兜底
+        """
+        begin_time = time.monotonic()
+        deadline = begin_time + settings.API_RATE_LIMIT_MAX_WAIT
+        is_throttled = False
+        for bucket in self.get_buckets(api_key, rate_limit, biz_rate_limit, bk_biz_id):
+            while True:
+                wait_seconds = bucket.try_acquire()
+                if not wait_seconds:
+                    break
+                if time.monotonic() + wait_seconds > deadline:
+                    logger.warning(f"[RateLimiter] wait for token of {bucket.key} timeout, skip rate limit")
+                    return time.monotonic() - begin_time
+                is_throttled = True
+                time.sleep(wait_seconds)
+
+        if is_throttled:
+            api_rate_limit_waits.labels(api_key).inc()
+        return time.monotonic() - begin_time
+
+    def penalize(self, api_key: str, rate_limit: int, biz_rate_limit: int, bk_biz_id: Optional[int] = None):
+        for bucket in self.get_buckets(api_key, rate_limit, biz_rate_limit, bk_biz_id):
+            bucket.penalize(settings.API_RATE_LIMIT_COOLDOWN)
+
+
+rate_limiter = RateLimiter()
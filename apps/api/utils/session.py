@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from apps.prometheus.models import api_http_new_connections, api_http_requests
+
+
+class MetricHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        api_http_new_connections.labels(self.host).inc()
+        return super()._new_conn()
+
+
+class MetricHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        api_http_new_connections.labels(self.host).inc()
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    连接池适配器，按 host 记录请求数及新建连接数，两者之差即为连接复用次数
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": MetricHTTPConnectionPool,
+            "https": MetricHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        api_http_requests.labels(requests.utils.urlparse(request.url).hostname).inc()
+        return super().send(request, *args, **kwargs)
+
+
+class SessionManager(object):
+    """
+    进程内共享的 keep-alive 会话
+    - 连接池线程安全，batch_request 等多线程场景共享同一组长连接，避免每次请求重新握手
+    - 会话不保存 headers/cookies 等状态，请求级参数需通过 request 传入
+    - 仅对连接失败及幂等请求的网关错误进行重试，避免重复提交非幂等请求
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        if hasattr(os, "register_at_fork"):
+            # 子进程不能复用父进程的 socket
+            os.register_at_fork(after_in_child=self.reset)
+
+    @staticmethod
+    def build_session() -> requests.Session:
+        retry = Retry(
+            total=settings.API_HTTP_MAX_RETRIES,
+            connect=settings.API_HTTP_MAX_RETRIES,
+            read=0,
+            status=settings.API_HTTP_MAX_RETRIES,
+            backoff_factor=settings.API_HTTP_RETRY_BACKOFF_FACTOR,
+            status_forcelist=(502, 503, 504),
+            method_whitelist=frozenset(["GET", "HEAD", "OPTIONS"]),
+            raise_on_status=False,
+        )
+        adapter = PooledHTTPAdapter(
+            pool_connections=settings.API_HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.API_HTTP_POOL_MAXSIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # 禁止会话持久化响应 cookies，防止不同用户的登录态串用
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self.build_session()
+        return self._session
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._session = None
+
+
+session_manager = SessionManager()
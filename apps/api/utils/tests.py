@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+from django.test import TestCase, override_settings
+
+from .rate_limit import CacheTokenBucket, LocalTokenBucket, RateLimitBackend, RateLimiter
+
+
+class TestLocalTokenBucket(TestCase):
+    def test_try_acquire(self):
+        bucket = LocalTokenBucket("api", rate=10)
+        for __ in range(10):
+            self.assertEqual(bucket.try_acquire(), 0)
+        # 桶容量为 1 秒的预算，耗尽后需等待下一个令牌
+        wait_seconds = bucket.try_acquire()
+        self.assertGreater(wait_seconds, 0)
+        self.assertLessEqual(wait_seconds, 0.1)
+
+    def test_penalize(self):
+        bucket = LocalTokenBucket("api", rate=10)
+        bucket.penalize(5)
+        self.assertGreater(bucket.try_acquire(), 4)
+
+
+@override_settings(API_RATE_LIMIT_BACKEND=RateLimitBackend.LOCAL, API_RATE_LIMIT_MAX_WAIT=1)
+class TestRateLimiter(TestCase):
+    def test_acquire(self):
+        rate_limiter = RateLimiter()
+        for __ in range(10):
+            self.assertLess(rate_limiter.acquire("api", rate_limit=10, biz_rate_limit=0), 0.05)
+        # 令牌耗尽后阻塞至下一个令牌可用
+        self.assertGreater(rate_limiter.acquire("api", rate_limit=10, biz_rate_limit=0), 0.05)
+
+    def test_acquire_biz_bucket(self):
+        rate_limiter = RateLimiter()
+        self.assertEqual(len(rate_limiter.get_buckets("api", 10, 1, bk_biz_id=1)), 2)
+        self.assertEqual(len(rate_limiter.get_buckets("api", 10, 1)), 1)
+
+        rate_limiter.acquire("api", rate_limit=10, biz_rate_limit=1, bk_biz_id=1)
+        biz_bucket, api_bucket = rate_limiter.get_buckets("api", 10, 1, bk_biz_id=1)
+        self.assertGreater(biz_bucket.try_acquire(), 0)
+        # 其他业务不受影响
+        self.assertEqual(rate_limiter.get_buckets("api", 10, 1, bk_biz_id=2)[0].try_acquire(), 0)
+
+    @override_settings(API_RATE_LIMIT_MAX_WAIT=0)
+    def test_acquire_timeout(self):
+        rate_limiter = RateLimiter()
+        rate_limiter.penalize("api", rate_limit=10, biz_rate_limit=0)
+        # 等待超过上限时直接放行
+        self.assertLess(rate_limiter.acquire("api", rate_limit=10, biz_rate_limit=0), 0.05)
+
+    @override_settings(API_RATE_LIMIT_BACKEND=RateLimitBackend.CACHE)
+    def test_cache_backend_requires_redis(self):
+        rate_limiter = RateLimiter()
+        bucket = rate_limiter.get_bucket("api", 10)
+        self.assertIsInstance(bucket, CacheTokenBucket if CacheTokenBucket.is_supported() else LocalTokenBucket)
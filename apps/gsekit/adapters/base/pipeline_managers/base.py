@@ -14,16 +14,21 @@ from typing import Dict, Any, List
 
 from bamboo_engine import api
 from bamboo_engine.builder import builder, ServiceActivity, Var
+from django.db import transaction
 from pipeline.eri.runtime import BambooDjangoRuntime
 
-from apps.api import CCApi
-from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
 from apps.gsekit.job.exceptions import JobEmptyTaskException
-from apps.gsekit.job.models import Job, JobTask, JobProcInstStatusStatistics
+from apps.gsekit.constants import ORM_BATCH_SIZE
+from apps.gsekit.job.models import (
+    Job,
+    JobProcessSnapshot,
+    JobTask,
+    JobProcInstStatusStatistics,
+    JobTaskStatusStatistics,
+)
 from apps.gsekit.pipeline_plugins.components.collections.base import ActivityType
 from apps.gsekit.process.handlers.process import ProcessHandler
 from apps.gsekit.process.models import ProcessInst, Process
-from apps.utils.batch_request import batch_request
 
 
 class BasePipelineManager(object):
@@ -56,6 +61,7 @@ class BasePipelineManager(object):
     def generate_to_be_created_data(self, process_related_info, proc_inst_map, extra_data) -> Dict:
         """生成要创建的子任务"""
         to_be_created_job_tasks = []
+        to_be_created_process_snapshots = []
         to_be_created_proc_inst_status_statistics = []
         bk_set_env = self.job.scope["bk_set_env"]
         for process_info in process_related_info:
@@ -65,24 +71,28 @@ class BasePipelineManager(object):
             # 进程优先级为空时取默认值 0
             process_info["process"]["priority"] = process_info["process"].get("priority") or 0
             bk_process_id = process_info["process"]["bk_process_id"]
+            if proc_inst_map[bk_process_id]:
+                to_be_created_process_snapshots.append(self.generate_process_snapshot(process_info))
+            # 同一进程的子任务额外数据相同，仅复制一次，创建后不再修改内存中的对象
+            job_task_extra_data = copy.deepcopy(extra_data)
+            job_task_extra_data["retryable"] = True
+            job_task_extra_data["solutions"] = []
+            job_task_extra_data["topo_level_info"] = {
+                "bk_biz_id": process_info["process"]["bk_biz_id"],
+                "bk_set_id": process_info["set"]["bk_set_id"],
+                "bk_module_id": process_info["module"]["bk_module_id"],
+                "bk_host_id": process_info["host"]["bk_host_id"],
+            }
+            topo_fields = JobTask.get_topo_fields(process_info)
             for proc_inst in proc_inst_map[bk_process_id]:
-                job_task_extra_data = copy.deepcopy(extra_data)
-                job_task_extra_data["process_info"] = process_info
-                job_task_extra_data["inst_id"] = proc_inst["inst_id"]
-                job_task_extra_data["local_inst_id"] = proc_inst["local_inst_id"]
-                job_task_extra_data["retryable"] = True
-                job_task_extra_data["solutions"] = []
-                job_task_extra_data["topo_level_info"] = {
-                    "bk_biz_id": process_info["process"]["bk_biz_id"],
-                    "bk_set_id": process_info["set"]["bk_set_id"],
-                    "bk_module_id": process_info["module"]["bk_module_id"],
-                    "bk_host_id": process_info["host"]["bk_host_id"],
-                }
                 to_be_created_job_tasks.append(
                     JobTask(
                         job_id=self.job.id,
                         bk_process_id=bk_process_id,
+                        inst_id=proc_inst["inst_id"],
+                        local_inst_id=proc_inst["local_inst_id"],
                         extra_data=job_task_extra_data,
+                        **topo_fields,
                     )
                 )
             if self.job.job_object in [Job.JobObject.PROCESS] and proc_inst_map[bk_process_id]:
@@ -95,37 +105,18 @@ class BasePipelineManager(object):
                 )
         return {
             "to_be_created_job_tasks": to_be_created_job_tasks,
+            "to_be_created_process_snapshots": to_be_created_process_snapshots,
             "to_be_created_proc_inst_status_statistics": to_be_created_proc_inst_status_statistics,
         }
 
-    def create_job_task(self, extra_data=None):
-        # 表达式筛选情况下bk_process_ids为空表示无进程，在list_process_related_info表示全选，需要兼容并提前返回
-        if self.job.scope.get("is_expression") and not self.job.scope.get("bk_process_ids", []):
-            raise JobEmptyTaskException()
-        params = {
-            "bk_biz_id": self.job.bk_biz_id,
-            "set": {"bk_set_ids": self.job.scope.get("bk_set_ids") or []},
-            "module": {"bk_module_ids": self.job.scope.get("bk_module_ids") or []},
-            "service_instance": {"ids": self.job.scope.get("bk_service_ids") or []},
-        }
-        rules = []
-        if self.job.scope.get("bk_process_names"):
-            rules.append(
-                {"field": "bk_process_name", "operator": "in", "value": self.job.scope.get("bk_process_names") or []}
-            )
-
-        if self.job.scope.get("bk_process_ids"):
-            rules.append(
-                {"field": "bk_process_id", "operator": "in", "value": self.job.scope.get("bk_process_ids") or []}
-            )
-
-        if rules:
-            params["process_property_filter"] = {"condition": "AND", "rules": rules}
-        process_related_info = batch_request(CCApi.list_process_related_info, params)
-        CMDBHandler(bk_biz_id=self.job.bk_biz_id).cache_topo_tree_attr(self.job.scope["bk_set_env"])
-        if extra_data is None:
-            extra_data = {}
+    def generate_process_snapshot(self, process_info: Dict) -> JobProcessSnapshot:
+        """同一任务下同一进程的所有子任务共享一份进程快照"""
+        return JobProcessSnapshot(
+            job_id=self.job.id, bk_process_id=process_info["process"]["bk_process_id"], process_info=process_info
+        )
 
+    def create_job_task_chunk(self, process_related_info: List[Dict], extra_data: Dict) -> int:
+        """根据一页进程信息创建子任务，返回创建的子任务数量"""
         bk_process_ids = [process_info["process"]["bk_process_id"] for process_info in process_related_info]
         proc_inst_map = defaultdict(list)
         if extra_data.get("extra_filter_conditions"):
@@ -148,16 +139,43 @@ class BasePipelineManager(object):
             )
 
         to_be_created_job_data = self.generate_to_be_created_data(process_related_info, proc_inst_map, extra_data)
+        to_be_created_job_tasks = to_be_created_job_data["to_be_created_job_tasks"]
+        with transaction.atomic():
+            JobProcInstStatusStatistics.objects.bulk_create(
+                to_be_created_job_data["to_be_created_proc_inst_status_statistics"], batch_size=ORM_BATCH_SIZE
+            )
+            JobProcessSnapshot.objects.bulk_create(
+                to_be_created_job_data["to_be_created_process_snapshots"], batch_size=ORM_BATCH_SIZE
+            )
+            JobTask.objects.bulk_create(to_be_created_job_tasks, batch_size=ORM_BATCH_SIZE)
+            JobTaskStatusStatistics.record_transitions(
+                before=[],
+                after=[(job_task.job_id, job_task.status, job_task.err_code) for job_task in to_be_created_job_tasks],
+            )
+        return len(to_be_created_job_tasks)
 
-        to_be_created_proc_inst_status_statistics = to_be_created_job_data["to_be_created_proc_inst_status_statistics"]
-        if to_be_created_proc_inst_status_statistics:
-            JobProcInstStatusStatistics.objects.bulk_create(to_be_created_proc_inst_status_statistics)
+    def clean_job_task(self):
+        """创建子任务失败时，清理已逐批写入的子任务、进程快照及计数"""
+        with transaction.atomic():
+            for model in [JobTask, JobProcessSnapshot, JobProcInstStatusStatistics, JobTaskStatusStatistics]:
+                model.objects.filter(job_id=self.job.id).delete()
+
+    def create_job_task(self, extra_data=None):
+        # 表达式筛选情况下bk_process_ids为空表示无进程，在list_process_related_info表示全选，需要兼容并提前返回
+        if self.job.scope.get("is_expression") and not self.job.scope.get("bk_process_ids", []):
+            raise JobEmptyTaskException()
+        if extra_data is None:
+            extra_data = {}
+
+        # 逐批处理进程信息并写入子任务，避免全量数据及子任务对象同时驻留内存
+        job_task_count = 0
+        process_handler = ProcessHandler(bk_biz_id=self.job.bk_biz_id)
+        for process_related_info in process_handler.iter_process_related_info(self.job.scope):
+            job_task_count += self.create_job_task_chunk(process_related_info, extra_data)
 
-        to_be_created_job_tasks = to_be_created_job_data["to_be_created_job_tasks"]
         # 无进程执行任务
-        if not to_be_created_job_tasks:
+        if not job_task_count:
             raise JobEmptyTaskException()
-        JobTask.objects.bulk_create(to_be_created_job_tasks)
 
         job_tasks = JobTask.objects.filter(job_id=self.job.id)
 
@@ -62,6 +62,7 @@ class ConfigFilePipelineManager(BasePipelineManager):
         else:
             config_template_process_mapping = {}
         to_be_created_job_tasks = []
+        to_be_created_process_snapshots = []
 
         bk_set_env = self.job.scope["bk_set_env"]
         process_id__config_tmpl_ids_map: Dict[int, List[int]] = defaultdict(list)
@@ -103,28 +104,32 @@ class ConfigFilePipelineManager(BasePipelineManager):
             if is_config_specified and not related_config_template_ids:
                 continue
 
+            if proc_inst_map[bk_process_id]:
+                to_be_created_process_snapshots.append(self.generate_process_snapshot(process_info))
+            # 同一进程的子任务额外数据相同，仅复制一次
+            job_task_extra_data = copy.deepcopy(extra_data)
+            # 将配置模板绑定关系写入到进程所关联的任务实例，用于后置过滤
+            job_task_extra_data["related_config_info"] = {
+                "is_config_specified": is_config_specified,
+                "related_config_template_ids": related_config_template_ids,
+            }
+            job_task_extra_data["config_instances"] = []
+            topo_fields = JobTask.get_topo_fields(process_info)
             for proc_inst in proc_inst_map[bk_process_id]:
-
-                job_task_extra_data = copy.deepcopy(extra_data)
-                job_task_extra_data["process_info"] = process_info
-                job_task_extra_data["inst_id"] = proc_inst["inst_id"]
-                job_task_extra_data["local_inst_id"] = proc_inst["local_inst_id"]
-                # 将配置模板绑定关系写入到进程所关联的任务实例，用于后置过滤
-                job_task_extra_data["related_config_info"] = {
-                    "is_config_specified": is_config_specified,
-                    "related_config_template_ids": related_config_template_ids,
-                }
-                job_task_extra_data["config_instances"] = []
                 to_be_created_job_tasks.append(
                     JobTask(
                         job_id=self.job.id,
                         bk_process_id=bk_process_id,
+                        inst_id=proc_inst["inst_id"],
+                        local_inst_id=proc_inst["local_inst_id"],
                         extra_data=job_task_extra_data,
+                        **topo_fields,
                     )
                 )
 
         return {
             "to_be_created_job_tasks": to_be_created_job_tasks,
+            "to_be_created_process_snapshots": to_be_created_process_snapshots,
             "to_be_created_proc_inst_status_statistics": [],
         }
 
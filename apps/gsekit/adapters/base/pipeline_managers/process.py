@@ -85,6 +85,8 @@ class ProcessPipelineManager(BasePipelineManager):
         else:
             weights = 1
 
+        job_tasks = list(job_tasks)
+        JobTask.fill_process_infos(job_tasks)
         job_tasks_gby_node_key: Dict[Optional[Union[str, int]], List[JobTask]] = defaultdict(list)
         for job_task in job_tasks:
             aggregate_node_key: Optional[Union[str, int]] = job_task.extra_data["topo_level_info"].get(
@@ -98,19 +100,17 @@ class ProcessPipelineManager(BasePipelineManager):
                 # 按照 priority 优先级进行分组
                 ordered_job_tasks = sorted(
                     job_tasks_under_node_key,
-                    key=lambda x: weights * x.extra_data["process_info"]["process"]["priority"],
+                    key=lambda x: weights * x.process_info["process"]["priority"],
                 )
 
                 # 托管/取消托管 时，无需区分优先级，将优先级都设为一样
                 if self.job.job_action in [Job.JobAction.SET_AUTO, Job.JobAction.UNSET_AUTO]:
                     for job_task in ordered_job_tasks:
-                        job_task.extra_data["process_info"]["process"]["priority"] = 0
+                        job_task.process_info["process"]["priority"] = 0
 
                 ordered_activities: List[ServiceActivity] = []
                 # 根据分组按优先级顺序执行进程操作
-                grouped_job_tasks = groupby(
-                    ordered_job_tasks, lambda x: x.extra_data["process_info"]["process"]["priority"]
-                )
+                grouped_job_tasks = groupby(ordered_job_tasks, lambda x: x.process_info["process"]["priority"])
                 for priority, priority_job_tasks in grouped_job_tasks:
                     logger.info(f"creating pipeline with priority[{priority}]")
                     job_task_ids = [job_task.id for job_task in priority_job_tasks]
@@ -17,6 +17,7 @@ from django.db.models import QuerySet
 
 from apps.gsekit.adapters.base.pipeline_managers.configfile import ConfigFilePipelineManager
 from apps.gsekit.constants import PIPELINE_BATCH_SIZE
+from apps.gsekit.job.models import JobProcessSnapshot, JobTask
 from bamboo_engine import builder
 from bamboo_engine.builder import Data
 
@@ -35,14 +36,17 @@ class BscpReleaseConfigFilePipelineManager(ConfigFilePipelineManager):
         with transaction.atomic():
 
             # 按照进程模板进行分组
-            ordered_process_template_job_tasks = job_tasks.exclude(extra_data__process_info__process_template__id=0)
+            process_inst_bk_process_ids = JobProcessSnapshot.filter_bk_process_ids(self.job.id, process_template__id=0)
+            ordered_process_template_job_tasks = list(job_tasks.exclude(bk_process_id__in=process_inst_bk_process_ids))
+            JobTask.fill_process_infos(ordered_process_template_job_tasks)
             grouped_process_template_job_tasks = groupby(
-                ordered_process_template_job_tasks, lambda x: x.extra_data["process_info"]["process_template"]["id"]
+                ordered_process_template_job_tasks, lambda x: x.process_info["process_template"]["id"]
             )
             # 按照进程实例进行分组
-            ordered_process_inst_job_tasks = job_tasks.filter(extra_data__process_info__process_template__id=0)
+            ordered_process_inst_job_tasks = list(job_tasks.filter(bk_process_id__in=process_inst_bk_process_ids))
+            JobTask.fill_process_infos(ordered_process_inst_job_tasks)
             grouped_process_inst_job_tasks = groupby(
-                ordered_process_inst_job_tasks, lambda x: x.extra_data["process_info"]["process"]["bk_process_id"]
+                ordered_process_inst_job_tasks, lambda x: x.process_info["process"]["bk_process_id"]
             )
             # 根据进程模板分组构建并行网关
             group_sub_processes = []
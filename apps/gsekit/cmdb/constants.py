@@ -27,3 +27,8 @@ BK_SET_ENV_CHOICES = (
     (BkSetEnv.EXPERIENCE, _("体验")),
     (BkSetEnv.FORMAL, _("正式")),
 )
+
+# 事件监听游标对应的事件已过期（不存在）时 CMDB 返回的错误码，此时期间的变更无法感知，需全量同步
+CC_WATCH_CURSOR_EXPIRED_CODE = 1103007
+# 事件监听临时异常（网络抖动、限频等）的最大退避间隔（秒）
+CC_WATCH_MAX_RETRY_INTERVAL = 30
@@ -9,10 +9,13 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 import copy
+import gzip
+import hashlib
+import threading
+import uuid
 from collections import defaultdict, ChainMap
 from itertools import groupby
 from typing import Dict, List, Set, Any, Iterable
-from xml.dom.minidom import Document, Element
 
 from blueapps.account.models import User
 from django.core.cache import cache
@@ -53,8 +56,12 @@ ns["tokenize"] = tokenize
 class CMDBHandler(object):
     CACHE_KEY_TEMPLATE = "{bk_obj_id}_{bk_inst_id}_name"
     CACHE_GLOBAL_VAR_TEMPLATE = "gsekit:cmdb:biz:{bk_biz_id}:global_variables"
-    CACHE_TOPO_ATTR_TEMPLATE = "gsekit:cmdb:biz:{bk_biz_id}:topo_tree_attributes"
+    CACHE_TOPO_ATTR_TEMPLATE = "gsekit:cmdb:biz:{bk_biz_id}:set_env:{bk_set_env}:topo_tree_attributes"
+    CACHE_TOPO_VERSION_TEMPLATE = "gsekit:cmdb:biz:{bk_biz_id}:topo_tree_version"
     CACHE_CLOUD_TEMPLATE = "gsekit:cmdb:biz:{bk_biz_id}:clouds"
+    # 拓扑树由监听事件增量更新，过期时间作为漏处理事件时的兜底
+    TOPO_TREE_CACHE_EXPIRE = gsekit_const.CacheExpire.HOUR
+    TOPO_TREE_PATCH_LOCK = threading.Lock()
     BK_BIZ_OBJ_ID = "biz"
     BK_SET_OBJ_ID = "set"
     BK_MODULE_OBJ_ID = "module"
@@ -145,23 +152,25 @@ class CMDBHandler(object):
         }
         return key_relations_map
 
-    def set_attr_to_xml_element(self, xml_element: Element, attr_dict: Dict, topo_variables: List):
+    def format_xml_attrs(self, attr_dict: Dict, topo_variables: List) -> Dict[str, str]:
+        """将 CMDB 对象属性转为拓扑树节点属性，同时保留新老字段"""
+        xml_attrs = {}
         if attr_dict is None:
-            return
+            return xml_attrs
         for attr_key, attr_value in attr_dict.items():
             if not isinstance(attr_value, (list, tuple, dict)):
                 # attr_value 需都转为字符串
-                xml_element.setAttribute(attr_key, "%s" % attr_value)
+                xml_attrs[attr_key] = "%s" % attr_value
                 # 设置老字段
-                old_field_name = self.map_cc3_field_to_cc1(attr_key)
-                xml_element.setAttribute(old_field_name, "%s" % attr_value)
+                xml_attrs[self.map_cc3_field_to_cc1(attr_key)] = "%s" % attr_value
 
         for var in topo_variables:
             # CMDB部分字段连key都没有，这里默认填充为空字符串
-            attr_key = self.map_cc3_field_to_cc1(var["bk_property_id"])
-            xml_element_keys = xml_element.attributes.keys()
-            if attr_key not in xml_element_keys:
-                xml_element.setAttribute(attr_key, "")
+            xml_attrs.setdefault(self.map_cc3_field_to_cc1(var["bk_property_id"]), "")
+        return xml_attrs
+
+    def set_attr_to_xml_element(self, xml_element: etree._Element, attr_dict: Dict, topo_variables: List):
+        xml_element.attrib.update(self.format_xml_attrs(attr_dict, topo_variables))
 
     def get_or_cache_bk_cloud_area(self, use_cache: bool = True):
         """缓存云区域
@@ -181,8 +190,19 @@ class CMDBHandler(object):
         )
         return cloud_areas
 
-    def cache_topo_tree_attr(self, bk_set_env: str):
-        """缓存业务拓扑树属性"""
+    @classmethod
+    def topo_fields_digest(cls, biz_global_variables: Dict) -> str:
+        """拓扑树节点属性字段摘要，业务模型字段变更（增删属性）时摘要变化，缓存的拓扑树视为失效"""
+        fields = [
+            [prop["bk_property_id"] for prop in biz_global_variables[bk_obj_id]]
+            for bk_obj_id in [cls.BK_SET_OBJ_ID, cls.BK_MODULE_OBJ_ID, cls.BK_HOST_OBJ_ID]
+        ]
+        return hashlib.md5(str(fields).encode()).hexdigest()
+
+    def cache_topo_tree_attr(self, bk_set_env: str) -> etree._Element:
+        """缓存业务拓扑树属性，返回拓扑树根节点，调用方可直接使用而无需再次解析"""
+        # 先取版本号再拉取拓扑，构建期间发生的变更会刷新版本号，避免旧数据以新版本写入缓存
+        version = self.topo_tree_version()
         biz_global_variables = self.biz_global_variables()
         topo_tree_info = CCApi.find_biz_tree_brief_info(
             {
@@ -193,11 +213,8 @@ class CMDBHandler(object):
             }
         )
 
-        # 由于大型 JSON 处理速度较慢，转为 XML 处理
-
-        doc = Document()
-        app = doc.createElement("Application")
-        doc.appendChild(app)
+        # 由于大型 JSON 处理速度较慢，转为 XML 处理，直接构建 lxml 节点树，避免 minidom 构建后再序列化、解析的开销
+        topo_tree = etree.Element("Application")
 
         # 遍历集群
         for bk_set in topo_tree_info:
@@ -212,14 +229,14 @@ class CMDBHandler(object):
                 cc_bk_set_env = ""
             if cc_bk_set_env != bk_set_env:
                 continue
-            xml_set = doc.createElement("Set")
+            xml_set = etree.SubElement(topo_tree, "Set")
             self.set_attr_to_xml_element(xml_set, bk_set_attr, biz_global_variables[self.BK_SET_OBJ_ID])
 
             # 遍历模块并设置模块属性
             for bk_module in bk_set.get("modules") or []:
                 if bk_module is None:
                     continue
-                xml_module = doc.createElement("Module")
+                xml_module = etree.SubElement(xml_set, "Module")
                 self.set_attr_to_xml_element(
                     xml_module, bk_module["module"], biz_global_variables[self.BK_MODULE_OBJ_ID]
                 )
@@ -228,23 +245,113 @@ class CMDBHandler(object):
                 for bk_host in bk_module.get("hosts") or []:
                     if bk_host is None:
                         continue
-                    xml_host = doc.createElement("Host")
+                    xml_host = etree.SubElement(xml_module, "Host")
                     self.set_attr_to_xml_element(xml_host, bk_host, biz_global_variables[self.BK_HOST_OBJ_ID])
 
-                    xml_module.appendChild(xml_host)
+        # 大业务的拓扑树达数 MB，压缩后缓存，并记录构建时的版本号及属性字段
+        cache.set(
+            self.topo_tree_attr_cache_key(bk_set_env),
+            {
+                "version": version,
+                "fields_digest": self.topo_fields_digest(biz_global_variables),
+                "data": gzip.compress(etree.tostring(topo_tree, encoding="utf-8")),
+            },
+            self.TOPO_TREE_CACHE_EXPIRE,
+        )
+        return topo_tree
+
+    def topo_tree_attr_cache_key(self, bk_set_env: str) -> str:
+        return self.CACHE_TOPO_ATTR_TEMPLATE.format(bk_biz_id=self.bk_biz_id, bk_set_env=bk_set_env)
+
+    def topo_tree_version(self) -> str:
+        """业务拓扑树版本号，拓扑发生无法局部更新的变更时刷新，版本号不一致的缓存视为失效"""
+        version_cache_key = self.CACHE_TOPO_VERSION_TEMPLATE.format(bk_biz_id=self.bk_biz_id)
+        version = cache.get(version_cache_key)
+        if version is None:
+            cache.add(version_cache_key, uuid.uuid4().hex, self.TOPO_TREE_CACHE_EXPIRE)
+            version = cache.get(version_cache_key)
+        return version
+
+    def refresh_topo_tree_version(self) -> str:
+        version = uuid.uuid4().hex
+        cache.set(
+            self.CACHE_TOPO_VERSION_TEMPLATE.format(bk_biz_id=self.bk_biz_id), version, self.TOPO_TREE_CACHE_EXPIRE
+        )
+        return version
 
-                xml_set.appendChild(xml_module)
+    def is_topo_tree_valid(self, cached_topo_tree: Dict, version: str) -> bool:
+        if cached_topo_tree["version"] != version:
+            return False
+        return cached_topo_tree.get("fields_digest") == self.topo_fields_digest(self.biz_global_variables())
 
-            app.appendChild(xml_set)
+    def get_topo_tree(self, bk_set_env: str) -> etree._Element:
+        """获取业务拓扑树，缓存版本及属性字段与当前一致时解压解析，否则重新构建"""
+        cached_topo_tree = cache.get(self.topo_tree_attr_cache_key(bk_set_env))
+        if cached_topo_tree is not None and self.is_topo_tree_valid(cached_topo_tree, self.topo_tree_version()):
+            return etree.fromstring(gzip.decompress(cached_topo_tree["data"]))
+        return self.cache_topo_tree_attr(bk_set_env)
+
+    def patch_topo_tree_attr(self, bk_obj_id: str, attr_dict: Dict) -> bool:
+        """
+        将集群/模块/主机的属性变更局部应用到已缓存的拓扑树
+        集群、模块、主机的监听线程并发更新同一业务的拓扑树，读取-更新-写入需串行，避免相互覆盖
+        :param bk_obj_id: 对象类型，set/module/host
+        :param attr_dict: 变更后的对象属性
+        :return: 是否更新成功，拓扑结构发生变化或期间有其它进程刷新了版本号时返回 False
+        """
+        with self.TOPO_TREE_PATCH_LOCK:
+            return self._patch_topo_tree_attr(bk_obj_id, attr_dict)
+
+    def _patch_topo_tree_attr(self, bk_obj_id: str, attr_dict: Dict) -> bool:
+        tag_name = {self.BK_SET_OBJ_ID: "Set", self.BK_MODULE_OBJ_ID: "Module", self.BK_HOST_OBJ_ID: "Host"}[bk_obj_id]
+        id_field = f"bk_{bk_obj_id}_id"
+        version = self.topo_tree_version()
+        cache_keys = [
+            self.topo_tree_attr_cache_key(bk_set_env)
+            for bk_set_env in [constants.BkSetEnv.TESTING, constants.BkSetEnv.EXPERIENCE, constants.BkSetEnv.FORMAL]
+        ]
+        cached_topo_trees = {
+            cache_key: cached_topo_tree
+            for cache_key, cached_topo_tree in cache.get_many(cache_keys).items()
+            if self.is_topo_tree_valid(cached_topo_tree, version)
+        }
+        if not cached_topo_trees:
+            return True
+
+        biz_global_variables = self.biz_global_variables()
+        # 与全量构建一致，仅写入拓扑树查询的属性字段，事件详情中的其它字段不写入，避免局部更新与重建的拓扑树不一致
+        topo_fields = {prop["bk_property_id"] for prop in biz_global_variables[bk_obj_id]}
+        xml_attrs = self.format_xml_attrs(
+            {attr_key: attr_value for attr_key, attr_value in attr_dict.items() if attr_key in topo_fields},
+            biz_global_variables[bk_obj_id],
+        )
+        patched_topo_trees = {}
+        new_version = uuid.uuid4().hex
+        for cache_key, cached_topo_tree in cached_topo_trees.items():
+            topo_tree = etree.fromstring(gzip.decompress(cached_topo_tree["data"]))
+            elements = topo_tree.xpath(f"//{tag_name}[@{id_field}=$inst_id]", inst_id=str(attr_dict[id_field]))
+            for element in elements:
+                if bk_obj_id == self.BK_SET_OBJ_ID and element.get("bk_set_env") != xml_attrs.get("bk_set_env"):
+                    # 集群环境变更，集群需要移动到其它环境的拓扑树
+                    return False
+                element.attrib.update(xml_attrs)
+            data = gzip.compress(etree.tostring(topo_tree, encoding="utf-8")) if elements else cached_topo_tree["data"]
+            patched_topo_trees[cache_key] = {
+                "version": new_version,
+                "fields_digest": cached_topo_tree["fields_digest"],
+                "data": data,
+            }
 
-        # TODO 考虑换redis缓存，或者大业务的情况进行压缩缓存
-        doc = doc.toxml("utf-8")
+        # 锁仅在监听进程内生效，其它进程（如任务创建时重建拓扑树）期间刷新了版本号时放弃更新，由调用方刷新版本号
+        if self.topo_tree_version() != version:
+            return False
+        cache.set_many(patched_topo_trees, self.TOPO_TREE_CACHE_EXPIRE)
         cache.set(
-            self.CACHE_TOPO_ATTR_TEMPLATE.format(bk_biz_id=self.bk_biz_id),
-            doc,
-            gsekit_const.CacheExpire.HOUR,
+            self.CACHE_TOPO_VERSION_TEMPLATE.format(bk_biz_id=self.bk_biz_id),
+            new_version,
+            self.TOPO_TREE_CACHE_EXPIRE,
         )
-        return doc
+        return True
 
     def list_target_obj_node_from_topo(self, topo: List[Dict], node_list: List, target_obj_id: str):
         """
@@ -678,8 +785,6 @@ class CMDBHandler(object):
             self.check_service_templates_difference,
             params_list=params_list,
             get_data=lambda x: [x],
-            # 100 次 API 调用最远间隔 3s，
-            interval=0.03,
         )
         is_diff_results: List[Dict[int, bool]] = []
         for service_tmpl_id, is_diff in dict(ChainMap(*service_tmpl_id__need_sync_map_list)).items():
@@ -10,53 +10,340 @@ See the License for the specific language governing permissions and limitations
 """
 import logging
 import gc
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
 from apps.api import CCApi
+from apps.exceptions import ApiResultError
+from apps.gsekit.cmdb.constants import CC_WATCH_CURSOR_EXPIRED_CODE, CC_WATCH_MAX_RETRY_INTERVAL
+from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
 from apps.gsekit.job.models import Job
 from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.models import Process, ProcessRelatedInfo
+from apps.utils.basic import list_slice
 
 logger = logging.getLogger("app")
 
 
+def sync_biz_process_by_events(bk_events: List[Dict]):
+    """按业务聚合进程变更事件，增量同步变更进程所在模块，增量同步失败时回退为全量同步"""
+    bk_biz_id__process_ids_map = defaultdict(set)
+    for bk_event in bk_events:
+        bk_detail = bk_event.get("bk_detail")
+        if bk_detail:
+            bk_biz_id__process_ids_map[bk_detail["bk_biz_id"]].add(bk_detail["bk_process_id"])
+
+    for bk_biz_id, bk_process_ids in bk_biz_id__process_ids_map.items():
+        # 订阅触发的进程变更，需判断是否在GSEKIT执行过任务，避免没有使用GSEKIT的业务写入无用的进程数据
+        if not Job.objects.filter(bk_biz_id=bk_biz_id).exists():
+            logger.info("[process_watch] bk_biz_id->({}) dose not run any job, skip.".format(bk_biz_id))
+            continue
+
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process_by_ids(bk_process_ids)
+            continue
+        except Exception:
+            logger.exception("[process_watch] bk_biz_id->({}) sync_biz_process_by_ids err!".format(bk_biz_id))
+
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
+        except Exception:
+            logger.exception("[process_watch] bk_biz_id->({}) sync_biz_process err!".format(bk_biz_id))
+
+
+def sync_all_biz_process():
+    """全量同步已使用GSEKIT的业务进程"""
+    for bk_biz_id in Job.objects.order_by().values_list("bk_biz_id", flat=True).distinct():
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
+        except Exception:
+            logger.exception("[process_watch] bk_biz_id->({}) sync_biz_process err!".format(bk_biz_id))
+
+
+def is_watch_cursor_expired(error: Exception) -> bool:
+    return isinstance(error, ApiResultError) and str(error.code) == str(CC_WATCH_CURSOR_EXPIRED_CODE)
+
+
+def get_watch_retry_interval(retry_times: int) -> int:
+    """临时异常按指数退避，保留游标重试"""
+    return min(2**retry_times, CC_WATCH_MAX_RETRY_INTERVAL)
+
+
 def process_watch():
     """
     监听CMDB进程变更事件
     """
     bk_cursor = None
-    kwargs = {
-        "bk_resource": "process",
-        "bk_fields": ["bk_biz_id"],
+    bk_start_from = None
+    retry_times = 0
+    while True:
+        kwargs = {"bk_resource": "process", "bk_fields": ["bk_biz_id", "bk_process_id"]}
+        if bk_cursor:
+            kwargs["bk_cursor"] = bk_cursor
+        elif bk_start_from:
+            kwargs["bk_start_from"] = bk_start_from
+        try:
+            result = CCApi.resource_watch(kwargs, use_admin=True)
+        except Exception as error:
+            if is_watch_cursor_expired(error):
+                logger.exception("[process_watch] watch cursor expired, fallback to sync all biz process!")
+                # 游标失效，期间的变更无法感知，全量同步后从同步开始的时间点继续监听
+                bk_cursor = None
+                bk_start_from = int(time.time())
+                retry_times = 0
+                sync_all_biz_process()
+                continue
+            retry_interval = get_watch_retry_interval(retry_times)
+            retry_times += 1
+            logger.exception(f"[process_watch] watch error occur, retry after {retry_interval}s")
+            time.sleep(retry_interval)
+            continue
+
+        retry_times = 0
+        if not result:
+            # 期间没有变更，继续下一次调用
+            continue
+        bk_events = result["bk_events"]
+        # 拿该事件的cursor进行下一次的watch
+        bk_cursor = bk_events[-1]["bk_cursor"]
+
+        # 如果bk_watched为false，表明未监听到事件
+        if not result["bk_watched"]:
+            continue
+
+        sync_biz_process_by_events(bk_events)
+
+        # 进行垃圾回收，避免某些不可控原因导致这个事件监听长进程内存不停增长
+        gc.collect()
+
+
+# 影响业务拓扑树的资源，集群/模块/主机属性变更可局部更新缓存，其余变更（含业务属性变更）刷新拓扑树版本
+TOPO_WATCH_RESOURCES = ["biz", "set", "module", "host", "host_relation"]
+
+
+# 可局部更新拓扑树的资源
+TOPO_PATCHABLE_RESOURCES = [CMDBHandler.BK_SET_OBJ_ID, CMDBHandler.BK_MODULE_OBJ_ID, CMDBHandler.BK_HOST_OBJ_ID]
+# 单次查询主机业务关系的主机数上限
+HOST_BIZ_RELATIONS_LIMIT = 500
+
+# 各资源的监听线程丢失事件时共用一次重建，started_at 为最近一次重建的开始时间
+TOPO_RESYNC_LOCK = threading.Lock()
+TOPO_RESYNC_STATE = {"started_at": 0}
+
+
+class BkEventType(object):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+def refresh_all_biz_topo_tree_version():
+    """无法确定变更影响的业务时，刷新已使用GSEKIT的全部业务的拓扑树版本"""
+    for bk_biz_id in Job.objects.order_by().values_list("bk_biz_id", flat=True).distinct():
+        CMDBHandler(bk_biz_id=bk_biz_id).refresh_topo_tree_version()
+
+
+def resync_all_biz_by_lost_topo_events(lost_at: float):
+    """
+    拓扑变更事件丢失时，刷新全部业务的拓扑树版本并重建进程关联信息副本
+    :param lost_at: 事件丢失的时间，其他资源的监听线程已在此之后开始重建时跳过
+    """
+    with TOPO_RESYNC_LOCK:
+        if TOPO_RESYNC_STATE["started_at"] >= lost_at:
+            return
+        TOPO_RESYNC_STATE["started_at"] = time.time()
+        refresh_all_biz_topo_tree_version()
+        # 副本中可能存在过期的主机、集群、模块属性，先清空使任务回退到 CMDB 查询，再全量同步重建
+        ProcessRelatedInfo.objects.all().delete()
+        sync_all_biz_process()
+
+
+def list_host_biz_relations(bk_events: List[Dict]) -> Dict[int, List[Dict]]:
+    """
+    查询主机更新事件涉及主机的业务及模块关系
+    主机事件不带业务信息，且 IP 变更时事件中为新 IP，需按 bk_host_id 向 CMDB 查询，不能通过本地进程的 IP 反查
+    :return: {bk_host_id: [{"bk_biz_id": 1, "bk_set_id": 1, "bk_module_id": 1, "bk_host_id": 1}]}
+    """
+    bk_host_ids = {
+        bk_event["bk_detail"]["bk_host_id"]
+        for bk_event in bk_events
+        if bk_event.get("bk_detail") and bk_event["bk_event_type"] == BkEventType.UPDATE
     }
-    try:
-        while True:
+    host_biz_relations = defaultdict(list)
+    for bk_host_ids_slice in list_slice(list(bk_host_ids), HOST_BIZ_RELATIONS_LIMIT):
+        for relation in CCApi.find_host_biz_relations({"bk_host_id": bk_host_ids_slice}, use_admin=True):
+            host_biz_relations[relation["bk_host_id"]].append(relation)
+    return host_biz_relations
+
+
+def handle_topo_events(bk_resource: str, bk_events: List[Dict], host_biz_relations: Dict[int, List[Dict]] = None):
+    """将拓扑变更事件应用到业务拓扑树缓存及进程关联信息副本"""
+    if host_biz_relations is None:
+        host_biz_relations = list_host_biz_relations(bk_events) if bk_resource == CMDBHandler.BK_HOST_OBJ_ID else {}
+
+    patch_topo_tree_by_events(bk_resource, bk_events, host_biz_relations)
+    sync_process_related_info_by_topo_events(bk_resource, bk_events, host_biz_relations)
+
+
+def get_topo_events_biz_ids(bk_resource: str, bk_events: List[Dict], host_biz_relations: Dict[int, List[Dict]]):
+    """拓扑变更事件涉及的业务，主机事件不带业务信息，通过主机业务关系获取"""
+    bk_biz_ids = set()
+    for bk_event in bk_events:
+        bk_detail = bk_event.get("bk_detail")
+        if not bk_detail:
+            continue
+        if bk_resource == CMDBHandler.BK_HOST_OBJ_ID:
+            bk_biz_ids.update(relation["bk_biz_id"] for relation in host_biz_relations.get(bk_detail["bk_host_id"], []))
+        else:
+            bk_biz_ids.add(bk_detail["bk_biz_id"])
+    return bk_biz_ids
+
+
+def resync_biz_by_topo_events(bk_resource: str, bk_events: List[Dict], host_biz_relations: Dict[int, List[Dict]]):
+    """拓扑变更事件处理失败时，仅刷新该批事件涉及业务的拓扑树版本，并全量同步其进程及关联信息副本"""
+    for bk_biz_id in get_topo_events_biz_ids(bk_resource, bk_events, host_biz_relations):
+        CMDBHandler(bk_biz_id=bk_biz_id).refresh_topo_tree_version()
+        if not Process.objects.filter(bk_biz_id=bk_biz_id).exists():
+            continue
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
+        except Exception:
+            logger.exception(f"[topo_watch] bk_biz_id->({bk_biz_id}) sync_biz_process err!")
+
+
+def patch_topo_tree_by_events(bk_resource: str, bk_events: List[Dict], host_biz_relations: Dict[int, List[Dict]]):
+    """将拓扑变更事件应用到业务拓扑树缓存"""
+    for bk_event in bk_events:
+        bk_detail = bk_event.get("bk_detail")
+        if not bk_detail:
+            continue
+
+        if bk_resource == CMDBHandler.BK_HOST_OBJ_ID:
+            if bk_event["bk_event_type"] != BkEventType.UPDATE:
+                # 主机的增删通过主机关系事件体现
+                continue
+            bk_biz_ids = {relation["bk_biz_id"] for relation in host_biz_relations.get(bk_detail["bk_host_id"], [])}
+        else:
+            bk_biz_ids = {bk_detail["bk_biz_id"]}
+
+        for bk_biz_id in bk_biz_ids:
+            cmdb_handler = CMDBHandler(bk_biz_id=bk_biz_id)
+            try:
+                is_patched = (
+                    bk_event["bk_event_type"] == BkEventType.UPDATE
+                    and bk_resource in TOPO_PATCHABLE_RESOURCES
+                    and cmdb_handler.patch_topo_tree_attr(bk_resource, bk_detail)
+                )
+            except Exception:
+                logger.exception(f"[topo_watch] bk_biz_id->({bk_biz_id}) patch topo tree by {bk_resource} event err!")
+                is_patched = False
+            if not is_patched:
+                cmdb_handler.refresh_topo_tree_version()
+
+
+def sync_process_related_info_by_topo_events(
+    bk_resource: str, bk_events: List[Dict], host_biz_relations: Dict[int, List[Dict]]
+):
+    """拓扑变更影响进程关联信息中的主机、集群、模块属性，按模块增量刷新已同步业务的进程及关联信息副本"""
+    if bk_resource == CMDBHandler.BK_BIZ_OBJ_ID:
+        # 进程关联信息不包含业务属性
+        return
+    bk_biz_id__module_ids_map = defaultdict(set)
+    for bk_event in bk_events:
+        bk_detail = bk_event.get("bk_detail")
+        if not bk_detail:
+            continue
+        if bk_resource == CMDBHandler.BK_HOST_OBJ_ID:
+            if bk_event["bk_event_type"] != BkEventType.UPDATE:
+                continue
+            # 本地进程记录的是变更前的 IP，按 bk_host_id 查询到的主机所在模块刷新
+            for relation in host_biz_relations.get(bk_detail["bk_host_id"], []):
+                bk_biz_id__module_ids_map[relation["bk_biz_id"]].add(relation["bk_module_id"])
+        elif bk_resource == CMDBHandler.BK_SET_OBJ_ID:
+            processes = Process.objects.filter(bk_biz_id=bk_detail["bk_biz_id"], bk_set_id=bk_detail["bk_set_id"])
+            for bk_module_id in processes.values_list("bk_module_id", flat=True).order_by().distinct():
+                bk_biz_id__module_ids_map[bk_detail["bk_biz_id"]].add(bk_module_id)
+        else:
+            # 模块及主机关系事件直接携带模块信息
+            bk_biz_id__module_ids_map[bk_detail["bk_biz_id"]].add(bk_detail["bk_module_id"])
+
+    for bk_biz_id, bk_module_ids in bk_biz_id__module_ids_map.items():
+        if not Process.objects.filter(bk_biz_id=bk_biz_id).exists():
+            continue
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process_by_module_ids(bk_module_ids)
+            continue
+        except Exception:
+            logger.exception(f"[topo_watch] bk_biz_id->({bk_biz_id}) sync process by {bk_resource} event err!")
+
+        # 增量同步失败时回退为全量同步，避免副本停留在变更前的拓扑属性
+        try:
+            ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
+        except Exception:
+            logger.exception(f"[topo_watch] bk_biz_id->({bk_biz_id}) sync_biz_process err!")
+
+
+def topo_watch(bk_resource: str):
+    """
+    监听CMDB拓扑变更事件，增量维护业务拓扑树缓存及进程关联信息副本
+    """
+    bk_cursor = None
+    bk_start_from = None
+    retry_times = 0
+    while True:
+        kwargs = {"bk_resource": bk_resource}
+        if bk_cursor:
             kwargs["bk_cursor"] = bk_cursor
+        elif bk_start_from:
+            kwargs["bk_start_from"] = bk_start_from
+        try:
             result = CCApi.resource_watch(kwargs, use_admin=True)
-            if not result:
-                # 期间没有变更，继续下一次调用
+        except Exception as error:
+            if is_watch_cursor_expired(error):
+                logger.exception(f"[topo_watch] watch {bk_resource} cursor expired, resync all biz!")
+                # 游标失效，期间的变更无法感知，重建后从重建开始的时间点继续监听
+                bk_cursor = None
+                bk_start_from = int(time.time())
+                retry_times = 0
+                resync_all_biz_by_lost_topo_events(bk_start_from)
                 continue
-            bk_events = result["bk_events"]
-            # 拿该事件的cursor进行下一次的watch
+            retry_interval = get_watch_retry_interval(retry_times)
+            retry_times += 1
+            logger.exception(f"[topo_watch] watch {bk_resource} error occur, retry after {retry_interval}s")
+            time.sleep(retry_interval)
+            continue
+
+        if not result:
+            retry_times = 0
+            continue
+        bk_events = result["bk_events"]
+        if not result["bk_watched"]:
+            retry_times = 0
             bk_cursor = bk_events[-1]["bk_cursor"]
+            continue
+
+        try:
+            host_biz_relations = list_host_biz_relations(bk_events) if bk_resource == CMDBHandler.BK_HOST_OBJ_ID else {}
+        except Exception:
+            # 无法确定主机事件涉及的业务，保留游标按指数退避重新监听该批事件
+            retry_interval = get_watch_retry_interval(retry_times)
+            retry_times += 1
+            logger.exception(f"[topo_watch] list host biz relations error occur, retry after {retry_interval}s")
+            time.sleep(retry_interval)
+            continue
+
+        retry_times = 0
+        bk_cursor = bk_events[-1]["bk_cursor"]
+        try:
+            handle_topo_events(bk_resource, bk_events, host_biz_relations)
+        except Exception:
+            # 全量重建耗时较长，期间事件无法消费导致游标再次失效，仅重建该批事件涉及的业务
+            logger.exception(f"[topo_watch] handle {bk_resource} events error occur, resync related biz!")
+            resync_biz_by_topo_events(bk_resource, bk_events, host_biz_relations)
 
-            # 如果bk_watched为false，表明未监听到事件
-            if not result["bk_watched"]:
-                continue
 
-            # 有进程变更的业务集合
-            bk_biz_ids = {bk_event["bk_detail"]["bk_biz_id"] for bk_event in bk_events if bk_event.get("bk_detail")}
-            for bk_biz_id in bk_biz_ids:
-
-                # 订阅触发的进程变更，需判断是否在GSEKIT执行过任务，避免没有使用GSEKIT的业务写入无用的进程数据
-                if not Job.objects.filter(bk_biz_id=bk_biz_id).exists():
-                    logger.info("[process_watch] bk_biz_id->({}) dose not run any job, skip.".format(bk_biz_id))
-                    continue
-
-                try:
-                    ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
-                except Exception:
-                    logger.exception("[process_watch] bk_biz_id->({}) sync_biz_process err!".format(bk_biz_id))
-
-            # 进行垃圾回收，避免某些不可控原因导致这个事件监听长进程内存不停增长
-            gc.collect()
-    except Exception:
-        logger.exception("[process_watch] some error occur!")
-        process_watch()
+def start_topo_watch():
+    for bk_resource in TOPO_WATCH_RESOURCES:
+        threading.Thread(target=topo_watch, args=(bk_resource,), name=f"topo_watch_{bk_resource}", daemon=True).start()
@@ -9,10 +9,17 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+import gzip
+
+from django.core.cache import cache
 from django.test import TestCase
+from lxml import etree
+from mock import patch
 
 from apps.gsekit.cmdb.constants import BkSetEnv
+from apps.gsekit.cmdb.handlers import resource_watch
 from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
+from apps.gsekit.process.models import Process
 from apps.utils.test_utils.tests import patch_get_request
 
 
@@ -30,3 +37,158 @@ class TestProcessHandler(TestCase):
     @patch_get_request
     def test_cache_topo_tree_attr(self):
         CMDBHandler(bk_biz_id=self.BK_BIZ_ID).cache_topo_tree_attr(BkSetEnv.FORMAL)
+
+
+class TestPatchTopoTreeAttr(TestCase):
+    """
+    测试拓扑树属性局部更新
+    """
+
+    BK_BIZ_ID = 2
+    BIZ_GLOBAL_VARIABLES = {
+        CMDBHandler.BK_SET_OBJ_ID: [{"bk_property_id": "bk_set_name"}, {"bk_property_id": "bk_set_env"}],
+        CMDBHandler.BK_MODULE_OBJ_ID: [{"bk_property_id": "bk_module_name"}],
+        CMDBHandler.BK_HOST_OBJ_ID: [{"bk_property_id": "bk_host_innerip"}, {"bk_property_id": "bk_cloud_id"}],
+    }
+
+    def setUp(self):
+        patcher = patch.object(CMDBHandler, "biz_global_variables", return_value=self.BIZ_GLOBAL_VARIABLES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.handler = CMDBHandler(bk_biz_id=self.BK_BIZ_ID)
+        topo_tree = etree.Element("Application")
+        xml_set = etree.SubElement(topo_tree, "Set")
+        self.handler.set_attr_to_xml_element(
+            xml_set,
+            {"bk_set_id": 1, "bk_set_name": "set", "bk_set_env": BkSetEnv.FORMAL},
+            self.BIZ_GLOBAL_VARIABLES[CMDBHandler.BK_SET_OBJ_ID],
+        )
+        xml_module = etree.SubElement(xml_set, "Module")
+        self.handler.set_attr_to_xml_element(
+            xml_module,
+            {"bk_module_id": 10, "bk_module_name": "module"},
+            self.BIZ_GLOBAL_VARIABLES[CMDBHandler.BK_MODULE_OBJ_ID],
+        )
+        self.version = self.handler.topo_tree_version()
+        cache.set(
+            self.handler.topo_tree_attr_cache_key(BkSetEnv.FORMAL),
+            {
+                "version": self.version,
+                "fields_digest": CMDBHandler.topo_fields_digest(self.BIZ_GLOBAL_VARIABLES),
+                "data": gzip.compress(etree.tostring(topo_tree, encoding="utf-8")),
+            },
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_patch_attr(self):
+        is_patched = self.handler.patch_topo_tree_attr(
+            CMDBHandler.BK_MODULE_OBJ_ID, {"bk_module_id": 10, "bk_module_name": "new_module", "operator": "admin"}
+        )
+        self.assertTrue(is_patched)
+
+        # 版本号刷新，缓存的拓扑树以新版本号写入
+        new_version = self.handler.topo_tree_version()
+        self.assertNotEqual(new_version, self.version)
+        cached_topo_tree = cache.get(self.handler.topo_tree_attr_cache_key(BkSetEnv.FORMAL))
+        self.assertEqual(cached_topo_tree["version"], new_version)
+
+        xml_module = self.handler.get_topo_tree(BkSetEnv.FORMAL).find("Set/Module")
+        self.assertEqual(xml_module.get("bk_module_name"), "new_module")
+        self.assertEqual(xml_module.get(CMDBHandler.map_cc3_field_to_cc1("bk_module_name")), "new_module")
+        # 非拓扑树查询的字段不写入，与全量构建保持一致
+        self.assertIsNone(xml_module.get("operator"))
+
+    def test_patch_set_env(self):
+        is_patched = self.handler.patch_topo_tree_attr(
+            CMDBHandler.BK_SET_OBJ_ID, {"bk_set_id": 1, "bk_set_name": "set", "bk_set_env": BkSetEnv.TESTING}
+        )
+        # 集群环境变更无法局部更新，缓存及版本号保持不变
+        self.assertFalse(is_patched)
+        self.assertEqual(self.handler.topo_tree_version(), self.version)
+        xml_set = self.handler.get_topo_tree(BkSetEnv.FORMAL).find("Set")
+        self.assertEqual(xml_set.get("bk_set_env"), BkSetEnv.FORMAL)
+
+
+class TestTopoWatch(TestCase):
+    """
+    测试拓扑变更事件同步进程关联信息副本
+    """
+
+    BK_BIZ_ID = 2
+
+    def test_sync_process_related_info_by_host_events(self):
+        # 本地进程仍为变更前的 IP，事件中为新 IP，需按 bk_host_id 定位主机所在模块
+        Process.objects.create(
+            bk_biz_id=self.BK_BIZ_ID,
+            bk_host_innerip="127.0.0.1",
+            bk_cloud_id=0,
+            bk_set_env=BkSetEnv.FORMAL,
+            bk_set_id=1,
+            bk_module_id=10,
+            service_instance_id=1,
+            bk_process_name="nginx",
+            bk_process_id=1,
+            process_template_id=1,
+        )
+        bk_events = [
+            {
+                "bk_cursor": "cursor",
+                "bk_event_type": resource_watch.BkEventType.UPDATE,
+                "bk_detail": {"bk_host_id": 100, "bk_host_innerip": "127.0.0.2", "bk_cloud_id": 0},
+            }
+        ]
+        relations = [{"bk_biz_id": self.BK_BIZ_ID, "bk_set_id": 1, "bk_module_id": 10, "bk_host_id": 100}]
+        with patch.object(resource_watch.CCApi, "find_host_biz_relations", return_value=relations), patch.object(
+            resource_watch.CMDBHandler, "patch_topo_tree_attr", return_value=True
+        ), patch.object(resource_watch.ProcessHandler, "sync_biz_process_by_module_ids") as sync_by_module_ids:
+            resource_watch.handle_topo_events(CMDBHandler.BK_HOST_OBJ_ID, bk_events)
+
+        sync_by_module_ids.assert_called_once_with({10})
+
+    def test_resync_biz_by_topo_events(self):
+        Process.objects.create(
+            bk_biz_id=self.BK_BIZ_ID,
+            bk_host_innerip="127.0.0.1",
+            bk_cloud_id=0,
+            bk_set_env=BkSetEnv.FORMAL,
+            bk_set_id=1,
+            bk_module_id=10,
+            service_instance_id=1,
+            bk_process_name="nginx",
+            bk_process_id=1,
+            process_template_id=1,
+        )
+        bk_events = [
+            {
+                "bk_cursor": "cursor",
+                "bk_event_type": resource_watch.BkEventType.UPDATE,
+                "bk_detail": {"bk_host_id": 100, "bk_host_innerip": "127.0.0.2", "bk_cloud_id": 0},
+            }
+        ]
+        relations = {100: [{"bk_biz_id": self.BK_BIZ_ID, "bk_set_id": 1, "bk_module_id": 10, "bk_host_id": 100}]}
+        with patch.object(
+            resource_watch.CMDBHandler, "refresh_topo_tree_version"
+        ) as refresh_topo_tree_version, patch.object(
+            resource_watch.ProcessHandler, "sync_biz_process"
+        ) as sync_biz_process, patch.object(
+            resource_watch, "sync_all_biz_process"
+        ) as sync_all_biz_process:
+            resource_watch.resync_biz_by_topo_events(CMDBHandler.BK_HOST_OBJ_ID, bk_events, relations)
+
+        # 仅重建该批事件涉及的业务，不清空全部副本
+        refresh_topo_tree_version.assert_called_once_with()
+        sync_biz_process.assert_called_once_with()
+        sync_all_biz_process.assert_not_called()
+
+    def test_resync_all_biz_by_lost_topo_events(self):
+        with patch.object(resource_watch, "refresh_all_biz_topo_tree_version"), patch.object(
+            resource_watch, "sync_all_biz_process"
+        ) as sync_all_biz_process:
+            resource_watch.resync_all_biz_by_lost_topo_events(resource_watch.time.time())
+            # 其他资源的监听线程已在事件丢失后开始重建，不再重复同步
+            resource_watch.resync_all_biz_by_lost_topo_events(resource_watch.TOPO_RESYNC_STATE["started_at"] - 1)
+
+        sync_all_biz_process.assert_called_once_with()
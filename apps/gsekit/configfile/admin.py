@@ -42,3 +42,9 @@ class ConfigTemplateBindingRelationshipAdmin(admin.ModelAdmin):
         "config_template_id",
     ]
     list_filter = ["process_object_type"]
+
+
+@admin.register(models.ConfigContent)
+class ConfigContentAdmin(admin.ModelAdmin):
+    list_display = ["sha256", "created_at"]
+    search_fields = ["sha256"]
@@ -75,3 +75,8 @@ class ForbiddenConfigContentException(ConfigTemplateBaseException):
     ERROR_CODE = "011"
     MESSAGE = _("配置文件内容非法")
     MESSAGE_TPL = _("配置文件内容非法, {err_msg}")
+
+
+class ConfigInstanceUnchangedException(ConfigTemplateBaseException):
+    ERROR_CODE = "012"
+    MESSAGE = _("配置内容与现网一致，跳过下发")
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import json
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from lxml import etree
+
+from apps.gsekit.configfile.handlers.config_version import ConfigVersionHandler
+from apps.utils.basic import list_slice
+from apps.utils.mako_utils.render import get_cache_template, mako_render
+from common.log import logger
+
+# 模板通过 cc、节点遍历方法或迭代/引用 this.cc_* 节点（而非读取其属性）访问进程所在集群/模块/主机以外的拓扑节点
+TOPO_TRAVERSAL_PATTERN = re.compile(
+    r"\bcc\b"
+    r"|\bthis\.cc_\w+\b(?!\s*\.\s*(?:get|attrib|tag|text|keys|items|values)\b)"
+    r"|\b(?:getparent|getroottree|getnext|getprevious|iter\w*|find\w*|xpath)\b"
+)
+
+# 渲染进程池子进程的共享上下文，仅由进程池 initializer 在子进程中设置，父进程中始终为空
+_worker_render_context: Optional[Dict[str, Any]] = None
+
+
+def init_render_worker(shared_context: Dict[str, Any]):
+    """进程池以 fork 方式创建，initargs 随进程对象直接继承，无需序列化 lxml 对象"""
+    global _worker_render_context
+    _worker_render_context = shared_context
+
+
+def render_job_task_configs(render_params: Dict[str, Any], shared_context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    渲染单个任务的全部配置，不访问 DB，可在子进程中执行
+    :param render_params: {
+        "job_task_id": 1,
+        "process_info": {...},
+        "inst_id": 1,
+        "local_inst_id": 1,
+        "configs": [{"config_template_id": 1, "config_version_id": 1, "content": "", "file_name": "", "abs_path": ""}]
+    }
+    :param shared_context: 业务级渲染上下文 {"bk_biz_id", "cc_context", "cc_index", "biz_global_variables"}
+    :return: {"job_task_id": 1, "configs": [{"config_template_id", "config_version_id", "content", "sha256", ...}]}
+    """
+    context = ConfigVersionHandler.get_process_context(
+        render_params["process_info"],
+        shared_context["bk_biz_id"],
+        inst_id=render_params["inst_id"],
+        local_inst_id=render_params["local_inst_id"],
+        cc_context=shared_context["cc_context"],
+        biz_global_variables=shared_context["biz_global_variables"],
+        cc_index=shared_context["cc_index"],
+    )
+    rendered_configs = []
+    for config in render_params["configs"]:
+        rendered_content = mako_render(config["content"], context)
+        rendered_configs.append(
+            {
+                "config_template_id": config["config_template_id"],
+                "config_version_id": config["config_version_id"],
+                "content": rendered_content,
+                "sha256": hashlib.sha256(rendered_content.encode()).hexdigest(),
+                "name": mako_render(config["file_name"], context),
+                "path": mako_render(config["abs_path"], context),
+                "input_fingerprint": config.get("input_fingerprint", ""),
+            }
+        )
+    return {"job_task_id": render_params["job_task_id"], "configs": rendered_configs}
+
+
+def render_job_task_configs_shard(
+    render_params_list: List[Dict[str, Any]], shared_context: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    return [render_job_task_configs(render_params, shared_context) for render_params in render_params_list]
+
+
+def render_job_task_configs_shard_in_worker(render_params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return render_job_task_configs_shard(render_params_list, _worker_render_context)
+
+
+class ConfigGenerateHandler(object):
+    """
+    批量配置渲染
+    任务量超过阈值且配置了渲染进程数时，按分片分发到进程池并行渲染，否则在当前进程中顺序渲染
+    业务上下文通过参数显式传递，同一进程内并发的渲染互不影响
+    """
+
+    def __init__(self, bk_biz_id: int, cc_context, cc_index, biz_global_variables: Dict):
+        self.shared_context = {
+            "bk_biz_id": bk_biz_id,
+            "cc_context": cc_context,
+            "cc_index": cc_index,
+            "biz_global_variables": biz_global_variables,
+        }
+        self.processes = settings.CONFIG_GENERATE_PROCESSES
+        self.shard_size = settings.CONFIG_GENERATE_SHARD_SIZE
+        self._topo_digest = None
+        self._topo_traversal_map = {}
+
+    @staticmethod
+    def sha256(data: Any) -> str:
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    @property
+    def topo_digest(self) -> str:
+        if self._topo_digest is None:
+            self._topo_digest = hashlib.sha256(etree.tostring(self.shared_context["cc_context"])).hexdigest()
+        return self._topo_digest
+
+    @staticmethod
+    def node_attrib(node) -> Optional[Dict[str, str]]:
+        return None if node is None else dict(node.attrib)
+
+    def context_digest(self, process_info: Dict, inst_id: int, local_inst_id: int) -> str:
+        """
+        进程渲染上下文摘要，覆盖 get_process_context 的全部输入
+        拓扑部分仅取进程所在集群/模块/主机节点的属性，业务内其他主机的属性变更不影响摘要
+        """
+        cc_index = self.shared_context["cc_index"]
+        bk_set_name = process_info["set"]["bk_set_name"]
+        bk_module_name = process_info["module"]["bk_module_name"]
+        host_info = process_info["host"]
+        return self.sha256(
+            {
+                "process": process_info["process"],
+                "service_instance_name": process_info["service_instance"]["name"],
+                "host": host_info,
+                "set_name": bk_set_name,
+                "module_name": bk_module_name,
+                "inst_id": inst_id,
+                "local_inst_id": local_inst_id,
+                "cc_set": self.node_attrib(cc_index.get_set(bk_set_name)),
+                "cc_module": self.node_attrib(cc_index.get_module(bk_set_name, bk_module_name)),
+                "cc_host": self.node_attrib(
+                    cc_index.get_host(
+                        bk_set_name, bk_module_name, host_info["bk_host_innerip"], host_info["bk_cloud_id"]
+                    )
+                ),
+                "biz_global_variables": self.shared_context["biz_global_variables"],
+            }
+        )
+
+    def is_topo_traversed(self, config: Dict[str, Any]) -> bool:
+        """模板是否访问进程所在节点以外的拓扑，按配置版本缓存"""
+        config_version_id = config["config_version_id"]
+        if config_version_id not in self._topo_traversal_map:
+            self._topo_traversal_map[config_version_id] = any(
+                TOPO_TRAVERSAL_PATTERN.search(config[field]) for field in ["content", "file_name", "abs_path"]
+            )
+        return self._topo_traversal_map[config_version_id]
+
+    def input_fingerprint(self, context_digest: str, config: Dict[str, Any]) -> str:
+        """
+        配置实例输入指纹：配置版本 + 填充依赖后的模板内容 + 文件名/路径模板 + 渲染上下文
+        模板遍历拓扑树时，补充整棵拓扑树的摘要
+        指纹与最新配置实例一致时，渲染结果必然一致，可跳过渲染
+        """
+        return self.sha256(
+            [
+                config["config_version_id"],
+                hashlib.sha256(config["content"].encode()).hexdigest(),
+                config["file_name"],
+                config["abs_path"],
+                context_digest,
+                self.topo_digest if self.is_topo_traversed(config) else "",
+            ]
+        )
+
+    @staticmethod
+    def precompile_templates(render_params_list: List[Dict[str, Any]]):
+        """在父进程中预编译模板，子进程 fork 后直接命中进程内缓存"""
+        contents = set()
+        for render_params in render_params_list:
+            for config in render_params["configs"]:
+                contents.update([config["content"], config["file_name"], config["abs_path"]])
+        for content in contents:
+            get_cache_template(content)
+
+    @staticmethod
+    def is_fork_safe() -> bool:
+        """
+        仅在单线程的 worker 中 fork，多线程 worker（如 -P threads）fork 时，
+        其它线程持有的锁（模板缓存、logging 等）会被子进程继承且永远无法释放，导致子进程死锁
+        """
+        return threading.active_count() == 1
+
+    def render_in_process_pool(self, render_params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.precompile_templates(render_params_list)
+        # fork 前关闭 DB 连接，避免子进程复用父进程的连接
+        connections.close_all()
+        rendered_results = []
+        with ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=init_render_worker,
+            initargs=(self.shared_context,),
+        ) as executor:
+            for shard_results in executor.map(
+                render_job_task_configs_shard_in_worker, list_slice(render_params_list, self.shard_size)
+            ):
+                rendered_results.extend(shard_results)
+        return rendered_results
+
+    def render(self, render_params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.processes > 1 and len(render_params_list) > self.shard_size and self.is_fork_safe():
+            try:
+                return self.render_in_process_pool(render_params_list)
+            except (BrokenProcessPool, AssertionError, OSError) as error:
+                # 当前 worker 不支持创建子进程（如 daemon 进程），降级为顺序渲染
+                logger.warning(f"[ConfigGenerateHandler] render in process pool failed, fallback: {error}")
+        return render_job_task_configs_shard(render_params_list, self.shared_context)
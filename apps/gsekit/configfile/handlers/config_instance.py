@@ -13,7 +13,13 @@ from typing import Dict, List
 from django.db.models import Q, Max
 
 from apps.gsekit.configfile import exceptions
-from apps.gsekit.configfile.models import ConfigInstance, ConfigTemplateVersion, ConfigTemplate, ConfigSnapshot
+from apps.gsekit.configfile.models import (
+    ConfigContent,
+    ConfigInstance,
+    ConfigTemplateVersion,
+    ConfigTemplate,
+    ConfigSnapshot,
+)
 from apps.gsekit.process.handlers.process import ProcessHandler
 from apps.gsekit.process.models import ProcessInst
 from apps.utils import APIModel
@@ -39,7 +45,8 @@ class ConfigInstanceHandler(APIModel):
         return super().data
 
     def retrieve(self):
-        config_instance_info = model_to_dict(self.data)
+        config_instance_info = model_to_dict(self.data, exclude=["inline_content"])
+        config_instance_info["content"] = self.data.content
 
         # 补充配置模板信息
         try:
@@ -55,9 +62,9 @@ class ConfigInstanceHandler(APIModel):
 
         # 补充配置快照信息
         try:
-            config_snapshot_info = model_to_dict(
-                ConfigSnapshot.objects.get(config_instance_id=config_instance_info["id"])
-            )
+            config_snapshot = ConfigSnapshot.objects.get(config_instance_id=config_instance_info["id"])
+            config_snapshot_info = model_to_dict(config_snapshot, exclude=["inline_content"])
+            config_snapshot_info["content"] = config_snapshot.content
         except ConfigSnapshot.DoesNotExist:
             # 没有执行配置对比检查的情况下，配置快照为空
             config_snapshot_info = {}
@@ -229,7 +236,7 @@ class ConfigInstanceHandler(APIModel):
             ConfigInstance.objects.filter(**filter_conditions)
             .filter(Q(is_latest=True) | Q(is_released=True))
             .order_by("inst_id", "-id")
-            .values("id", "created_at", "content", "is_latest", "is_released", "config_version_id")
+            .values("id", "created_at", "is_latest", "is_released", "config_version_id")
         )
         first_latest_config = next((inst for inst in config_inst_list if inst["is_latest"]), None)
         first_released_config = next((inst for inst in config_inst_list if inst["is_released"]), None)
@@ -245,6 +252,13 @@ class ConfigInstanceHandler(APIModel):
                 "is_latest": True,
             }
 
+        # 仅加载需要展示的配置实例内容
+        selected_configs = [config for config in [result["generated_config"], result["released_config"]] if config]
+        config_inst_id_obj_map = ConfigInstance.objects.in_bulk([config["id"] for config in selected_configs])
+        ConfigContent.fill_contents(config_inst_id_obj_map.values())
+        for config in selected_configs:
+            config["content"] = config_inst_id_obj_map[config["id"]].content
+
         if not result["generated_config"]:
             return result
 
@@ -344,6 +344,7 @@ class ConfigTemplateHandler(APIModel):
         expression_scope: Optional[Dict] = None,
         config_version_ids: Optional[List] = None,
         extra_filter_conditions: Optional[Dict] = None,
+        skip_unchanged: bool = False,
     ):
         """
         生成配置
@@ -353,6 +354,7 @@ class ConfigTemplateHandler(APIModel):
         :param expression_scope: 进程表达式范围
         :param config_version_ids: 配置模板版本列表
         :param extra_filter_conditions: 额外的过滤条件
+        :param skip_unchanged: 是否跳过输入（配置版本、渲染上下文、模板依赖）未变更的配置实例
         :return:
         """
         extra_data = {}
@@ -368,6 +370,8 @@ class ConfigTemplateHandler(APIModel):
                 )
         if extra_filter_conditions:
             extra_data["extra_filter_conditions"] = extra_filter_conditions
+        if skip_unchanged:
+            extra_data["skip_unchanged"] = True
         return JobHandlers(bk_biz_id=bk_biz_id).create_job(
             job_action=Job.JobAction.GENERATE,
             job_object=Job.JobObject.CONFIGFILE,
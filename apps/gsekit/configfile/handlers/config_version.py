@@ -11,9 +11,7 @@ See the License for the specific language governing permissions and limitations
 import re
 from typing import Dict
 
-from django.core.cache import cache
 from django.utils.translation import ugettext as _
-from lxml import etree
 
 from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
 from apps.gsekit.configfile import exceptions
@@ -142,8 +140,6 @@ find all host element of set "qq"
 ************
 """
 
-TEMPLATE_CACHE = {}
-
 
 class ReadOnlyDict(dict):
     """
@@ -178,6 +174,39 @@ class ContextDict(object):
     del __usage__
 
 
+class CCContextIndex(object):
+    """
+    CMDB 拓扑上下文索引
+    遍历一次拓扑树，建立 集群/模块/主机 到 XML 节点的映射，避免每个实例都通过 XPath 线性扫描拓扑树
+    """
+
+    def __init__(self, cc_context):
+        self.sets = {}
+        self.modules = {}
+        self.hosts = {}
+        for cc_set in cc_context.iterchildren("Set"):
+            bk_set_name = cc_set.get("SetName")
+            # 与 find / xpath 保持一致，同名节点取文档顺序中的第一个
+            self.sets.setdefault(bk_set_name, cc_set)
+            for cc_module in cc_set.iterchildren("Module"):
+                bk_module_name = cc_module.get("ModuleName")
+                self.modules.setdefault((bk_set_name, bk_module_name), cc_module)
+                for cc_host in cc_module.iterchildren("Host"):
+                    bk_cloud_id = cc_host.get("bk_cloud_id")
+                    # 主机可能存在多个内网IP，以逗号分隔
+                    for inner_ip in (cc_host.get("InnerIP") or "").split(","):
+                        self.hosts.setdefault((bk_set_name, bk_module_name, inner_ip, bk_cloud_id), cc_host)
+
+    def get_set(self, bk_set_name: str):
+        return self.sets.get(bk_set_name)
+
+    def get_module(self, bk_set_name: str, bk_module_name: str):
+        return self.modules.get((bk_set_name, bk_module_name))
+
+    def get_host(self, bk_set_name: str, bk_module_name: str, bk_host_innerip: str, bk_cloud_id: int):
+        return self.hosts.get((bk_set_name, bk_module_name, bk_host_innerip, str(bk_cloud_id)))
+
+
 class ConfigVersionHandler(APIModel):
     def __init__(self, config_version_id: int = None, config_version_obj: ConfigTemplateVersion = None):
         super().__init__()
@@ -273,7 +302,7 @@ class ConfigVersionHandler(APIModel):
         local_inst_id: int,
         cc_context=None,
         biz_global_variables=None,
-        xpath_cache=None,
+        cc_index=None,
         with_help=False,
     ) -> Dict:
         bk_process_id = process_info["process"]["bk_process_id"]
@@ -288,42 +317,18 @@ class ConfigVersionHandler(APIModel):
             cc_context = cls.get_cc_context(bk_biz_id, bk_set_env)
         if biz_global_variables is None:
             biz_global_variables = CMDBHandler(bk_biz_id=bk_biz_id).biz_global_variables()
-        if xpath_cache is None:
-            xpath_cache = {}
+        if cc_index is None:
+            cc_index = CCContextIndex(cc_context)
 
         attrib = {}
         this_context = ContextDict(ReadOnlyDict(attrib))
+        setattr(this_context, "cc_set", cc_index.get_set(bk_set_name))
+        setattr(this_context, "cc_module", cc_index.get_module(bk_set_name, bk_module_name))
 
-        cc_set_path = f'Set[@SetName="{bk_set_name}"]'
-        if xpath_cache.get(cc_set_path) is not None:
-            cc_set_context = xpath_cache.get(cc_set_path)
-        else:
-            cc_set_context = cc_context.find(cc_set_path)
-            xpath_cache[cc_set_path] = cc_set_context
-        setattr(this_context, "cc_set", cc_set_context)
-
-        cc_module_path = f'Set[@SetName="{bk_set_name}"]/Module[@ModuleName="{bk_module_name}"]'
-        if xpath_cache.get(cc_module_path) is not None:
-            cc_module_context = xpath_cache.get(cc_module_path)
-        else:
-            cc_module_context = cc_context.find(cc_module_path)
-            xpath_cache[cc_module_path] = cc_module_context
-        setattr(this_context, "cc_module", cc_module_context)
-
-        cc_host_path = (
-            f'Set[@SetName="{bk_set_name}"]/'
-            f'Module[@ModuleName="{bk_module_name}"]/'
-            f'Host[lcontains(tokenize(@InnerIP, ","), "{bk_host_innerip}") and @bk_cloud_id="{bk_cloud_id}"]'
-        )
-        if xpath_cache.get(cc_host_path) is not None:
-            cc_host_context = xpath_cache.get(cc_host_path)
-        else:
-            cc_host_context = cc_context.xpath(cc_host_path)[0]
-            xpath_cache[cc_host_path] = cc_host_context
-        try:
-            setattr(this_context, "cc_host", cc_host_context)
-        except IndexError:
+        cc_host_context = cc_index.get_host(bk_set_name, bk_module_name, bk_host_innerip, bk_cloud_id)
+        if cc_host_context is None:
             raise GenerateContextException(_("context[cc_host]生成失败"))
+        setattr(this_context, "cc_host", cc_host_context)
 
         context = {
             "Scope": f"{bk_set_name}.{bk_module_name}.{process_info['service_instance']['name']}"
@@ -363,16 +368,7 @@ class ConfigVersionHandler(APIModel):
 
     @classmethod
     def get_cc_context(cls, bk_biz_id: int, bk_set_env: str):
-
-        cc_xml_doc = cache.get(CMDBHandler.CACHE_TOPO_ATTR_TEMPLATE.format(bk_biz_id=bk_biz_id))
-        if cc_xml_doc is None:
-            cc_xml_doc = CMDBHandler(bk_biz_id=bk_biz_id).cache_topo_tree_attr(bk_set_env)
-        try:
-            cc_context = etree.fromstring(cc_xml_doc)
-        except ValueError as err:
-            logger.exception(f"{err}, etree.fromstring error, cc_xml_doc: {cc_xml_doc}")
-            raise err
-        return cc_context
+        return CMDBHandler(bk_biz_id=bk_biz_id).get_topo_tree(bk_set_env)
 
     @classmethod
     def render(cls, bk_biz_id: int, process_info: dict, content: str):
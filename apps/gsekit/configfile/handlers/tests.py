@@ -10,9 +10,17 @@ See the License for the specific language governing permissions and limitations
 """
 # -*- coding: utf-8 -*-
 
+import datetime
+
 from django.test import TestCase
+from django.utils import timezone
+from lxml import etree
 
 from apps.gsekit.configfile.handlers.config_template import ConfigTemplateHandler
+from apps.gsekit.configfile.handlers.config_version import CCContextIndex
+from apps.gsekit.configfile.models import ConfigContent, ConfigInstance, ConfigSnapshot, ConfigTemplate
+from apps.gsekit.job.models import JobErrCode, JobStatus, JobTask, JobTaskStatusStatistics
+from apps.gsekit.pipeline_plugins.components.collections.configfile import BulkPushConfigService
 from apps.gsekit.process.models import Process
 
 
@@ -61,3 +69,150 @@ class TestConfigTemplateHandlers(TestCase):
         )
         self.assertEqual(count["deleted_relations_count"], 3)
         self.assertEqual(count["created_relations_count"], 0)
+
+
+class TestCCContextIndex(TestCase):
+    CC_XML_DOC = (
+        b'<Application><Set SetName="set1">'
+        b'<Module ModuleName="module1">'
+        b'<Host InnerIP="127.0.0.1,127.0.0.2" bk_cloud_id="0"/><Host InnerIP="127.0.0.3" bk_cloud_id="1"/>'
+        b"</Module></Set></Application>"
+    )
+
+    def test_index_consistent_with_xpath(self):
+        # 导入以注册 XPath 扩展函数
+        from apps.gsekit.cmdb.handlers import cmdb  # noqa
+
+        cc_context = etree.fromstring(self.CC_XML_DOC)
+        cc_index = CCContextIndex(cc_context)
+        for ip, bk_cloud_id in [("127.0.0.1", 0), ("127.0.0.2", 0), ("127.0.0.3", 1)]:
+            xpath_host = cc_context.xpath(
+                f'Set[@SetName="set1"]/Module[@ModuleName="module1"]/'
+                f'Host[lcontains(tokenize(@InnerIP, ","), "{ip}") and @bk_cloud_id="{bk_cloud_id}"]'
+            )[0]
+            self.assertIs(cc_index.get_host("set1", "module1", ip, bk_cloud_id), xpath_host)
+        self.assertIsNone(cc_index.get_host("set1", "module1", "127.0.0.3", 0))
+        self.assertIs(cc_index.get_module("set1", "module1"), cc_context.find("Set/Module"))
+
+
+class TestConfigContent(TestCase):
+    def test_deduplicate_content(self):
+        config_instances = [
+            ConfigInstance(
+                config_version_id=1,
+                config_template_id=1,
+                bk_process_id=bk_process_id,
+                inst_id=1,
+                content="same content",
+                sha256="sha256-of-same-content",
+                expression="TODO",
+            )
+            for bk_process_id in [1, 2, 3]
+        ]
+        ConfigInstance.objects.bulk_create(config_instances)
+        self.assertEqual(ConfigContent.objects.count(), 1)
+
+        config_instances = list(ConfigInstance.objects.filter(bk_process_id__in=[1, 2, 3]))
+        ConfigContent.fill_contents(config_instances)
+        self.assertEqual({config_instance.content for config_instance in config_instances}, {b"same content"})
+
+
+class TestUnchangedConfigInstance(TestCase):
+    def setUp(self):
+        ConfigTemplate.objects.bulk_create(
+            [
+                ConfigTemplate(
+                    config_template_id=1,
+                    bk_biz_id=1,
+                    template_name="template",
+                    file_name="a.conf",
+                    abs_path="/data",
+                    owner="root",
+                    group="root",
+                    filemode="0644",
+                    line_separator=ConfigTemplate.LineSeparator.LF,
+                )
+            ]
+        )
+        self.released_at = timezone.now()
+        ConfigTemplate.objects.update(updated_at=self.released_at - datetime.timedelta(minutes=1))
+        self.released_inst = self.create_config_instance("v1", is_released=True, released_at=self.released_at)
+
+    @staticmethod
+    def create_config_instance(content, **kwargs):
+        config_instance = ConfigInstance(
+            config_version_id=1,
+            config_template_id=1,
+            bk_process_id=1,
+            inst_id=1,
+            name="a.conf",
+            path="/data",
+            content=content,
+            sha256=f"sha256-of-{content}",
+            expression="TODO",
+        )
+        for field, value in kwargs.items():
+            setattr(config_instance, field, value)
+        config_instance.save()
+        return config_instance
+
+    def create_snapshot(self, content, updated_at):
+        snapshot = ConfigSnapshot(
+            config_instance_id=self.released_inst.id, job_instance_id=1, content=content, sha256=f"sha256-of-{content}"
+        )
+        snapshot.save()
+        ConfigSnapshot.objects.filter(id=snapshot.id).update(updated_at=updated_at)
+
+    def assert_unchanged(self, config_instance, is_unchanged=True):
+        unchanged_config_inst_ids = ConfigInstance.get_unchanged_config_inst_ids([config_instance])
+        self.assertEqual(config_instance.id in unchanged_config_inst_ids, is_unchanged)
+
+    def test_same_content(self):
+        self.assert_unchanged(self.create_config_instance("v1"))
+        self.assert_unchanged(self.create_config_instance("v2"), is_unchanged=False)
+
+    def test_snapshot_after_release(self):
+        # 下发后现网被修改
+        self.create_snapshot("v2", self.released_at + datetime.timedelta(minutes=1))
+        self.assert_unchanged(self.create_config_instance("v1"), is_unchanged=False)
+        self.assert_unchanged(self.create_config_instance("v2"))
+
+    def test_snapshot_before_release(self):
+        # 下发前的快照已被下发覆盖，不能代表现网内容
+        self.create_snapshot("v2", self.released_at - datetime.timedelta(minutes=1))
+        self.assert_unchanged(self.create_config_instance("v1"))
+
+    def test_file_attrs_changed(self):
+        self.assert_unchanged(self.create_config_instance("v1", path="/data/new"), is_unchanged=False)
+        self.assert_unchanged(self.create_config_instance("v1", name="b.conf"), is_unchanged=False)
+
+        # 模板所有者、换行符等属性在下发后有修改
+        ConfigTemplate.objects.update(updated_at=self.released_at + datetime.timedelta(minutes=1))
+        self.assert_unchanged(self.create_config_instance("v1"), is_unchanged=False)
+
+    def test_released_without_time(self):
+        ConfigInstance.objects.filter(id=self.released_inst.id).update(released_at=None)
+        self.assert_unchanged(self.create_config_instance("v1"), is_unchanged=False)
+
+    def test_handle_unchanged_job_tasks(self):
+        job_id = 1
+        config_instance = self.create_config_instance("v1")
+        unchanged_config_inst_ids = ConfigInstance.get_unchanged_config_inst_ids([config_instance])
+        self.assertSetEqual(set(unchanged_config_inst_ids), {config_instance.id})
+
+        job_task = JobTask.objects.create(
+            job_id=job_id, bk_process_id=1, pipeline_id="", status=JobStatus.RUNNING, err_code=JobErrCode.RUNNING
+        )
+        JobTaskStatusStatistics.rebuild(job_id)
+        BulkPushConfigService().handle_unchanged_job_tasks([job_task], list(unchanged_config_inst_ids))
+
+        job_task = JobTask.objects.get(id=job_task.id)
+        self.assertEqual((job_task.status, job_task.err_code), (JobStatus.IGNORED, JobErrCode.IGNORED))
+        self.assertFalse(job_task.extra_data["retryable"])
+        config_instance = ConfigInstance.objects.get(id=config_instance.id)
+        self.assertTrue(config_instance.is_released)
+        self.assertIsNotNone(config_instance.released_at)
+
+        statistics = JobTaskStatusStatistics.get_statistics(job_id)
+        self.assertCountEqual(statistics, JobTaskStatusStatistics.rebuild(job_id))
+        self.assertListEqual(statistics, [{"status": JobStatus.IGNORED, "err_code": JobErrCode.IGNORED, "count": 1}])
@@ -293,6 +293,7 @@ GENERATE_CONFIG_REQUEST_BODY = {
         "bk_process_name": "*",
         "bk_process_id": "4[6, 8, 9]",
     },
+    "skip_unchanged": False,
 }
 
 SYNC_GENERATE_CONFIG_REQUEST_BODY = {"bk_process_id": 1}
@@ -325,6 +326,7 @@ RELEASE_CONFIG_REQUEST_BODY = {
         "bk_process_name": "*",
         "bk_process_id": "4[6, 8, 9]",
     },
+    "skip_unchanged": False,
 }
 
 RELEASE_CONFIG_RESPONSE = {"job_id": 1}
@@ -9,7 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 from collections import defaultdict
-from typing import List, Dict, Set, Union
+from typing import List, Dict, Iterable, Set, Union
 
 from django.db import models, transaction
 from django.db.models import Q, Count, Max
@@ -17,10 +17,10 @@ from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from apps.exceptions import ValidationError
-from apps.gsekit.constants import RE_WHITESPACE
+from apps.gsekit.constants import ORM_BATCH_SIZE, RE_WHITESPACE
 from apps.gsekit.process.models import Process
 from apps.utils.local import get_request_username
-from apps.utils.models import OperateRecordModel, CompressedTextField
+from apps.utils.models import OperateRecordModel, OperateRecordModelManager, CompressedTextField
 
 
 class ConfigTemplateVersion(OperateRecordModel):
@@ -186,7 +186,94 @@ class ConfigTemplateBindingRelationship(OperateRecordModel):
         verbose_name_plural = _("配置模板与进程的绑定关系（ConfigTemplateBindingRelationship）")
 
 
-class ConfigInstance(models.Model):
+class ConfigContent(models.Model):
+    """
+    配置内容存储，以 sha256 去重
+    内容一致的配置实例、现网快照共用一份压缩后的内容
+    """
+
+    sha256 = models.CharField(_("SHA256"), max_length=64, primary_key=True)
+    content = CompressedTextField(_("配置内容"))
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+
+    @classmethod
+    def save_contents(cls, sha256_content_map: Dict[str, Union[str, bytes]]) -> None:
+        """批量保存配置内容，已存在的内容直接跳过"""
+        if not sha256_content_map:
+            return
+        existed_sha256s = set(cls.objects.filter(sha256__in=sha256_content_map.keys()).values_list("sha256", flat=True))
+        cls.objects.bulk_create(
+            [
+                cls(sha256=sha256, content=content)
+                for sha256, content in sha256_content_map.items()
+                if sha256 not in existed_sha256s
+            ],
+            batch_size=ORM_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def get_content_map(cls, sha256s: Iterable[str]) -> Dict[str, bytes]:
+        return dict(cls.objects.filter(sha256__in=set(sha256s)).values_list("sha256", "content"))
+
+    @classmethod
+    def fill_contents(cls, objs: Iterable["ContentBlobModel"]) -> None:
+        """批量加载配置内容，避免逐个访问 content 时产生 N+1 查询"""
+        to_be_filled_objs = [obj for obj in objs if not obj.is_content_loaded]
+        if not to_be_filled_objs:
+            return
+        sha256_content_map = cls.get_content_map(obj.sha256 for obj in to_be_filled_objs)
+        for obj in to_be_filled_objs:
+            obj.content = sha256_content_map.get(obj.sha256)
+
+    class Meta:
+        verbose_name = _("配置内容（ConfigContent）")
+        verbose_name_plural = _("配置内容（ConfigContent）")
+
+
+class ContentBlobModelManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """批量创建前将配置内容写入 ConfigContent"""
+        ConfigContent.save_contents({obj.sha256: obj.content for obj in objs if obj.is_content_loaded})
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class ContentBlobModel(models.Model):
+    """
+    内容存储于 ConfigContent 的模型
+    历史数据的内容仍保存在 inline_content（content 列）中，新数据只记录 sha256
+    """
+
+    inline_content = CompressedTextField(_("内容"), db_column="content", null=True, blank=True, default=None)
+    sha256 = models.CharField(_("SHA256"), max_length=64)
+
+    @property
+    def is_content_loaded(self) -> bool:
+        return hasattr(self, "_content") or self.inline_content is not None
+
+    @property
+    def content(self) -> Union[str, bytes]:
+        if self.inline_content is not None:
+            return self.inline_content
+        if not hasattr(self, "_content"):
+            self._content = ConfigContent.get_content_map([self.sha256]).get(self.sha256)
+        return self._content
+
+    @content.setter
+    def content(self, value: Union[str, bytes]):
+        self._content = value
+        self.inline_content = None
+
+    def save(self, *args, **kwargs):
+        if hasattr(self, "_content"):
+            ConfigContent.save_contents({self.sha256: self._content})
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class ConfigInstance(ContentBlobModel):
     IDENTITY_KEY_TEMPLATE = "{bk_process_id}-{config_template_id}-{inst_id}"
     NOT_RELEASED_VERSION = "-"
 
@@ -194,16 +281,18 @@ class ConfigInstance(models.Model):
     config_template_id = models.IntegerField(_("模板ID"), db_index=True)
     bk_process_id = models.IntegerField(_("进程实例ID"), db_index=True)
     inst_id = models.IntegerField(_("实例ID"), db_index=True)
-    content = CompressedTextField(_("实例内容"))
     name = models.CharField(_("文件名"), max_length=64)
     path = models.CharField(_("文件绝对路径"), max_length=256)
     is_latest = models.BooleanField(_("是否最新"), default=True)
     is_released = models.BooleanField(_("是否已发布"), default=False)
-    sha256 = models.CharField(_("SHA256"), max_length=64)
+    released_at = models.DateTimeField(_("下发时间"), null=True, blank=True)
+    input_fingerprint = models.CharField(_("输入指纹"), max_length=64, blank=True, default="")
     expression = models.CharField(_("实例表达式"), max_length=256)
     created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
     created_by = models.CharField(_("创建者"), max_length=32, default="")
 
+    objects = ContentBlobModelManager()
+
     class Status(object):
         GENERATED = "generated"
         NOT_GENERATED = "not_generated"
@@ -269,6 +358,82 @@ class ConfigInstance(models.Model):
                 version_process_mapping[config_instance["config_template_id"]].add(config_instance["bk_process_id"])
         return version_process_mapping
 
+    @classmethod
+    def get_unchanged_config_inst_ids(cls, config_instances: List["ConfigInstance"]) -> Set[int]:
+        """
+        查询与现网内容一致的配置实例
+        现网内容优先取最近一次下发后的现网配置快照（配置检查结果），无快照时取最近一次下发的配置实例
+        以下情况均视为有变更，需要重新下发：
+        - 从未下发，或最近一次下发未记录下发时间（历史数据）
+        - 文件名、路径与最近一次下发不一致
+        - 模板属性（所有者、属组、权限、换行符等）在最近一次下发后有修改
+        :param config_instances: 待下发的配置实例
+        :return: 现网内容一致、无需下发的配置实例 ID
+        """
+        if not config_instances:
+            return set()
+
+        bk_process_ids = {config_instance.bk_process_id for config_instance in config_instances}
+        config_template_ids = {config_instance.config_template_id for config_instance in config_instances}
+        last_released_inst_ids = (
+            cls.objects.filter(
+                bk_process_id__in=bk_process_ids, config_template_id__in=config_template_ids, is_released=True
+            )
+            .order_by()
+            .values("bk_process_id", "config_template_id", "inst_id")
+            .annotate(max_id=Max("id"))
+            .values_list("max_id", flat=True)
+        )
+        last_released_inst_map: Dict[str, Dict] = {
+            cls.IDENTITY_KEY_TEMPLATE.format(**released_inst): released_inst
+            for released_inst in cls.objects.filter(
+                id__in=list(last_released_inst_ids), released_at__isnull=False
+            ).values("id", "bk_process_id", "config_template_id", "inst_id", "name", "path", "sha256", "released_at")
+        }
+        if not last_released_inst_map:
+            return set()
+
+        template_updated_at_map = dict(
+            ConfigTemplate.objects.filter(config_template_id__in=config_template_ids).values_list(
+                "config_template_id", "updated_at"
+            )
+        )
+
+        # 配置检查记录的现网快照，仅关注待下发及最近下发的配置实例
+        identity_key_by_inst_id = {
+            config_instance.id: config_instance.identity_key for config_instance in config_instances
+        }
+        identity_key_by_inst_id.update({inst["id"]: key for key, inst in last_released_inst_map.items()})
+        latest_snapshot_map: Dict[str, Dict] = {}
+        for snapshot in (
+            ConfigSnapshot.objects.filter(config_instance_id__in=identity_key_by_inst_id.keys())
+            .order_by("updated_at", "id")
+            .values("config_instance_id", "sha256", "updated_at")
+        ):
+            latest_snapshot_map[identity_key_by_inst_id[snapshot["config_instance_id"]]] = snapshot
+
+        unchanged_config_inst_ids = set()
+        for config_instance in config_instances:
+            identity_key = config_instance.identity_key
+            last_released_inst = last_released_inst_map.get(identity_key)
+            if not last_released_inst:
+                continue
+            if (config_instance.name, config_instance.path) != (last_released_inst["name"], last_released_inst["path"]):
+                continue
+            template_updated_at = template_updated_at_map.get(config_instance.config_template_id)
+            if not template_updated_at or template_updated_at > last_released_inst["released_at"]:
+                continue
+
+            # 下发后的快照才能代表现网内容，下发前的快照已被本次下发覆盖
+            snapshot = latest_snapshot_map.get(identity_key)
+            if snapshot and snapshot["updated_at"] >= last_released_inst["released_at"]:
+                current_sha256 = snapshot["sha256"]
+            else:
+                current_sha256 = last_released_inst["sha256"]
+            if current_sha256 == config_instance.sha256:
+                unchanged_config_inst_ids.add(config_instance.id)
+        return unchanged_config_inst_ids
+
     @property
     def identity_key(self):
         """标识key"""
@@ -282,11 +447,15 @@ class ConfigInstance(models.Model):
         ordering = ["-id"]
 
 
-class ConfigSnapshot(OperateRecordModel):
+class ConfigSnapshotManager(ContentBlobModelManager, OperateRecordModelManager):
+    pass
+
+
+class ConfigSnapshot(OperateRecordModel, ContentBlobModel):
     config_instance_id = models.BigIntegerField(_("配置实例 ID"), db_index=True)
     job_instance_id = models.BigIntegerField(_("作业实例ID"), db_index=True)
-    content = CompressedTextField(_("快照内容"))
-    sha256 = models.CharField(_("SHA256"), max_length=64)
+
+    objects = ConfigSnapshotManager()
 
     class Meta:
         verbose_name = _("现网配置快照（ConfigSnapshot）")
@@ -151,6 +151,7 @@ class BindProcessToTemplateResponseSerializer(serializers.Serializer):
 class GenerateConfigRequestSerializer(ProcessFilterBaseSerializer):
     config_template_id = serializers.IntegerField(help_text=_("配置模板ID"), required=False)
     config_version_ids = serializers.ListField(help_text=_("配置模板版本ID列表"), required=False)
+    skip_unchanged = serializers.BooleanField(help_text=_("跳过输入未变更的配置实例"), required=False, default=False)
 
     class Meta:
         swagger_schema_fields = {"example": mock_data.GENERATE_CONFIG_REQUEST_BODY}
@@ -171,6 +172,7 @@ class ListGeneratedConfigResponseSerializer(serializers.Serializer):
 class ReleaseConfigRequestSerializer(ProcessFilterBaseSerializer):
     config_template_id = serializers.IntegerField(help_text=_("配置模板ID"), required=False)
     config_version_ids = serializers.ListField(help_text=_("配置模板版本ID列表"), required=False)
+    skip_unchanged = serializers.BooleanField(help_text=_("跳过与现网内容一致的配置实例"), required=False, default=False)
 
     class Meta:
         swagger_schema_fields = {"example": mock_data.RELEASE_CONFIG_REQUEST_BODY}
@@ -263,6 +263,7 @@ class ConfigTemplateViews(ModelViewSet):
                 expression_scope,
                 config_version_ids=config_version_ids,
                 extra_filter_conditions=extra_filter_conditions,
+                skip_unchanged=self.validated_data["skip_unchanged"],
             )
         )
 
@@ -288,6 +289,22 @@ class ConfigTemplateViews(ModelViewSet):
     def release_config(self, request, bk_biz_id, *args, **kwargs):
         config_template_id = self.validated_data.get("config_template_id")
         config_version_ids = self.validated_data.get("config_version_ids", [])
+        extra_data = None
+        if config_template_id:
+            extra_data = {
+                "config_template_ids": [config_template_id],
+                "config_version_ids_map": [
+                    {"config_template_id": config_template_id, "config_version_ids": config_version_ids}
+                ],
+                "extra_filter_conditions": {
+                    "bk_host_innerips": self.validated_data.get("bk_host_innerips"),
+                    "bk_cloud_ids": self.validated_data.get("bk_cloud_ids"),
+                    "is_auto_list": self.validated_data.get("is_auto_list"),
+                    "process_status_list": self.validated_data.get("process_status_list"),
+                },
+            }
+        if self.validated_data["skip_unchanged"]:
+            extra_data = {**(extra_data or {}), "skip_unchanged": True}
         return Response(
             JobHandlers(bk_biz_id=bk_biz_id).create_job(
                 job_object=Job.JobObject.CONFIGFILE,
@@ -295,20 +312,7 @@ class ConfigTemplateViews(ModelViewSet):
                 created_by=request.user.username,
                 scope=self.validated_data.get("scope"),
                 expression_scope=self.validated_data.get("expression_scope"),
-                extra_data={
-                    "config_template_ids": [config_template_id],
-                    "config_version_ids_map": [
-                        {"config_template_id": config_template_id, "config_version_ids": config_version_ids}
-                    ],
-                    "extra_filter_conditions": {
-                        "bk_host_innerips": self.validated_data.get("bk_host_innerips"),
-                        "bk_cloud_ids": self.validated_data.get("bk_cloud_ids"),
-                        "is_auto_list": self.validated_data.get("is_auto_list"),
-                        "process_status_list": self.validated_data.get("process_status_list"),
-                    },
-                }
-                if config_template_id
-                else None,
+                extra_data=extra_data,
             )
         )
 
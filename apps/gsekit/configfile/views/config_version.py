@@ -15,7 +15,6 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from apps.generic import APIViewSet
-from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
 from apps.gsekit.configfile import exceptions
 from apps.gsekit.configfile.handlers.config_version import ConfigVersionHandler
 from apps.gsekit.configfile.serializers import config_version as config_version_serializer
@@ -118,5 +117,4 @@ class ConfigVersionViews(APIViewSet):
         except ForbiddenMakoTemplateException as mako_error:
             raise exceptions.ForbiddenMakoTemplateException(str(mako_error))
         process_info = ProcessHandler(bk_biz_id=bk_biz_id).process_info(bk_process_id=bk_process_id)
-        CMDBHandler(bk_biz_id=bk_biz_id).cache_topo_tree_attr(bk_set_env=process_info["set"]["bk_set_env"])
         return Response(ConfigVersionHandler.render(bk_biz_id, process_info, content))
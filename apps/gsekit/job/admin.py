@@ -39,3 +39,16 @@ class JobTaskAdmin(admin.ModelAdmin):
     search_fields = ["job_id", "pipeline_id"]
     list_filter = ["status", "err_code"]
     list_editable = ["status"]
+
+
+@admin.register(models.JobProcessSnapshot)
+class JobProcessSnapshotAdmin(admin.ModelAdmin):
+    list_display = ["id", "job_id", "bk_process_id"]
+    search_fields = ["job_id", "bk_process_id"]
+
+
+@admin.register(models.JobTaskStatusStatistics)
+class JobTaskStatusStatisticsAdmin(admin.ModelAdmin):
+    list_display = ["id", "job_id", "status", "err_code", "count"]
+    search_fields = ["job_id"]
+    list_filter = ["status", "err_code"]
@@ -8,37 +8,127 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and limitations under the License.
 """
-from collections import Counter
-from itertools import groupby
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List
 
 from celery.task import task
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count, QuerySet
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 from pipeline.eri.runtime import BambooDjangoRuntime
 
 from apps.exceptions import AppBaseException
 from apps.gsekit.adapters import channel_adapter
+from apps.gsekit.constants import ORM_BATCH_SIZE
 from apps.gsekit.job import exceptions
 from apps.gsekit.job.models import (
     JOB_STATUS_CHOICES,
     Job,
     JobErrCode,
+    JobProcessSnapshot,
     JobStatus,
     JobTask,
+    JobTaskStatusStatistics,
 )
 from apps.gsekit.process.handlers.process import ProcessHandler
 from apps.gsekit.utils.expression_utils.serializers import gen_expression
 from apps.utils import APIModel
-from apps.utils.basic import distinct_dict_list
+from apps.utils.basic import distinct_dict_list, list_slice
 from apps.utils.local import get_request
-from apps.utils.models import model_to_dict, queryset_to_dict_list
+from apps.utils.models import model_to_dict
 from common.log import logger
 from bamboo_engine import api
 
 
+class JobRetryEngine(object):
+    """
+    批量重试流水线节点
+    同一节点的子任务合并为一次重试，各节点并发重试，重试进度记录在 job.extra_data["retry_progress"]
+    """
+
+    # 进度上报次数
+    PROGRESS_REPORT_TIMES = 20
+
+    def __init__(self, job: Job, job_task_ids_gby_pipeline_id: Dict[str, List[int]]):
+        self.job = job
+        self.job_task_ids_gby_pipeline_id = job_task_ids_gby_pipeline_id
+        self.total = len(job_task_ids_gby_pipeline_id)
+
+    @staticmethod
+    def retry_node(pipeline_id: str, job_task_ids: List[int]):
+        runtime = BambooDjangoRuntime()
+        try:
+            # 批量操作的流水线
+            data = {key: data_input.value for key, data_input in runtime.get_data_inputs(pipeline_id).items()}
+            data["job_task_ids"] = job_task_ids
+            return api.retry_node(runtime=runtime, node_id=pipeline_id, data=data)
+        finally:
+            # 线程池中的 DB 连接不会被请求周期回收，需主动关闭
+            connection.close()
+
+    def report_progress(self, finished: int, failed: int):
+        retry_progress = {"total": self.total, "finished": finished, "failed": failed}
+        # 重试期间 extra_data 的其他字段可能被流水线更新，仅更新重试进度，避免覆盖
+        with transaction.atomic():
+            extra_data = Job.objects.select_for_update().values_list("extra_data", flat=True).get(id=self.job.id)
+            extra_data["retry_progress"] = retry_progress
+            Job.objects.filter(id=self.job.id).update(extra_data=extra_data)
+        self.job.extra_data["retry_progress"] = retry_progress
+
+    def run(self) -> List:
+        if not self.total:
+            return []
+
+        action_results = []
+        failed_messages: Dict[str, str] = {}
+        report_step = max(self.total // self.PROGRESS_REPORT_TIMES, 1)
+        self.report_progress(finished=0, failed=0)
+        with ThreadPoolExecutor(max_workers=settings.CONCURRENT_NUMBER) as executor:
+            future_pipeline_id_map = {
+                executor.submit(self.retry_node, pipeline_id, job_task_ids): pipeline_id
+                for pipeline_id, job_task_ids in self.job_task_ids_gby_pipeline_id.items()
+            }
+            for finished, future in enumerate(as_completed(future_pipeline_id_map), start=1):
+                pipeline_id = future_pipeline_id_map[future]
+                try:
+                    action_result = future.result()
+                except Exception as error:
+                    logger.exception(f"[JobRetryEngine] retry node -> {pipeline_id} failed: {error}")
+                    failed_messages[pipeline_id] = str(error)
+                else:
+                    if action_result.result:
+                        action_results.append(action_result)
+                    else:
+                        failed_messages[pipeline_id] = action_result.message
+                if finished % report_step == 0 or finished == self.total:
+                    self.report_progress(finished=finished, failed=len(failed_messages))
+
+        if failed_messages:
+            self.handle_failed_nodes(failed_messages)
+        if not action_results:
+            raise exceptions.JobRetryException(message=list(failed_messages.values())[0])
+        return action_results
+
+    def handle_failed_nodes(self, failed_messages: Dict[str, str]):
+        """重试失败的节点，子任务恢复为失败状态，全部节点重试失败时任务置为失败"""
+        extra_data_map = {}
+        for pipeline_id, message in failed_messages.items():
+            retry_error = exceptions.JobRetryException(message=message)
+            for job_task_id in self.job_task_ids_gby_pipeline_id[pipeline_id]:
+                extra_data_map[job_task_id] = {"failed_reason": retry_error.message, "err_code": retry_error.code}
+        for job_task_ids in list_slice(list(extra_data_map.keys()), ORM_BATCH_SIZE):
+            JobTask.bulk_set_status(
+                list(JobTask.objects.filter(id__in=job_task_ids)), JobStatus.FAILED, extra_data_map=extra_data_map
+            )
+        if len(failed_messages) == self.total:
+            self.job.status = JobStatus.FAILED
+            self.job.end_time = timezone.now()
+            self.job.save(update_fields=["status", "end_time"])
+
+
 class JobHandlers(APIModel):
     def __init__(self, bk_biz_id, job_id=None):
         self.bk_biz_id = bk_biz_id
@@ -67,6 +157,9 @@ class JobHandlers(APIModel):
         except Exception as err:
             failed_reason = str(err)
             logger.exception("Failed to create job task: {err}".format(err=failed_reason))
+            # 子任务逐批提交，失败时清理已写入的部分，流程已启动时保留
+            if not job.pipeline_id:
+                manager.clean_job_task()
             job.status = JobStatus.FAILED
             job.is_ready = True
             job.extra_data["failed_reason"] = failed_reason
@@ -117,7 +210,20 @@ class JobHandlers(APIModel):
     @staticmethod
     def get_task_status_counter(job_task_queryset: QuerySet):
         status_counter = {job_status_tuple[0]: 0 for job_status_tuple in JOB_STATUS_CHOICES}
-        status_counter.update(dict(Counter(job_task_queryset.values_list("status", flat=True))))
+        # 在 DB 侧按状态分组计数，避免将全部任务状态拉取到内存
+        status_counter.update(
+            {
+                status_count["status"]: status_count["count"]
+                for status_count in job_task_queryset.order_by().values("status").annotate(count=Count("id"))
+            }
+        )
+        return {"count": sum(status_counter.values()), "status_counter": status_counter}
+
+    def get_job_status_counter(self) -> Dict:
+        """读取任务的状态计数，无需聚合子任务表"""
+        status_counter = {job_status_tuple[0]: 0 for job_status_tuple in JOB_STATUS_CHOICES}
+        for stati in JobTaskStatusStatistics.get_statistics(self.job_id):
+            status_counter[stati["status"]] = status_counter.get(stati["status"], 0) + stati["count"]
         return {"count": sum(status_counter.values()), "status_counter": status_counter}
 
     def get_job_task(self, page: int = 1, pagesize: int = None, conditions: Dict = None) -> Dict:
@@ -134,17 +240,12 @@ class JobHandlers(APIModel):
         for key, value_list in conditions.items():
             if not value_list and value_list != 0:
                 continue
-            if key in ["bk_set_ids", "bk_module_ids", "bk_process_ids", "bk_process_names"]:
-                if key not in ["bk_process_names"]:
-                    treated_value_list = [int(value) for value in value_list if str(value).isdigit()]
-                else:
-                    treated_value_list = value_list
-                obj_id = key.split("_")[1]
-                filter_conditions[
-                    f"extra_data__process_info__{obj_id}__{key_filter_field_map[key]}"
-                ] = treated_value_list
-            elif key in ["statuses"]:
-                filter_conditions[f"{key_filter_field_map[key]}"] = value_list
+            if key in ["bk_set_ids", "bk_module_ids", "bk_process_ids"]:
+                filter_conditions[key_filter_field_map[key]] = [
+                    int(value) for value in value_list if str(value).isdigit()
+                ]
+            elif key in ["bk_process_names", "statuses"]:
+                filter_conditions[key_filter_field_map[key]] = value_list
             else:
                 filter_conditions[key] = value_list
         job_task_queryset = JobTask.objects.filter(**filter_conditions)
@@ -153,14 +254,20 @@ class JobHandlers(APIModel):
             job_task_page = job_task_queryset[pagesize * (page - 1) : pagesize * page]
         else:
             job_task_page = job_task_queryset
-        return {
-            "list": [model_to_dict(job_task) for job_task in job_task_page],
-            **self.get_task_status_counter(job_task_queryset),
-        }
+        if filter_conditions == {"job_id": self.data.id}:
+            status_counter = self.get_job_status_counter()
+        else:
+            status_counter = self.get_task_status_counter(job_task_queryset)
+        job_task_page = list(job_task_page)
+        JobTask.fill_process_infos(job_task_page)
+        return {"list": [job_task.to_dict() for job_task in job_task_page], **status_counter}
 
     def job_task_statistics(self):
         """任务统计"""
-        statistics = JobTask.objects.filter(job_id=self.job_id).values("err_code").annotate(count=Count("err_code"))
+        err_code_count_map = defaultdict(int)
+        for stati in JobTaskStatusStatistics.get_statistics(self.job_id):
+            err_code_count_map[stati["err_code"]] += stati["count"]
+        statistics = [{"err_code": err_code, "count": count} for err_code, count in err_code_count_map.items()]
         err_code_msg_map = JobErrCode.all_err_code_msg_map()
         for stati in statistics:
             err_code = stati["err_code"]
@@ -175,15 +282,16 @@ class JobHandlers(APIModel):
     def get_job_status(self, job_task_id_list: List[int] = None) -> Dict:
         if job_task_id_list is None:
             job_task_id_list = []
+        job_tasks = list(JobTask.objects.filter(job_id=self.data.id, id__in=job_task_id_list))
+        JobTask.fill_process_infos(job_tasks)
         return {
             "job_info": model_to_dict(self.data),
-            "job_tasks": queryset_to_dict_list(JobTask.objects.filter(job_id=self.data.id, id__in=job_task_id_list)),
-            **self.get_task_status_counter(JobTask.objects.filter(job_id=self.data.id)),
+            "job_tasks": [job_task.to_dict() for job_task in job_tasks],
+            **self.get_job_status_counter(),
         }
 
     def retry(self, job_task_id_list: List = None):
         """重试失败的任务"""
-        runtime = BambooDjangoRuntime()
         status_to_be_retry = [JobStatus.FAILED, JobStatus.PENDING]
 
         # 若未指定子任务重试，则重试所有子任务
@@ -191,33 +299,28 @@ class JobHandlers(APIModel):
             job_tasks = JobTask.objects.filter(job_id=self.job_id, status__in=status_to_be_retry)
         else:
             job_tasks = JobTask.objects.filter(id__in=job_task_id_list, status__in=status_to_be_retry)
-        job_tasks = job_tasks.only("id", "pipeline_id")
 
-        action_results = []
+        # 事务内仅重置状态，流水线节点重试在事务外并发执行，避免长事务
+        job_task_ids_gby_pipeline_id = defaultdict(list)
         with transaction.atomic():
-            job = Job.objects.get(id=self.job_id)
+            job = Job.objects.select_for_update().get(id=self.job_id)
             job.status = JobStatus.PENDING
             job.save(update_fields=["status"])
-            job_tasks.update(status=JobStatus.PENDING, err_code=JobErrCode.PENDING)
-            job_tasks_gby_pipeline_id = groupby(sorted(job_tasks, key=lambda t: t.pipeline_id), lambda x: x.pipeline_id)
-            for pipeline_id, pipeline_job_tasks in job_tasks_gby_pipeline_id:
+            for job_task_id, pipeline_id in job_tasks.values_list("id", "pipeline_id"):
                 # pipeline node id 为空 表示节点暂未执行，忽略
-                if not pipeline_id:
-                    continue
-                job_task_ids = [job_task.id for job_task in pipeline_job_tasks]
-                # 批量操作的流水线
-                data = {key: data_input.value for key, data_input in runtime.get_data_inputs(pipeline_id).items()}
-                data["job_task_ids"] = job_task_ids
-                action_result = api.retry_node(runtime=runtime, node_id=pipeline_id, data=data)
-                if not action_result.result:
-                    raise exceptions.JobRetryException(message=action_result.message)
-                action_results.append(action_result)
-        return action_results
+                if pipeline_id:
+                    job_task_ids_gby_pipeline_id[pipeline_id].append(job_task_id)
+            job_tasks.update(status=JobStatus.PENDING, err_code=JobErrCode.PENDING)
+
+        return JobRetryEngine(job, job_task_ids_gby_pipeline_id).run()
 
     def search_ip(self, status=None):
         """根据状态查询主机信息"""
-        job_tasks = JobTask.objects.filter(job_id=self.job_id).only("extra_data")
+        job_tasks = JobTask.objects.filter(job_id=self.job_id)
         if status:
             job_tasks = job_tasks.filter(status=status)
-        hosts = [job_task.extra_data["process_info"]["host"] for job_task in job_tasks]
+        process_infos = JobProcessSnapshot.objects.filter(
+            job_id=self.job_id, bk_process_id__in=job_tasks.values("bk_process_id")
+        ).values_list("process_info", flat=True)
+        hosts = [process_info["host"] for process_info in process_infos]
         return distinct_dict_list(hosts)
@@ -9,12 +9,12 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 import logging
-from collections import defaultdict
-from typing import List, Dict
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
 
 from django.conf import settings
 from django.db import models, transaction
-from django.db.models import QuerySet, Q
+from django.db.models import Count, F, QuerySet, Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -24,6 +24,7 @@ from apps.gsekit.configfile.models import ConfigTemplateBindingRelationship, Con
 from apps.gsekit.process.models import Process
 from apps.gsekit import constants
 from apps.prometheus.models import export_job_prometheus_mixin
+from apps.utils.models import model_to_dict
 
 logger = logging.getLogger("app")
 
@@ -158,9 +159,143 @@ class Job(export_job_prometheus_mixin(), models.Model):
         verbose_name_plural = _("任务历史（Job）")
 
 
+class JobProcessSnapshot(models.Model):
+    """
+    任务进程快照，同一任务下同一进程的所有实例共享一份 CMDB 进程信息（主机、集群、模块、进程属性等）
+    """
+
+    job_id = models.IntegerField(_("任务ID"), db_index=True)
+    bk_process_id = models.IntegerField(_("进程ID"))
+    process_info = models.JSONField(_("进程信息"), default=dict)
+
+    @classmethod
+    def get_process_info_map(cls, job_process_ids: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Dict]:
+        """
+        批量查询进程快照
+        :param job_process_ids: [(job_id, bk_process_id), ...]
+        :return: {(job_id, bk_process_id): process_info}
+        """
+        bk_process_ids_gby_job_id = defaultdict(set)
+        for job_id, bk_process_id in job_process_ids:
+            bk_process_ids_gby_job_id[job_id].add(bk_process_id)
+
+        process_info_map = {}
+        for job_id, bk_process_ids in bk_process_ids_gby_job_id.items():
+            snapshots = cls.objects.filter(job_id=job_id, bk_process_id__in=bk_process_ids).values(
+                "bk_process_id", "process_info"
+            )
+            for snapshot in snapshots:
+                process_info_map[(job_id, snapshot["bk_process_id"])] = snapshot["process_info"]
+        return process_info_map
+
+    @classmethod
+    def filter_bk_process_ids(cls, job_id: int, **process_info_conditions) -> QuerySet:
+        """按进程信息过滤，返回进程ID子查询，process_info_conditions 的 key 为 process_info 下的查询路径"""
+        return cls.objects.filter(
+            job_id=job_id, **{f"process_info__{key}": value for key, value in process_info_conditions.items()}
+        ).values("bk_process_id")
+
+    class Meta:
+        unique_together = ("job_id", "bk_process_id")
+        verbose_name = _("任务进程快照")
+        verbose_name_plural = _("任务进程快照")
+
+
+class JobTaskStatusStatistics(models.Model):
+    """
+    任务状态计数（状态 × 错误码），随子任务状态变更增量更新，任务详情轮询时直接读取，无需聚合子任务表
+    """
+
+    job_id = models.IntegerField(_("任务ID"), db_index=True)
+    status = models.CharField(_("任务状态"), max_length=16, choices=JOB_STATUS_CHOICES)
+    err_code = models.IntegerField(_("错误码"))
+    count = models.IntegerField(_("数量"), default=0)
+
+    @classmethod
+    def apply_deltas(cls, deltas: Dict[Tuple[int, str, int], int]):
+        """
+        增量更新计数
+        :param deltas: {(job_id, status, err_code): 变化量}
+        """
+        with transaction.atomic():
+            # 固定加锁顺序，避免并发更新时死锁
+            for (job_id, status, err_code), delta in sorted(deltas.items()):
+                if not delta:
+                    continue
+                conditions = {"job_id": job_id, "status": status, "err_code": err_code}
+                if not cls.objects.filter(**conditions).update(count=F("count") + delta):
+                    cls.objects.get_or_create(**conditions, defaults={"count": 0})
+                    cls.objects.filter(**conditions).update(count=F("count") + delta)
+
+    @classmethod
+    def record_transitions(cls, before: List[Tuple[int, str, int]], after: List[Tuple[int, str, int]]):
+        """根据状态变更前后的 (job_id, status, err_code) 列表更新计数"""
+        # 异常类错误码为字符串，统一转为整型与 DB 中一致
+        deltas = Counter((job_id, status, int(err_code)) for job_id, status, err_code in after)
+        deltas.subtract(Counter((job_id, status, int(err_code)) for job_id, status, err_code in before))
+        cls.apply_deltas(deltas)
+
+    @classmethod
+    def rebuild(cls, job_id: int) -> List[Dict]:
+        """按子任务表重建任务的状态计数"""
+        with transaction.atomic():
+            statistics = list(
+                JobTask.objects.filter(job_id=job_id)
+                .order_by()
+                .values("status", "err_code")
+                .annotate(count=Count("id"))
+            )
+            cls.objects.filter(job_id=job_id).delete()
+            cls.objects.bulk_create([cls(job_id=job_id, **stati) for stati in statistics])
+        return statistics
+
+    @classmethod
+    def get_statistics(cls, job_id: int) -> List[Dict]:
+        """
+        查询任务的状态计数，历史任务无计数时按子任务表重建
+        :return: [{"status": "pending", "err_code": 1, "count": 1}]
+        """
+        statistics = list(cls.objects.filter(job_id=job_id, count__gt=0).values("status", "err_code", "count"))
+        if statistics or cls.objects.filter(job_id=job_id).exists():
+            return statistics
+        return [stati for stati in cls.rebuild(job_id) if stati["count"]]
+
+    class Meta:
+        unique_together = ("job_id", "status", "err_code")
+        verbose_name = _("任务状态统计")
+        verbose_name_plural = _("任务状态统计")
+
+
+class JobTaskQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if "status" not in kwargs and "err_code" not in kwargs:
+            return super().update(**kwargs)
+        if any(hasattr(kwargs.get(field), "resolve_expression") for field in ["status", "err_code"]):
+            # 表达式（如 bulk_update 生成的 Case）无法确定变更后的状态，由调用方自行记录状态变更
+            return super().update(**kwargs)
+        # 变更状态时同步更新任务状态计数，锁定待更新的子任务，保证计数与子任务表一致
+        with transaction.atomic(using=self.db):
+            before = list(self.select_for_update().values_list("job_id", "status", "err_code"))
+            rows = super().update(**kwargs)
+            after = [
+                (job_id, kwargs.get("status", status), kwargs.get("err_code", err_code))
+                for job_id, status, err_code in before
+            ]
+            JobTaskStatusStatistics.record_transitions(before, after)
+        return rows
+
+
 class JobTask(models.Model):
     job_id = models.IntegerField(_("任务ID"), db_index=True)
     bk_process_id = models.IntegerField(_("进程ID"), db_index=True)
+    inst_id = models.IntegerField(_("InstID"), default=0)
+    local_inst_id = models.IntegerField(_("LocalInstID"), default=0)
+    # 冗余的进程拓扑信息，用于任务详情过滤
+    bk_set_id = models.IntegerField(_("集群ID"), default=0)
+    bk_module_id = models.IntegerField(_("模块ID"), default=0)
+    bk_host_innerip = models.CharField(_("主机IP"), max_length=64, default="")
+    bk_cloud_id = models.IntegerField(_("云区域ID"), default=0)
+    bk_process_name = models.CharField(_("进程名称"), max_length=255, default="")
     status = models.CharField(
         _("任务状态"), max_length=16, db_index=True, choices=JOB_STATUS_CHOICES, default=JobStatus.PENDING
     )
@@ -170,13 +305,102 @@ class JobTask(models.Model):
     pipeline_id = models.CharField(_("PIPELINE ID"), max_length=33, db_index=True)
     extra_data = models.JSONField(_("额外数据"), default=dict)
 
+    objects = models.Manager.from_queryset(JobTaskQuerySet)()
+
+    @property
+    def process_info(self) -> Dict:
+        """任务进程信息，优先取已填充的进程快照，兼容进程信息存储在 extra_data 中的历史任务"""
+        if getattr(self, "_process_info", None) is None:
+            if "process_info" in self.extra_data:
+                self._process_info = self.extra_data["process_info"]
+            else:
+                self.fill_process_infos([self])
+        return getattr(self, "_process_info", None)
+
+    @process_info.setter
+    def process_info(self, process_info: Dict):
+        self._process_info = process_info
+
+    @staticmethod
+    def get_topo_fields(process_info: Dict) -> Dict:
+        """从进程信息中提取冗余的拓扑过滤字段"""
+        return {
+            "bk_set_id": process_info["set"]["bk_set_id"],
+            "bk_module_id": process_info["module"]["bk_module_id"],
+            "bk_host_innerip": process_info["host"]["bk_host_innerip"],
+            "bk_cloud_id": process_info["host"]["bk_cloud_id"],
+            "bk_process_name": process_info["process"]["bk_process_name"] or "",
+        }
+
+    @classmethod
+    def fill_process_infos(cls, job_tasks: List["JobTask"]):
+        """批量填充任务的进程快照，同一进程的任务共享同一份进程信息，批量读取 process_info 前调用"""
+        to_be_filled_job_tasks = [
+            job_task
+            for job_task in job_tasks
+            if getattr(job_task, "_process_info", None) is None
+            and "extra_data" not in job_task.get_deferred_fields()
+            and "process_info" not in job_task.extra_data
+        ]
+        if not to_be_filled_job_tasks:
+            return
+        process_info_map = JobProcessSnapshot.get_process_info_map(
+            [(job_task.job_id, job_task.bk_process_id) for job_task in to_be_filled_job_tasks]
+        )
+        for job_task in to_be_filled_job_tasks:
+            job_task.process_info = process_info_map.get((job_task.job_id, job_task.bk_process_id))
+
+    def to_dict(self) -> Dict:
+        job_task_dict = model_to_dict(self)
+        # 进程信息及实例ID仍放在 extra_data 中返回，保持接口结构不变
+        job_task_dict["extra_data"] = {
+            **self.extra_data,
+            "process_info": self.process_info,
+            "inst_id": self.inst_id,
+            "local_inst_id": self.local_inst_id,
+        }
+        return job_task_dict
+
     @classmethod
     def set_status_by_id(cls, job_task_id: int, status, extra_data=None):
         with transaction.atomic():
-            job_task = cls.objects.get(id=job_task_id)
+            job_task = cls.objects.select_for_update().get(id=job_task_id)
             job_task.set_status(status, extra_data)
 
     def set_status(self, status, extra_data=None):
+        with transaction.atomic():
+            # 内存中的实例可能已过期，变更前状态以加锁读取的 DB 数据为准
+            before = list(
+                JobTask.objects.filter(id=self.id).select_for_update().values_list("job_id", "status", "err_code")
+            )
+            self.apply_status(status, extra_data)
+            self.save()
+            JobTaskStatusStatistics.record_transitions(before, [(self.job_id, self.status, self.err_code)])
+
+    @classmethod
+    def bulk_set_status(cls, job_tasks: List["JobTask"], status, extra_data_map: Dict[int, Dict] = None):
+        """批量设置任务状态，extra_data_map 为 {job_task_id: extra_data}"""
+        extra_data_map = extra_data_map or {}
+        with transaction.atomic():
+            # 内存中的实例可能已过期，变更前状态以加锁读取的 DB 数据为准
+            before = list(
+                cls.objects.filter(id__in=[job_task.id for job_task in job_tasks])
+                .order_by("id")
+                .select_for_update()
+                .values_list("job_id", "status", "err_code")
+            )
+            for job_task in job_tasks:
+                job_task.apply_status(status, extra_data_map.get(job_task.id))
+            # 绕过 JobTaskQuerySet.update，状态变更仅在下方记录一次
+            cls._base_manager.bulk_update(
+                job_tasks, fields=["status", "err_code", "end_time", "extra_data"], batch_size=constants.ORM_BATCH_SIZE
+            )
+            JobTaskStatusStatistics.record_transitions(
+                before, [(job_task.job_id, job_task.status, job_task.err_code) for job_task in job_tasks]
+            )
+
+    def apply_status(self, status, extra_data=None):
+        """设置任务状态及额外数据，不保存"""
         if extra_data is None:
             extra_data = {}
         self.err_code = JobStatus.get_status_err_code(status)
@@ -197,8 +421,6 @@ class JobTask(models.Model):
                 self.err_code = extra_data.get("err_code")
             self.extra_data.update(extra_data)
 
-        self.save()
-
     def set_extra_data(self, extra_data):
         if "retryable" not in extra_data:
             extra_data["retryable"] = True
@@ -228,7 +450,7 @@ class JobTask(models.Model):
             config_instance_ids = ConfigInstance.objects.filter(
                 config_template_id__in=config_template_ids,
                 bk_process_id=self.bk_process_id,
-                inst_id=self.extra_data["inst_id"],
+                inst_id=self.inst_id,
                 is_latest=True,
             ).values_list("id", flat=True)
             if not config_instance_ids:
@@ -240,7 +462,7 @@ class JobTask(models.Model):
         return list(set(config_instance_ids))
 
     def get_process_binding_config_template_ids(self):
-        process_info = self.extra_data["process_info"]
+        process_info = self.process_info
         bk_process_id = process_info["process"]["bk_process_id"]
         process_template_id = process_info["process_template"].get("id") or 0
         return ConfigTemplateBindingRelationship.get_process_binding_config_template_ids(
@@ -261,11 +483,11 @@ class JobTask(models.Model):
 
         # 查询配置模板和进程的绑定关系，用于匹配
         for job_task in job_tasks:
-            process_template_id = job_task.extra_data["process_info"]["process_template"].get("id")
+            process_template_id = job_task.process_info["process_template"].get("id")
             if process_template_id:
                 process_template_ids.append(process_template_id)
             else:
-                bk_process_ids.append(job_task.extra_data["process_info"]["process"]["bk_process_id"])
+                bk_process_ids.append(job_task.process_info["process"]["bk_process_id"])
         relations = ConfigTemplateBindingRelationship.objects.filter(
             Q(process_object_type=Process.ProcessObjectType.INSTANCE, process_object_id__in=bk_process_ids)
             | Q(process_object_type=Process.ProcessObjectType.TEMPLATE, process_object_id__in=process_template_ids)
@@ -281,8 +503,8 @@ class JobTask(models.Model):
 
             # 未指定配置模板的，需进一步匹配
             for relation in relations:
-                process_template_id = job_task.extra_data["process_info"]["process_template"].get("id")
-                bk_process_id = job_task.extra_data["process_info"]["process"]["bk_process_id"]
+                process_template_id = job_task.process_info["process_template"].get("id")
+                bk_process_id = job_task.process_info["process"]["bk_process_id"]
 
                 if (
                     relation.process_object_type == Process.ProcessObjectType.TEMPLATE
@@ -296,6 +518,13 @@ class JobTask(models.Model):
         return job_task_config_template_ids_map
 
     class Meta:
+        index_together = [
+            ("job_id", "status"),
+            ("job_id", "bk_set_id"),
+            ("job_id", "bk_module_id"),
+            ("job_id", "bk_process_name"),
+            ("job_id", "bk_host_innerip", "bk_cloud_id"),
+        ]
         verbose_name = _("任务详情（JobTask）")
         verbose_name_plural = _("任务详情（JobTask）")
 
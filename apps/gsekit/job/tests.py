@@ -9,11 +9,21 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+from django.db.models import F
 from django.test import TestCase
+from mock import MagicMock, patch
 
 from apps.gsekit.configfile.models import ConfigTemplateBindingRelationship
-from apps.gsekit.job.handlers import JobHandlers
-from apps.gsekit.job.models import Job, JobTask
+from apps.gsekit.job import exceptions
+from apps.gsekit.job.handlers import JobHandlers, JobRetryEngine
+from apps.gsekit.job.models import (
+    Job,
+    JobErrCode,
+    JobProcessSnapshot,
+    JobStatus,
+    JobTask,
+    JobTaskStatusStatistics,
+)
 from apps.gsekit.process.models import Process
 from apps.utils.test_utils.tests import patch_get_request
 
@@ -47,6 +57,40 @@ class TestJobHandlers(TestCase):
             expression_scope=expression_scope,
         )
 
+    def test_get_job_task(self):
+        job = Job.objects.create(
+            bk_biz_id=self.BK_BIZ_ID,
+            job_object=Job.JobObject.PROCESS,
+            job_action=Job.JobAction.START,
+            scope={},
+            created_by="admin",
+        )
+        JobTask.objects.bulk_create(
+            [
+                JobTask(job_id=job.id, bk_process_id=1, bk_set_id=1, bk_process_name="p1", pipeline_id=""),
+                JobTask(job_id=job.id, bk_process_id=1, bk_set_id=1, bk_process_name="p1", pipeline_id="", inst_id=2),
+                JobTask(
+                    job_id=job.id,
+                    bk_process_id=2,
+                    bk_set_id=2,
+                    bk_process_name="p2",
+                    pipeline_id="",
+                    status=JobStatus.FAILED,
+                ),
+            ]
+        )
+        job_handler = JobHandlers(bk_biz_id=self.BK_BIZ_ID, job_id=job.id)
+
+        result = job_handler.get_job_task(conditions={"bk_set_ids": ["1"], "bk_process_names": ["p1"]})
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(result["status_counter"][JobStatus.PENDING], 2)
+        self.assertEqual(result["status_counter"][JobStatus.FAILED], 0)
+
+        result = job_handler.get_job_task(page=1, pagesize=1)
+        self.assertEqual(len(result["list"]), 1)
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["status_counter"][JobStatus.FAILED], 1)
+
 
 class TestJobModels(TestCase):
     def test_get_job_tasks_config_template_ids_map(self):
@@ -127,3 +171,161 @@ class TestJobModels(TestCase):
         job_tasks = JobTask.objects.filter(job_id=job_id)
         job_task_config_template_ids_map = JobTask.get_job_tasks_config_template_ids_map(job_tasks)
         self.assertDictEqual(job_task_config_template_ids_map, {1: [1, 2], 2: [3], 3: [1, 2, 3, 4]})
+
+    def test_fill_process_infos_from_snapshot(self):
+        job_id = 2
+        bk_process_id = 111
+        process_info = {"process_template": {"id": None}, "process": {"bk_process_id": bk_process_id}}
+        JobProcessSnapshot.objects.create(job_id=job_id, bk_process_id=bk_process_id, process_info=process_info)
+        JobTask.objects.bulk_create(
+            [
+                JobTask(job_id=job_id, bk_process_id=bk_process_id, inst_id=inst_id, local_inst_id=1, pipeline_id="")
+                for inst_id in [1, 2]
+            ]
+        )
+
+        # 任务列表 + 进程快照，共两次查询
+        with self.assertNumQueries(2):
+            job_tasks = list(JobTask.objects.filter(job_id=job_id).order_by("inst_id"))
+            JobTask.fill_process_infos(job_tasks)
+        # 未显式填充时不额外查询进程快照
+        with self.assertNumQueries(1):
+            list(JobTask.objects.filter(job_id=job_id))
+        for job_task in job_tasks:
+            self.assertDictEqual(job_task.process_info, process_info)
+        self.assertListEqual([job_task.to_dict()["extra_data"]["inst_id"] for job_task in job_tasks], [1, 2])
+
+    def test_job_task_status_statistics(self):
+        job_id = 3
+        JobTask.objects.bulk_create(
+            [JobTask(job_id=job_id, bk_process_id=bk_process_id, pipeline_id="") for bk_process_id in [1, 2, 3]]
+        )
+        self.assertListEqual(
+            JobTaskStatusStatistics.get_statistics(job_id),
+            [{"status": JobStatus.PENDING, "err_code": JobErrCode.PENDING, "count": 3}],
+        )
+
+        JobTask.objects.get(job_id=job_id, bk_process_id=1).set_status(JobStatus.SUCCEEDED)
+        JobTask.objects.filter(job_id=job_id, bk_process_id__in=[2, 3]).update(
+            status=JobStatus.RUNNING, err_code=JobErrCode.RUNNING
+        )
+        JobTask.set_status_by_id(JobTask.objects.get(job_id=job_id, bk_process_id=3).id, JobStatus.FAILED)
+
+        statistics = JobTaskStatusStatistics.get_statistics(job_id)
+        self.assertCountEqual(statistics, JobTaskStatusStatistics.rebuild(job_id))
+        self.assertCountEqual(
+            statistics,
+            [
+                {"status": JobStatus.SUCCEEDED, "err_code": JobErrCode.SUCCEEDED, "count": 1},
+                {"status": JobStatus.RUNNING, "err_code": JobErrCode.RUNNING, "count": 1},
+                {"status": JobStatus.FAILED, "err_code": JobErrCode.FAILED, "count": 1},
+            ],
+        )
+
+    def test_bulk_set_status_statistics(self):
+        job_id = 4
+        JobTask.objects.bulk_create(
+            [
+                JobTask(job_id=job_id, bk_process_id=bk_process_id, pipeline_id="", status=JobStatus.RUNNING)
+                for bk_process_id in [1, 2, 3]
+            ]
+        )
+        JobTaskStatusStatistics.rebuild(job_id)
+
+        job_tasks = list(JobTask.objects.filter(job_id=job_id, bk_process_id__in=[1, 2]).order_by("id"))
+        JobTask.bulk_set_status(
+            job_tasks, JobStatus.FAILED, extra_data_map={job_tasks[0].id: {"err_code": JobErrCode.OTHER}}
+        )
+        # 表达式更新不记录状态变更，也不影响已有计数
+        JobTask.objects.filter(job_id=job_id).update(end_time=None, err_code=F("err_code"))
+
+        self.assertDictEqual(
+            dict(JobTask.objects.filter(job_id=job_id).values_list("bk_process_id", "err_code")),
+            {1: JobErrCode.OTHER, 2: JobErrCode.FAILED, 3: JobErrCode.PENDING},
+        )
+        statistics = JobTaskStatusStatistics.get_statistics(job_id)
+        self.assertCountEqual(statistics, JobTaskStatusStatistics.rebuild(job_id))
+        self.assertCountEqual(
+            statistics,
+            [
+                {"status": JobStatus.FAILED, "err_code": JobErrCode.OTHER, "count": 1},
+                {"status": JobStatus.FAILED, "err_code": JobErrCode.FAILED, "count": 1},
+                {"status": JobStatus.RUNNING, "err_code": JobErrCode.PENDING, "count": 1},
+            ],
+        )
+
+
+class TestJobRetryEngine(TestCase):
+    def setUp(self):
+        self.job = Job.objects.create(
+            bk_biz_id=1,
+            job_object=Job.JobObject.PROCESS,
+            job_action=Job.JobAction.START,
+            scope={},
+            created_by="admin",
+            status=JobStatus.RUNNING,
+        )
+        JobTask.objects.bulk_create(
+            [
+                JobTask(job_id=self.job.id, bk_process_id=bk_process_id, pipeline_id="", status=JobStatus.RUNNING)
+                for bk_process_id in [1, 2, 3]
+            ]
+        )
+        JobTaskStatusStatistics.rebuild(self.job.id)
+        job_task_ids = list(JobTask.objects.filter(job_id=self.job.id).order_by("id").values_list("id", flat=True))
+        self.job_task_ids_gby_pipeline_id = {"node1": job_task_ids[:2], "node2": job_task_ids[2:]}
+
+    @staticmethod
+    def mock_retry_node(failed_pipeline_ids):
+        def retry_node(pipeline_id, job_task_ids):
+            if pipeline_id in failed_pipeline_ids:
+                raise Exception(f"{pipeline_id} failed")
+            return MagicMock(result=True)
+
+        return retry_node
+
+    def test_group_by_node(self):
+        with patch.object(JobRetryEngine, "retry_node", side_effect=self.mock_retry_node([])) as retry_node:
+            action_results = JobRetryEngine(self.job, self.job_task_ids_gby_pipeline_id).run()
+        self.assertEqual(len(action_results), 2)
+        # 同一节点的子任务合并为一次重试
+        self.assertCountEqual(
+            [call[0] for call in retry_node.call_args_list], list(self.job_task_ids_gby_pipeline_id.items())
+        )
+
+    def test_partial_failure(self):
+        # 重试期间 extra_data 的其他字段被更新
+        Job.objects.filter(id=self.job.id).update(extra_data={"pipeline_tree": {}})
+        with patch.object(JobRetryEngine, "retry_node", side_effect=self.mock_retry_node(["node2"])):
+            action_results = JobRetryEngine(self.job, self.job_task_ids_gby_pipeline_id).run()
+        self.assertEqual(len(action_results), 1)
+
+        job = Job.objects.get(id=self.job.id)
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        self.assertDictEqual(
+            job.extra_data, {"pipeline_tree": {}, "retry_progress": {"total": 2, "finished": 2, "failed": 1}}
+        )
+        failed_job_task = JobTask.objects.get(id=self.job_task_ids_gby_pipeline_id["node2"][0])
+        self.assertEqual(failed_job_task.status, JobStatus.FAILED)
+        self.assertEqual(failed_job_task.err_code, int(exceptions.JobRetryException().code))
+        self.assertEqual(
+            JobTask.objects.filter(id__in=self.job_task_ids_gby_pipeline_id["node1"], status=JobStatus.RUNNING).count(),
+            2,
+        )
+        # 重试失败的子任务恢复为失败状态，状态计数同步变更
+        statistics = JobTaskStatusStatistics.get_statistics(self.job.id)
+        self.assertCountEqual(statistics, JobTaskStatusStatistics.rebuild(self.job.id))
+        self.assertCountEqual(
+            statistics,
+            [
+                {"status": JobStatus.RUNNING, "err_code": JobErrCode.PENDING, "count": 2},
+                {"status": JobStatus.FAILED, "err_code": int(exceptions.JobRetryException().code), "count": 1},
+            ],
+        )
+
+    def test_all_failed(self):
+        with patch.object(JobRetryEngine, "retry_node", side_effect=self.mock_retry_node(["node1", "node2"])):
+            with self.assertRaises(exceptions.JobRetryException):
+                JobRetryEngine(self.job, self.job_task_ids_gby_pipeline_id).run()
+        self.assertEqual(Job.objects.get(id=self.job.id).status, JobStatus.FAILED)
+        self.assertEqual(JobTask.objects.filter(job_id=self.job.id, status=JobStatus.FAILED).count(), 3)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.gsekit import constants
+from apps.gsekit.cmdb.constants import BkSetEnv
+from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.models import Process, ProcessInst
+
+
+class BenchmarkRollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "进程状态同步基准测试：构造指定数量的进程实例，统计 sync_proc_status_to_db 耗时，数据在结束后回滚"
+
+    def handle(self, **kwargs):
+        bk_biz_id = kwargs["bk_biz_id"]
+        inst_count = kwargs["inst_count"]
+        proc_num = kwargs["proc_num"]
+        if Process.objects.filter(bk_biz_id=bk_biz_id).exists():
+            self.stderr.write(f"bk_biz_id -> {bk_biz_id} already has processes, please choose another one")
+            return
+
+        try:
+            with transaction.atomic():
+                proc_status_infos = self.prepare_data(bk_biz_id, inst_count, proc_num)
+                process_handler = ProcessHandler(bk_biz_id=bk_biz_id)
+                for round_name in ["first sync", "unchanged sync"]:
+                    begin_time = time.time()
+                    result = process_handler.sync_proc_status_to_db(proc_status_infos)
+                    self.stdout.write(f"[{round_name}] cost: {time.time() - begin_time:.3f}s, result: {result}")
+                raise BenchmarkRollback()
+        except BenchmarkRollback:
+            pass
+
+    @staticmethod
+    def prepare_data(bk_biz_id: int, inst_count: int, proc_num: int):
+        processes = []
+        proc_insts = []
+        proc_status_infos = []
+        for index in range(inst_count // proc_num):
+            bk_process_id = -(index + 1)
+            bk_host_innerip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+            processes.append(
+                Process(
+                    bk_biz_id=bk_biz_id,
+                    bk_host_innerip=bk_host_innerip,
+                    bk_cloud_id=0,
+                    bk_set_env=BkSetEnv.FORMAL,
+                    bk_set_id=1,
+                    bk_module_id=1,
+                    service_instance_id=index,
+                    bk_process_name="benchmark",
+                    bk_process_id=bk_process_id,
+                    process_template_id=1,
+                )
+            )
+            for local_inst_id in range(1, proc_num + 1):
+                uniq_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
+                    bk_host_innerip=bk_host_innerip,
+                    bk_cloud_id=0,
+                    bk_process_name="benchmark",
+                    local_inst_id=local_inst_id,
+                )
+                proc_insts.append(
+                    ProcessInst(
+                        bk_biz_id=bk_biz_id,
+                        bk_host_num=index + 1,
+                        bk_host_innerip=bk_host_innerip,
+                        bk_cloud_id=0,
+                        bk_process_id=bk_process_id,
+                        bk_module_id=1,
+                        bk_process_name="benchmark",
+                        inst_id=index * proc_num + local_inst_id,
+                        local_inst_id=local_inst_id,
+                        local_inst_id_uniq_key=uniq_key,
+                        proc_num=proc_num,
+                    )
+                )
+                # 随机缺失部分实例状态，覆盖汇总状态保持不变的场景
+                if random.random() < 0.99:
+                    proc_status_infos.append(
+                        {
+                            "inst_uniq_key": uniq_key,
+                            "status": random.choice([Process.ProcessStatus.RUNNING, Process.ProcessStatus.TERMINATED]),
+                            "is_auto": random.random() < 0.5,
+                        }
+                    )
+        Process.objects.bulk_create(processes, batch_size=constants.ORM_BATCH_SIZE * 10)
+        ProcessInst.objects.bulk_create(proc_insts, batch_size=constants.ORM_BATCH_SIZE * 10)
+        return proc_status_infos
+
+    def add_arguments(self, parser):
+        parser.add_argument("-b", "--bk_biz_id", type=int, default=-1, help="构造数据使用的业务ID，需为无进程的业务")
+        parser.add_argument("-n", "--inst_count", type=int, default=200000, help="进程实例数量")
+        parser.add_argument("-p", "--proc_num", type=int, default=2, help="单个进程的实例数量")
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from apps.gsekit.job.models import Job, JobTaskStatusStatistics
+
+
+class Command(BaseCommand):
+    help = "按子任务表重建任务状态计数"
+
+    def handle(self, **kwargs):
+        job_ids = kwargs.get("job_ids")
+        if not job_ids:
+            job_ids = Job.objects.order_by("-id").values_list("id", flat=True)[: kwargs["recent"]]
+        for job_id in job_ids:
+            JobTaskStatusStatistics.rebuild(job_id)
+            self.stdout.write(f"job -> {job_id} statistics rebuilt")
+
+    def add_arguments(self, parser):
+        parser.add_argument("-j", "--job_ids", nargs="*", type=int, help="任务ID，可选，不传入则重建最近的任务")
+        parser.add_argument("-r", "--recent", type=int, default=1000, help="未指定任务ID时，重建最近的任务数量")
@@ -12,9 +12,11 @@ See the License for the specific language governing permissions and limitations
 
 from django.core.management.base import BaseCommand
 
-from apps.gsekit.cmdb.handlers.resource_watch import process_watch
+from apps.gsekit.cmdb.handlers.resource_watch import process_watch, start_topo_watch
 
 
 class Command(BaseCommand):
     def handle(self, **kwargs):
+        # 拓扑变更监听在后台线程中运行，维护业务拓扑树缓存
+        start_topo_watch()
         process_watch()
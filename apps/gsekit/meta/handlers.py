@@ -9,14 +9,13 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 import time
-import json
 import fnmatch
 from typing import Dict, List
 from collections import defaultdict
 
 from apps.api import UserManageApi
 from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
-from apps.gsekit.job.models import Job, JOB_STATUS_CHOICES, JobTask
+from apps.gsekit.job.models import Job, JOB_STATUS_CHOICES, JobProcessSnapshot
 from apps.gsekit.process.models import Process
 from apps.gsekit.configfile.models import ConfigTemplate
 from apps.gsekit.utils.expression_utils.parse import parse_exp2unix_shell_style
@@ -76,23 +75,14 @@ class MetaHandler(object):
     @staticmethod
     def get_job_task_filter_choices(job_id: int):
         """ "任务详细过滤列表"""
-        filter_info_list = (
-            JobTask.objects.filter(job_id=job_id)
-            .extra(
-                select={
-                    "set_info": "JSON_EXTRACT(extra_data, '$.process_info.set')",
-                    "module_info": "JSON_EXTRACT(extra_data, '$.process_info.module')",
-                    "bk_process_name": "JSON_EXTRACT(extra_data, '$.process_info.process.bk_process_name')",
-                }
-            )
-            .values("set_info", "module_info", "bk_process_name")
-        )
+        # 同一进程的子任务共享进程快照，按快照汇总即可
+        process_infos = JobProcessSnapshot.objects.filter(job_id=job_id).values_list("process_info", flat=True)
 
         filter_choices = defaultdict(list)
-        for filter_info in filter_info_list:
-            set_info = json.loads(filter_info["set_info"])
-            module_info = json.loads(filter_info["module_info"])
-            bk_process_name = json.loads(filter_info["bk_process_name"])
+        for process_info in process_infos:
+            set_info = process_info["set"]
+            module_info = process_info["module"]
+            bk_process_name = process_info["process"]["bk_process_name"]
             filter_choices["set"].append({"id": set_info["bk_set_id"], "name": set_info["bk_set_name"]})
             filter_choices["module"].append({"id": module_info["bk_module_id"], "name": module_info["bk_module_name"]})
             filter_choices["process"].append({"id": bk_process_name, "name": bk_process_name})
@@ -26,9 +26,10 @@ from apps.gsekit.configfile.models import ConfigTemplate, ConfigTemplateVersion,
 from apps.gsekit.migrate.models import GsekitProcessToCCProcessTemplateMap, MigrationStatus
 from apps.gsekit.process.exceptions import DuplicateProcessInstException
 from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.handlers.process_inst import ProcessInstReconciler
 from apps.gsekit.process.models import Process, ProcessInst
 from apps.iam import Permission, ResourceEnum
-from apps.utils.batch_request import batch_request, request_multi_thread
+from apps.utils.batch_request import request_multi_thread
 from apps.utils import basic
 
 DIRECT_OLD_GSEKIT_ROOT = os.getenv("DIRECT_OLD_GSEKIT_ROOT", "http://apps.****.com/ieod-bkapp-gsekit-prod")
@@ -347,13 +348,11 @@ class MigrateHandlers(object):
         """迁移进程实例，主要是host_num和inst_id"""
 
         cmdb_handler = CMDBHandler(bk_biz_id=self.bk_biz_id)
-        process_handler = ProcessHandler(bk_biz_id=self.bk_biz_id)
         cmdb_handler.get_or_cache_bk_cloud_area(use_cache=False)
 
         to_be_created_inst = []
-        process_list = batch_request(CCApi.list_process_related_info, {"bk_biz_id": self.bk_biz_id})
-        migrate_data = process_handler.generate_process_inst_migrate_data(process_list)
-        cmdb_module_proc_name_map = migrate_data["cmdb_module_proc_name_map"]
+        process_list = ProcessHandler(bk_biz_id=self.bk_biz_id).list_process_related_info()
+        cmdb_module_proc_name_map = ProcessInstReconciler.group_cmdb_processes(process_list)
         module_id_host_no_map = {}
         params_list = [{"bk_module_id": bk_module_id} for bk_module_id in cmdb_module_proc_name_map.keys()]
         module_id_host_no_map_list = request_multi_thread(
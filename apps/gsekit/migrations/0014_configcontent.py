@@ -0,0 +1,66 @@
+# Generated by Django 3.2.4 on 2026-10-18 15:00
+
+import apps.utils.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0013_alter_job_job_action"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConfigContent",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name="SHA256"),
+                ),
+                ("content", apps.utils.models.CompressedTextField(verbose_name="配置内容")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+            ],
+            options={
+                "verbose_name": "配置内容（ConfigContent）",
+                "verbose_name_plural": "配置内容（ConfigContent）",
+            },
+        ),
+        # 仅调整模型状态：content 列保留历史数据，映射为 inline_content 字段
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name="configinstance",
+                    name="content",
+                    field=apps.utils.models.CompressedTextField(
+                        blank=True, default=None, null=True, verbose_name="内容"
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="configsnapshot",
+                    name="content",
+                    field=apps.utils.models.CompressedTextField(
+                        blank=True, default=None, null=True, verbose_name="内容"
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveField(model_name="configinstance", name="content"),
+                migrations.AddField(
+                    model_name="configinstance",
+                    name="inline_content",
+                    field=apps.utils.models.CompressedTextField(
+                        blank=True, db_column="content", default=None, null=True, verbose_name="内容"
+                    ),
+                ),
+                migrations.RemoveField(model_name="configsnapshot", name="content"),
+                migrations.AddField(
+                    model_name="configsnapshot",
+                    name="inline_content",
+                    field=apps.utils.models.CompressedTextField(
+                        blank=True, db_column="content", default=None, null=True, verbose_name="内容"
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0014_configcontent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="configinstance",
+            name="input_fingerprint",
+            field=models.CharField(blank=True, default="", max_length=64, verbose_name="输入指纹"),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 200
+
+
+def backfill_job_process_snapshots(apps, schema_editor):
+    """将历史任务 extra_data 中的进程信息迁移至进程快照表，实例ID迁移至独立字段"""
+    JobTask = apps.get_model("gsekit", "JobTask")
+    JobProcessSnapshot = apps.get_model("gsekit", "JobProcessSnapshot")
+
+    job_ids = JobTask.objects.values_list("job_id", flat=True).distinct().order_by("job_id")
+    for job_id in job_ids.iterator():
+        job_tasks = list(JobTask.objects.filter(job_id=job_id).only("id", "bk_process_id", "extra_data"))
+        to_be_updated_job_tasks = []
+        process_info_map = {}
+        for job_task in job_tasks:
+            extra_data = job_task.extra_data or {}
+            if "process_info" not in extra_data:
+                continue
+            process_info_map.setdefault(job_task.bk_process_id, extra_data.pop("process_info"))
+            job_task.inst_id = extra_data.pop("inst_id", 0) or 0
+            job_task.local_inst_id = extra_data.pop("local_inst_id", 0) or 0
+            to_be_updated_job_tasks.append(job_task)
+
+        JobProcessSnapshot.objects.bulk_create(
+            [
+                JobProcessSnapshot(job_id=job_id, bk_process_id=bk_process_id, process_info=process_info)
+                for bk_process_id, process_info in process_info_map.items()
+            ],
+            batch_size=BACKFILL_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        JobTask.objects.bulk_update(
+            to_be_updated_job_tasks,
+            fields=["inst_id", "local_inst_id", "extra_data"],
+            batch_size=BACKFILL_BATCH_SIZE,
+        )
+
+
+def restore_job_process_snapshots(apps, schema_editor):
+    """回滚时将进程快照及实例ID写回任务 extra_data，避免删除快照表及字段后丢失数据"""
+    JobTask = apps.get_model("gsekit", "JobTask")
+    JobProcessSnapshot = apps.get_model("gsekit", "JobProcessSnapshot")
+
+    job_ids = JobProcessSnapshot.objects.values_list("job_id", flat=True).distinct().order_by("job_id")
+    for job_id in job_ids.iterator():
+        process_info_map = dict(
+            JobProcessSnapshot.objects.filter(job_id=job_id).values_list("bk_process_id", "process_info")
+        )
+        job_tasks = list(
+            JobTask.objects.filter(job_id=job_id).only("id", "bk_process_id", "inst_id", "local_inst_id", "extra_data")
+        )
+        to_be_updated_job_tasks = []
+        for job_task in job_tasks:
+            extra_data = job_task.extra_data or {}
+            if "process_info" in extra_data or job_task.bk_process_id not in process_info_map:
+                continue
+            extra_data["process_info"] = process_info_map[job_task.bk_process_id]
+            extra_data["inst_id"] = job_task.inst_id
+            extra_data["local_inst_id"] = job_task.local_inst_id
+            job_task.extra_data = extra_data
+            to_be_updated_job_tasks.append(job_task)
+
+        JobTask.objects.bulk_update(to_be_updated_job_tasks, fields=["extra_data"], batch_size=BACKFILL_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0015_configinstance_input_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobProcessSnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("job_id", models.IntegerField(db_index=True, verbose_name="任务ID")),
+                ("bk_process_id", models.IntegerField(verbose_name="进程ID")),
+                ("process_info", models.JSONField(default=dict, verbose_name="进程信息")),
+            ],
+            options={
+                "verbose_name": "任务进程快照",
+                "verbose_name_plural": "任务进程快照",
+                "unique_together": {("job_id", "bk_process_id")},
+            },
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="inst_id",
+            field=models.IntegerField(default=0, verbose_name="InstID"),
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="local_inst_id",
+            field=models.IntegerField(default=0, verbose_name="LocalInstID"),
+        ),
+        migrations.RunPython(backfill_job_process_snapshots, restore_job_process_snapshots),
+    ]
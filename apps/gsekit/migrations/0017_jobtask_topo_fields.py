@@ -0,0 +1,65 @@
+# Generated by Django 3.2.4 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+def backfill_job_task_topo_fields(apps, schema_editor):
+    """根据进程快照回填任务的冗余拓扑字段"""
+    JobTask = apps.get_model("gsekit", "JobTask")
+    JobProcessSnapshot = apps.get_model("gsekit", "JobProcessSnapshot")
+
+    for snapshot in JobProcessSnapshot.objects.all().iterator():
+        process_info = snapshot.process_info
+        JobTask.objects.filter(job_id=snapshot.job_id, bk_process_id=snapshot.bk_process_id).update(
+            bk_set_id=process_info["set"]["bk_set_id"],
+            bk_module_id=process_info["module"]["bk_module_id"],
+            bk_host_innerip=process_info["host"]["bk_host_innerip"],
+            bk_cloud_id=process_info["host"]["bk_cloud_id"],
+            bk_process_name=process_info["process"]["bk_process_name"] or "",
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0016_jobprocesssnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtask",
+            name="bk_set_id",
+            field=models.IntegerField(default=0, verbose_name="集群ID"),
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="bk_module_id",
+            field=models.IntegerField(default=0, verbose_name="模块ID"),
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="bk_host_innerip",
+            field=models.CharField(default="", max_length=64, verbose_name="主机IP"),
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="bk_cloud_id",
+            field=models.IntegerField(default=0, verbose_name="云区域ID"),
+        ),
+        migrations.AddField(
+            model_name="jobtask",
+            name="bk_process_name",
+            field=models.CharField(default="", max_length=255, verbose_name="进程名称"),
+        ),
+        migrations.AlterIndexTogether(
+            name="jobtask",
+            index_together={
+                ("job_id", "status"),
+                ("job_id", "bk_set_id"),
+                ("job_id", "bk_module_id"),
+                ("job_id", "bk_process_name"),
+                ("job_id", "bk_host_innerip", "bk_cloud_id"),
+            },
+        ),
+        migrations.RunPython(backfill_job_task_topo_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.4 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0017_jobtask_topo_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobTaskStatusStatistics",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("job_id", models.IntegerField(db_index=True, verbose_name="任务ID")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "等待执行"),
+                            ("running", "正在执行"),
+                            ("succeeded", "执行成功"),
+                            ("failed", "执行失败"),
+                            ("ignored", "已忽略"),
+                        ],
+                        max_length=16,
+                        verbose_name="任务状态",
+                    ),
+                ),
+                ("err_code", models.IntegerField(verbose_name="错误码")),
+                ("count", models.IntegerField(default=0, verbose_name="数量")),
+            ],
+            options={
+                "verbose_name": "任务状态统计",
+                "verbose_name_plural": "任务状态统计",
+                "unique_together": {("job_id", "status", "err_code")},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.4 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0018_jobtaskstatusstatistics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessRelatedInfo",
+            fields=[
+                ("bk_process_id", models.IntegerField(primary_key=True, serialize=False, verbose_name="进程ID")),
+                ("bk_biz_id", models.IntegerField(db_index=True, verbose_name="业务ID")),
+                ("related_info", models.JSONField(default=dict, verbose_name="进程关联信息")),
+                ("fingerprint", models.CharField(default="", max_length=32, verbose_name="关联信息指纹")),
+            ],
+            options={
+                "verbose_name": "进程关联信息（ProcessRelatedInfo）",
+                "verbose_name_plural": "进程关联信息（ProcessRelatedInfo）",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gsekit", "0019_processrelatedinfo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="configinstance",
+            name="released_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="下发时间"),
+        ),
+    ]
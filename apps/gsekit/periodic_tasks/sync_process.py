@@ -14,13 +14,27 @@ from django.utils import timezone
 
 from apps.gsekit.job.models import Job
 from apps.gsekit.periodic_tasks.utils import calculate_countdown
-from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.handlers.sync_scheduler import ProcessSyncScheduler
 from common.log import logger
 
 
 @task(ignore_result=True)
 def sync_biz_process_task(bk_biz_id):
-    ProcessHandler(bk_biz_id=bk_biz_id).sync_biz_process()
+    scheduler = ProcessSyncScheduler(bk_biz_id=bk_biz_id)
+    run = scheduler.dispatch()
+    if not run:
+        return
+    run_id, shards = run
+    if len(shards) == 1:
+        scheduler.run_shard(run_id, 0, shards[0])
+        return
+    for shard_index, bk_module_ids in enumerate(shards):
+        sync_biz_process_shard_task.delay(bk_biz_id, run_id, shard_index, bk_module_ids)
+
+
+@task(ignore_result=True)
+def sync_biz_process_shard_task(bk_biz_id, run_id, shard_index, bk_module_ids):
+    ProcessSyncScheduler(bk_biz_id=bk_biz_id).run_shard(run_id, shard_index, bk_module_ids)
 
 
 @periodic_task(run_every=django_celery_beat.tzcrontab.TzAwareCrontab(minute="*/10", tz=timezone.get_current_timezone()))
@@ -9,13 +9,17 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 import logging
+import math
 import traceback
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
+from django.core.cache import cache
 from django.db.models import QuerySet
 from django.utils.translation import ugettext as _
 
-from apps.exceptions import AppBaseException
+from apps.api import EsbApi
+from apps.exceptions import ApiResultError, AppBaseException
+from apps.gsekit.constants import CacheExpire
 from apps.gsekit.configfile import exceptions as configfile_exceptions
 from apps.gsekit.job import models as job_models, exceptions as job_exceptions
 from apps.gsekit.meta.models import GlobalSettings
@@ -23,7 +27,7 @@ from apps.gsekit.pipeline_plugins.exceptions import PipelineTimeoutException
 from apps.gsekit.process import exceptions as process_exceptions
 from apps.gsekit.utils import solution_maker
 from pipeline.core.data.base import DataObject
-from pipeline.core.flow.activity import Service
+from pipeline.core.flow.activity import AbstractIntervalGenerator, Service
 
 logger = logging.getLogger("celery")
 
@@ -32,6 +36,68 @@ POLLING_INTERVAL = 3
 JOB_POLLING_INTERVAL = 5
 GSE_POLLING_INTERVAL = 2
 
+# 自适应轮询间隔范围 (min_interval, max_interval)
+JOB_ADAPTIVE_POLLING_INTERVAL_RANGE = (2, 15)
+GSE_ADAPTIVE_POLLING_INTERVAL_RANGE = (1, 10)
+
+
+class AdaptiveIntervalGenerator(AbstractIntervalGenerator):
+    """
+    自适应轮询间隔
+    1. 存在历史完成耗时，在预期完成前直接等待到预期完成时间
+    2. 超出预期完成时间（或无历史数据）后，间隔按超出时长的比例增长，即指数退避
+    3. 触发 ESB 频率限制时，使用最大间隔
+    间隔取值范围为 [min_interval, max_interval]
+    """
+
+    BACKOFF_RATIO = 0.5
+
+    def __init__(
+        self,
+        min_interval: int,
+        max_interval: int,
+        polling_time: float = 0,
+        expected_time: Optional[float] = None,
+        is_throttled: bool = False,
+    ):
+        super().__init__()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.polling_time = polling_time
+        self.expected_time = expected_time
+        self.is_throttled = is_throttled
+
+    def interval(self) -> int:
+        if self.is_throttled:
+            return self.max_interval
+        if self.expected_time and self.polling_time < self.expected_time:
+            interval = self.expected_time - self.polling_time
+        else:
+            interval = (self.polling_time - (self.expected_time or 0)) * self.BACKOFF_RATIO
+        return int(min(max(math.ceil(interval), self.min_interval), self.max_interval))
+
+    def next(self):
+        super().next()
+        return self.interval()
+
+
+class PollingStatistics(object):
+    """按轮询范围统计的调度完成耗时，使用指数加权移动平均平滑"""
+
+    CACHE_KEY_TMPL = "pipeline_polling_stats:{scope}"
+    EWMA_ALPHA = 0.3
+
+    @classmethod
+    def get_expected_time(cls, scope: str) -> Optional[float]:
+        return cache.get(cls.CACHE_KEY_TMPL.format(scope=scope))
+
+    @classmethod
+    def record(cls, scope: str, cost_time: float):
+        expected_time = cls.get_expected_time(scope)
+        if expected_time is not None:
+            cost_time = expected_time + cls.EWMA_ALPHA * (cost_time - expected_time)
+        cache.set(cls.CACHE_KEY_TMPL.format(scope=scope), cost_time, CacheExpire.DAY * 7)
+
 
 class ActivityType:
     HEAD = 0
@@ -105,7 +171,7 @@ class JobTaskBaseService(Service):
     def exception_handler(self, error: Exception, job_task: job_models.JobTask):
         """异常处理器"""
         extra_data = {"failed_reason": _("系统异常，请联系管理员:{error}").format(error=error), "retryable": True, "solutions": []}
-        process_info = job_task.extra_data["process_info"]
+        process_info = job_task.process_info
         has_solution = True
         if isinstance(error, process_exceptions.ProcessAttrIsNotConfiguredException):
             edit_process_solutions = solution_maker.EditProcessSolutionMaker(
@@ -223,6 +289,38 @@ class MultiJobTaskBaseService(JobTaskBaseService):
     批量JobTask处理，用于多JobTask汇聚，由其中一个执行的场景
     """
 
+    # 自适应轮询间隔范围 (min_interval, max_interval)，为 None 时使用固定的 interval
+    adaptive_interval_range: Optional[Tuple[int, int]] = None
+
+    def polling_scope(self, data: DataObject) -> str:
+        """轮询耗时统计范围，默认按原子类型及任务规模（向上取 2 的幂）划分"""
+        job_task_num = len(data.get_one_of_inputs("job_task_ids"))
+        return f"{self.__class__.__name__}:{2 ** math.ceil(math.log2(max(job_task_num, 1)))}"
+
+    def adapt_interval(self, data: DataObject, polling_time: float, is_throttled: bool = False) -> int:
+        """根据已轮询时长更新下一次调度间隔，返回该间隔"""
+        if self.adaptive_interval_range is None:
+            return POLLING_INTERVAL
+        min_interval, max_interval = self.adaptive_interval_range
+        self.interval = AdaptiveIntervalGenerator(
+            min_interval,
+            max_interval,
+            polling_time=polling_time,
+            expected_time=data.get_one_of_outputs("expected_polling_time"),
+            is_throttled=is_throttled,
+        )
+        return self.interval.interval()
+
+    def _throttle_tolerant_schedule(self, data, parent_data, callback_data=None) -> Dict:
+        """查询触发 ESB 频率限制时不视为失败，退避后继续轮询"""
+        try:
+            return self._schedule(data, parent_data, callback_data=callback_data)
+        except ApiResultError as error:
+            if error.code not in EsbApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST:
+                raise
+            logger.warning(f"act[{self.__class__.__name__}] schedule rate limit exceeded: {error}")
+            return {"result": True, "is_finished": False, "is_throttled": True}
+
     def judge_act_head_and_set_running(self, data: DataObject, job_tasks: QuerySet) -> None:
         act_type = data.get_one_of_inputs("act_type")
         if act_type in [ActivityType.HEAD, ActivityType.HEAD_TAIL]:
@@ -280,6 +378,9 @@ class MultiJobTaskBaseService(JobTaskBaseService):
                     job_task.set_extra_data(extra_data=extra_data_map.get(job_task.id))
         except Exception as error:
             logger.error(traceback.format_exc())
+            # 异常处理需读取进程信息
+            job_tasks = list(job_tasks)
+            job_models.JobTask.fill_process_infos(job_tasks)
             for job_task in job_tasks:
 
                 # 已有状态的任务直接跳过
@@ -317,8 +418,10 @@ class MultiJobTaskBaseService(JobTaskBaseService):
         # 起始原子初始化JobTask为RUNNING
         self.judge_act_head_and_set_running(data, job_tasks)
 
+        job_task_list = list(job_tasks)
+        job_models.JobTask.fill_process_infos(job_task_list)
         data.inputs.job_task = job_task
-        data.inputs.job_tasks = list(job_tasks)
+        data.inputs.job_tasks = job_task_list
         execute_return = self.run(self._execute, job_tasks, data=data, parent_data=parent_data)
 
         if not execute_return["result"]:
@@ -327,6 +430,9 @@ class MultiJobTaskBaseService(JobTaskBaseService):
         # 需要执行调度，初始化轮询总时长
         if self.need_schedule() and not self.is_schedule_finished():
             data.outputs.polling_time = 0
+            if self.adaptive_interval_range is not None:
+                data.outputs.expected_polling_time = PollingStatistics.get_expected_time(self.polling_scope(data))
+                self.adapt_interval(data, polling_time=0)
             return True
 
         # 无需执行调度并且是最后一个原子执行成功, 标识结束
@@ -337,8 +443,13 @@ class MultiJobTaskBaseService(JobTaskBaseService):
         job_task_ids = data.get_one_of_inputs("job_task_ids")
         job_tasks = job_models.JobTask.objects.filter(id__in=job_task_ids)
         schedule_return = self.run(
-            self._schedule, job_tasks, data=data, parent_data=parent_data, callback_data=callback_data
+            self._throttle_tolerant_schedule,
+            job_tasks,
+            data=data,
+            parent_data=parent_data,
+            callback_data=callback_data,
         )
+        polling_time = data.get_one_of_outputs("polling_time")
 
         # 执行错误，返回失败并结束调度
         if not schedule_return["result"]:
@@ -346,14 +457,18 @@ class MultiJobTaskBaseService(JobTaskBaseService):
             return False
 
         elif schedule_return.get("is_finished", False):
+            if self.adaptive_interval_range is not None:
+                PollingStatistics.record(self.polling_scope(data), polling_time)
             # 调度成功结束且为最后一个原子，更新JobTask为SUCCEEDED
             self.judge_act_tail_and_set_succeeded(data, job_tasks)
             self.finish_schedule()
             return True
 
         # 校验轮询是否超时
-        polling_time = data.get_one_of_outputs("polling_time")
-        if polling_time + POLLING_INTERVAL > GlobalSettings.pipeline_polling_timeout():
+        interval = self.adapt_interval(data, polling_time, is_throttled=schedule_return.get("is_throttled", False))
+        if polling_time + interval > GlobalSettings.pipeline_polling_timeout():
+            job_tasks = list(job_tasks)
+            job_models.JobTask.fill_process_infos(job_tasks)
             for job_task in job_tasks:
                 # 已有状态的任务直接跳过
                 if job_task.status not in [job_models.JobStatus.RUNNING, job_models.JobStatus.PENDING]:
@@ -364,7 +479,7 @@ class MultiJobTaskBaseService(JobTaskBaseService):
             self.finish_schedule()
             return False
 
-        data.outputs.polling_time = polling_time + POLLING_INTERVAL
+        data.outputs.polling_time = polling_time + interval
         return True
 
     def inputs_format(self):
@@ -14,6 +14,7 @@ from collections import defaultdict
 from typing import Dict
 
 from django.core.cache import cache
+from django.utils import timezone
 
 from apps.api import BscpApi
 from apps.exceptions import ApiResultError
@@ -52,9 +53,9 @@ class UploadContentService(JobTaskBaseService):
     def _execute(self, data, parent_data):
         job_task = data.get_one_of_inputs("job_task")
 
-        inst_id = job_task.extra_data["inst_id"]
+        inst_id = job_task.inst_id
 
-        process_info = job_task.extra_data["process_info"]
+        process_info = job_task.process_info
         process_obj = Process.generate_process_obj(
             bk_process_id=process_info["process"]["bk_process_id"],
             process_template_id=process_info["process_template"].get("id") or 0,
@@ -80,8 +81,8 @@ class UploadContentService(JobTaskBaseService):
                 headers={"X-Bkapi-File-Content-Id": config_instance.sha256, "X-Bkapi-File-Content-Overwrite": "true"},
             )
 
-            bk_host_innerip = job_task.extra_data["process_info"]["host"]["bk_host_innerip"]
-            cloud_id = str(job_task.extra_data["process_info"]["host"]["bk_cloud_id"])
+            bk_host_innerip = job_task.process_info["host"]["bk_host_innerip"]
+            cloud_id = str(job_task.process_info["host"]["bk_cloud_id"])
 
             cache_key = (
                 f"procattr-{bscp_app.biz_id}-{bscp_app.app_id}" f"-{bk_host_innerip}-{cloud_id}-{config_instance.path}"
@@ -132,7 +133,7 @@ class CommitAndReleaseService(MultiJobTaskBaseService):
             self.finish_schedule()
             return self.return_data(result=True)
 
-        process_info = job_task.extra_data["process_info"]
+        process_info = job_task.process_info
         process_obj = Process.generate_process_obj(
             bk_process_id=process_info["process"]["bk_process_id"],
             process_template_id=process_info["process_template"].get("id") or 0,
@@ -166,9 +167,11 @@ class CommitAndReleaseService(MultiJobTaskBaseService):
         bk_process_ids = set()
         process_inst_map = {}
         process_inst_map_key_tmpl = "{bk_process_id}-{inst_id}"
-        for job_task in JobTask.objects.filter(id__in=job_task_ids):
-            bk_process_id = job_task.extra_data["process_info"]["process"]["bk_process_id"]
-            inst_id = job_task.extra_data["inst_id"]
+        job_tasks = list(JobTask.objects.filter(id__in=job_task_ids))
+        JobTask.fill_process_infos(job_tasks)
+        for job_task in job_tasks:
+            bk_process_id = job_task.process_info["process"]["bk_process_id"]
+            inst_id = job_task.inst_id
             bk_process_ids.add(bk_process_id)
             process_inst_map[process_inst_map_key_tmpl.format(bk_process_id=bk_process_id, inst_id=inst_id)] = job_task
 
@@ -207,7 +210,7 @@ class CommitAndReleaseService(MultiJobTaskBaseService):
             inst_job_task.extra_data["config_instances"] = config_instances
             inst_job_task.save(update_fields=["extra_data"])
 
-            host_info = inst_job_task.extra_data["process_info"]["host"]
+            host_info = inst_job_task.process_info["host"]
             labels = {
                 "labels": {
                     "cloud_id": "eq|{bk_cloud_id}".format(bk_cloud_id=host_info["bk_cloud_id"]),
@@ -300,8 +303,10 @@ class CommitAndReleaseService(MultiJobTaskBaseService):
         )
 
         job_task_map = defaultdict(list)
-        for job_task in JobTask.objects.filter(id__in=job_task_ids):
-            host = job_task.extra_data["process_info"]["host"]
+        job_tasks = list(JobTask.objects.filter(id__in=job_task_ids))
+        JobTask.fill_process_infos(job_tasks)
+        for job_task in job_tasks:
+            host = job_task.process_info["host"]
             default_effect_code = EffectCode.PENDING
             effect_msg = ""
 
@@ -351,15 +356,15 @@ class CommitAndReleaseService(MultiJobTaskBaseService):
                                 job_task.set_status(to_be_updated_status)
                                 # 更新已部署状态
                                 if job_task.status == JobStatus.SUCCEEDED:
-                                    bk_process_id = job_task.extra_data["process_info"]["process"]["bk_process_id"]
-                                    inst_id = job_task.extra_data["inst_id"]
+                                    bk_process_id = job_task.process_info["process"]["bk_process_id"]
+                                    inst_id = job_task.inst_id
                                     ConfigInstance.objects.filter(
                                         bk_process_id=bk_process_id,
                                         inst_id=inst_id,
                                         is_latest=True,
                                         path=path,
                                         name=bscp_config.file_name,
-                                    ).update(is_released=True)
+                                    ).update(is_released=True, released_at=timezone.now())
                                 else:
                                     job_task.set_status(
                                         JobStatus.FAILED,
@@ -429,9 +434,9 @@ class BulkUploadContentService(MultiJobTaskBaseService):
         procattr_job_task_map = {}
         for job_task in job_tasks:
 
-            inst_id = job_task.extra_data["inst_id"]
+            inst_id = job_task.inst_id
 
-            process_info = job_task.extra_data["process_info"]
+            process_info = job_task.process_info
             process_obj = Process.generate_process_obj(
                 bk_process_id=process_info["process"]["bk_process_id"],
                 process_template_id=process_info["process_template"].get("id") or 0,
@@ -473,8 +478,8 @@ class BulkUploadContentService(MultiJobTaskBaseService):
                     )
                 )
 
-                bk_host_innerip = job_task.extra_data["process_info"]["host"]["bk_host_innerip"]
-                cloud_id = str(job_task.extra_data["process_info"]["host"]["bk_cloud_id"])
+                bk_host_innerip = job_task.process_info["host"]["bk_host_innerip"]
+                cloud_id = str(job_task.process_info["host"]["bk_cloud_id"])
 
                 app_biz_procattr_map[f"{bscp_app.app_id}-{bscp_app.biz_id}"].append(
                     {
@@ -16,12 +16,13 @@ import logging
 import shlex
 import ntpath
 import posixpath
-from asyncio import sleep
 from collections import defaultdict
 from typing import List, Dict, Any, Optional, Set
 
+from django.conf import settings
 from django.db import OperationalError, transaction
 from django.db.models import Max
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 
 from apps.api import JobApi, EsbApi
@@ -29,14 +30,26 @@ from apps.exceptions import ApiResultError
 from apps.gsekit.pipeline_plugins import exceptions
 from apps.gsekit import constants
 from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
-from apps.gsekit.configfile.exceptions import NoActiveConfigVersionException, ProcessDoseNotBindTemplate
-from apps.gsekit.configfile.handlers.config_version import ConfigVersionHandler
-from apps.gsekit.configfile.models import ConfigInstance, ConfigTemplate, ConfigTemplateVersion, ConfigSnapshot
+from apps.gsekit.configfile.exceptions import (
+    ConfigInstanceUnchangedException,
+    NoActiveConfigVersionException,
+    ProcessDoseNotBindTemplate,
+)
+from apps.gsekit.configfile.handlers.config_generate import ConfigGenerateHandler
+from apps.gsekit.configfile.handlers.config_version import CCContextIndex, ConfigVersionHandler
+from apps.gsekit.configfile.models import (
+    ConfigContent,
+    ConfigInstance,
+    ConfigTemplate,
+    ConfigTemplateVersion,
+    ConfigSnapshot,
+)
 from apps.gsekit.job.models import JobStatus, JobTask
 from apps.gsekit.meta.models import GlobalSettings
 from apps.gsekit.pipeline_plugins.components.collections.base import (
     JobTaskBaseService,
     MultiJobTaskBaseService,
+    JOB_ADAPTIVE_POLLING_INTERVAL_RANGE,
     JOB_POLLING_INTERVAL as POLLING_INTERVAL,
 )
 from apps.gsekit.pipeline_plugins.exceptions import JobApiException
@@ -58,15 +71,15 @@ class GenerateConfigService(JobTaskBaseService):
         job_task = data.get_one_of_inputs("job_task")
         bk_username = data.get_one_of_inputs("bk_username")
         bk_biz_id = data.get_one_of_inputs("bk_biz_id")
-        inst_id = job_task.extra_data["inst_id"]
+        inst_id = job_task.inst_id
 
         config_template_ids = job_task.get_job_task_config_template_ids()
 
         context = ConfigVersionHandler.get_process_context(
-            job_task.extra_data["process_info"],
+            job_task.process_info,
             bk_biz_id,
             inst_id=inst_id,
-            local_inst_id=job_task.extra_data["local_inst_id"],
+            local_inst_id=job_task.local_inst_id,
         )
 
         to_be_created_config_instances = []
@@ -143,7 +156,7 @@ class ReleaseConfigService(JobTaskBaseService):
 
     @staticmethod
     def release_by_job(job_task, bk_biz_id):
-        host_info = job_task.extra_data["process_info"]["host"]
+        host_info = job_task.process_info["host"]
 
         config_template_ids = job_task.get_job_task_config_template_ids()
         for config_template in ConfigTemplate.objects.filter(config_template_id__in=config_template_ids):
@@ -215,7 +228,7 @@ class SetConfigReleasedService(JobTaskBaseService):
     def _execute(self, data, parent_data):
         job_task = data.get_one_of_inputs("job_task")
         config_instance_ids = job_task.get_job_task_config_instance_ids()
-        ConfigInstance.objects.filter(id__in=config_instance_ids).update(is_released=True)
+        ConfigInstance.objects.filter(id__in=config_instance_ids).update(is_released=True, released_at=timezone.now())
         return self.return_data(result=True)
 
 
@@ -246,7 +259,7 @@ class BulkGenerateConfigService(MultiJobTaskBaseService):
         job_tasks = data.get_one_of_inputs("job_tasks")
         bk_username = data.get_one_of_inputs("bk_username")
         bk_biz_id = data.get_one_of_inputs("bk_biz_id")
-        bk_set_env = job_tasks[0].extra_data["process_info"]["set"]["bk_set_env"]
+        bk_set_env = job_tasks[0].process_info["set"]["bk_set_env"]
 
         job_tasks_config_template_ids_map = JobTask.get_job_tasks_config_template_ids_map(job_tasks)
         all_config_template_ids = set(itertools.chain.from_iterable(job_tasks_config_template_ids_map.values()))
@@ -255,35 +268,42 @@ class BulkGenerateConfigService(MultiJobTaskBaseService):
             config_template.config_template_id: config_template
             for config_template in ConfigTemplate.objects.filter(config_template_id__in=all_config_template_ids)
         }
+        skip_unchanged = job_tasks[0].extra_data.get("skip_unchanged", False)
+        latest_fingerprint_map = (
+            self.get_latest_fingerprint_map(job_tasks, all_config_template_ids) if skip_unchanged else {}
+        )
         to_be_created_config_instances = []
         to_be_update_config_instances = defaultdict(list)
         cc_context = ConfigVersionHandler.get_cc_context(bk_biz_id, bk_set_env)
-        biz_global_variables = CMDBHandler(bk_biz_id=bk_biz_id).biz_global_variables()
-        xpath_cache = {}
+        config_generate_handler = ConfigGenerateHandler(
+            bk_biz_id=bk_biz_id,
+            cc_context=cc_context,
+            cc_index=CCContextIndex(cc_context),
+            biz_global_variables=CMDBHandler(bk_biz_id=bk_biz_id).biz_global_variables(),
+        )
         job_task_tpl_sha256_map = defaultdict(lambda: defaultdict(list))
         all_config_template_ids = set()
         all_process_ids = set()
         job_task_id_obj_map = {}
+        # 同一配置版本的模板依赖只需填充一次
+        config_version_content_map = {}
+        render_params_list = []
+        # 输入未变更而保留的最新配置实例
+        unchanged_config_inst_ids = []
         for job_task in job_tasks:
             all_process_ids.add(job_task.bk_process_id)
             job_task_id_obj_map[job_task.id] = job_task
 
-            inst_id = job_task.extra_data["inst_id"]
+            inst_id = job_task.inst_id
             related_config_info = job_task.extra_data.get("related_config_info") or {}
             config_template_ids = job_tasks_config_template_ids_map.get(job_task.id, [])
-
-            context = ConfigVersionHandler.get_process_context(
-                job_task.extra_data["process_info"],
-                bk_biz_id,
-                inst_id=inst_id,
-                local_inst_id=job_task.extra_data["local_inst_id"],
-                cc_context=cc_context,
-                biz_global_variables=biz_global_variables,
-                xpath_cache=xpath_cache,
+            context_digest = config_generate_handler.context_digest(
+                job_task.process_info, inst_id, job_task.local_inst_id
             )
+
             # 标志位，用于标记 job_task 是否关联模板
             has_config_template = False
-            inst_to_be_created_config_instances = []
+            configs = []
             for config_template_id in config_template_ids:
                 all_config_template_ids.add(config_template_id)
                 config_template = config_template_id_obj_map[config_template_id]
@@ -309,33 +329,29 @@ class BulkGenerateConfigService(MultiJobTaskBaseService):
                 has_config_template = True
 
                 # 补充模板依赖
-                content = ConfigVersionHandler.fill_template_dependencies(bk_biz_id, latest_config_version.content)
-                rendered_content = mako_render(content, context)
-                name = mako_render(config_template.file_name, context)
-                path = mako_render(config_template.abs_path, context)
-                # path = "/"
-
-                sha256 = hashlib.sha256()
-                sha256.update(rendered_content.encode())
-                sha256sum = sha256.hexdigest()
-                config_inst = ConfigInstance(
-                    config_version_id=latest_config_version.config_version_id,
-                    config_template_id=config_template.config_template_id,
-                    bk_process_id=job_task.bk_process_id,
-                    content=rendered_content,
-                    sha256=sha256sum,
-                    expression="TODO",
-                    is_latest=True,
-                    inst_id=inst_id,
-                    created_by=bk_username,
-                    path=path,
-                    name=name,
-                )
-                inst_to_be_created_config_instances.append(config_inst)
-                to_be_created_config_instances.append(config_inst)
-                to_be_update_config_instances[config_template_id].append(job_task.bk_process_id)
+                config_version_id = latest_config_version.config_version_id
+                if config_version_id not in config_version_content_map:
+                    config_version_content_map[config_version_id] = ConfigVersionHandler.fill_template_dependencies(
+                        bk_biz_id, latest_config_version.content
+                    )
+                config = {
+                    "config_template_id": config_template_id,
+                    "config_version_id": config_version_id,
+                    "content": config_version_content_map[config_version_id],
+                    "file_name": config_template.file_name,
+                    "abs_path": config_template.abs_path,
+                }
+                config["input_fingerprint"] = config_generate_handler.input_fingerprint(context_digest, config)
 
-                job_task_tpl_sha256_map[job_task.id][config_template_id].append(sha256sum)
+                # 输入指纹与最新配置实例一致，渲染结果不变，直接复用
+                latest_config_inst = latest_fingerprint_map.get(
+                    (job_task.bk_process_id, inst_id, config_template_id, config["input_fingerprint"])
+                )
+                if latest_config_inst:
+                    unchanged_config_inst_ids.append(latest_config_inst["id"])
+                    job_task_tpl_sha256_map[job_task.id][config_template_id].append(latest_config_inst["sha256"])
+                    continue
+                configs.append(config)
 
             # job_task 不关联模板，任务需要被忽略
             if not has_config_template:
@@ -344,14 +360,52 @@ class BulkGenerateConfigService(MultiJobTaskBaseService):
                 )
                 continue
 
-        # 设置老的配置实例为非最新
+            if not configs:
+                continue
+            render_params_list.append(
+                {
+                    "job_task_id": job_task.id,
+                    "process_info": job_task.process_info,
+                    "inst_id": inst_id,
+                    "local_inst_id": job_task.local_inst_id,
+                    "configs": configs,
+                }
+            )
+
+        # 渲染配置，任务量大时分片并行渲染
+        rendered_results = config_generate_handler.render(render_params_list)
+
+        for rendered_result in rendered_results:
+            job_task = job_task_id_obj_map[rendered_result["job_task_id"]]
+            for rendered_config in rendered_result["configs"]:
+                config_template_id = rendered_config["config_template_id"]
+                to_be_created_config_instances.append(
+                    ConfigInstance(
+                        config_version_id=rendered_config["config_version_id"],
+                        config_template_id=config_template_id,
+                        bk_process_id=job_task.bk_process_id,
+                        content=rendered_config["content"],
+                        sha256=rendered_config["sha256"],
+                        expression="TODO",
+                        is_latest=True,
+                        inst_id=job_task.inst_id,
+                        created_by=bk_username,
+                        path=rendered_config["path"],
+                        name=rendered_config["name"],
+                        input_fingerprint=rendered_config["input_fingerprint"],
+                    )
+                )
+                to_be_update_config_instances[config_template_id].append(job_task.bk_process_id)
+                job_task_tpl_sha256_map[job_task.id][config_template_id].append(rendered_config["sha256"])
+
+        # 设置老的配置实例为非最新，输入未变更的配置实例保持最新
         for config_template_id, bk_process_ids in to_be_update_config_instances.items():
             ConfigInstance.objects.filter(
                 config_template_id=config_template_id, bk_process_id__in=bk_process_ids
-            ).update(is_latest=False)
+            ).exclude(id__in=unchanged_config_inst_ids).update(is_latest=False)
         ConfigInstance.objects.bulk_create(to_be_created_config_instances, batch_size=500)
 
-        # 回写生成的模板实例 TODO 任务量大时这里可能有耗时，可以做pipeline分片进行优化
+        # 回写生成的模板实例
         new_config_instances = ConfigInstance.objects.filter(
             config_template_id__in=all_config_template_ids, bk_process_id__in=all_process_ids, is_latest=True
         ).values("id", "config_template_id", "sha256", "name")
@@ -383,6 +437,28 @@ class BulkGenerateConfigService(MultiJobTaskBaseService):
             )
         return self.return_data(result=True)
 
+    @staticmethod
+    def get_latest_fingerprint_map(job_tasks: List[JobTask], config_template_ids: Set[int]) -> Dict:
+        """查询任务对应的最新配置实例，以 (进程ID, 实例ID, 配置模板ID, 输入指纹) 为键"""
+        latest_config_instances = (
+            ConfigInstance.objects.filter(
+                config_template_id__in=config_template_ids,
+                bk_process_id__in={job_task.bk_process_id for job_task in job_tasks},
+                is_latest=True,
+            )
+            .exclude(input_fingerprint="")
+            .values("id", "bk_process_id", "inst_id", "config_template_id", "input_fingerprint", "sha256")
+        )
+        return {
+            (
+                config_inst["bk_process_id"],
+                config_inst["inst_id"],
+                config_inst["config_template_id"],
+                config_inst["input_fingerprint"],
+            ): config_inst
+            for config_inst in latest_config_instances
+        }
+
     def inputs_format(self):
         return super().inputs_format() + [
             JobTaskBaseService.InputItem(name="bk_username", key="bk_username", required=True),
@@ -404,6 +480,12 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
 
     __need_schedule__ = True
     interval = StaticIntervalGenerator(POLLING_INTERVAL)
+    adaptive_interval_range = JOB_ADAPTIVE_POLLING_INTERVAL_RANGE
+    # 是否支持跳过与现网内容一致的配置实例
+    skip_unchanged_supported = False
+    # 是否将同一主机的多个配置文件打包到一个作业中，pack_merge_fields 为打包时需要合并的作业参数
+    pack_files_by_host = False
+    pack_merge_fields: List[str] = []
 
     def request_single_job_and_create_map(
         self,
@@ -431,12 +513,7 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
             # 请求作业平台
             job_instance_id = job_func(job_params)["job_instance_id"]
         except ApiResultError as err:
-            if err.code in EsbApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST:
-                # 超过ESB频率限制，进行重试
-                sleep(0.5)
-                return self.request_single_job_and_create_map(
-                    job_func, job_id, job_task_ids, config_inst_ids_gby_job_task_id, job_params, pipeline_data
-                )
+            # 超过ESB频率限制时已由 DataAPI 令牌桶冷却后有限次重试，仍失败则视为下发失败
             for job_task in JobTask.objects.filter(id__in=job_task_ids):
                 job_task.set_status(
                     JobStatus.FAILED,
@@ -457,6 +534,123 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
             config_template_id__in=config_template_ids, bk_process_id__in=bk_process_ids, is_latest=True
         )
 
+    def get_unchanged_config_inst_ids(self, job_tasks: List[JobTask], config_instances: List[ConfigInstance]) -> Set:
+        """开启跳过未变更模式时，查询与现网内容一致、无需执行作业的配置实例"""
+        if not (self.skip_unchanged_supported and job_tasks and job_tasks[0].extra_data.get("skip_unchanged")):
+            return set()
+        return ConfigInstance.get_unchanged_config_inst_ids(config_instances)
+
+    def handle_unchanged_job_tasks(self, job_tasks: List[JobTask], unchanged_config_inst_ids: List[int]):
+        """处理所有配置均未变更、无需执行作业的任务"""
+        pass
+
+    @staticmethod
+    def build_job_params(
+        data, bk_biz_id: int, job_task: JobTask, config_inst: Dict[str, Any], config_instance: ConfigInstance
+    ) -> Dict[str, Any]:
+        """根据单个配置文件生成作业参数，target_server 由调用方按聚合结果填充"""
+        variables = {
+            "file_target_path": config_inst["path"],
+            "file_name": config_inst["file_name"],
+            "user": config_inst["user"],
+            "os_type": config_inst["os_type"],
+            "file_content": config_instance.content,
+        }
+        job_params = {
+            "os_type": config_inst["os_type"],
+            "bk_biz_id": bk_biz_id,
+            "account_alias": config_inst["user"],
+            "target_server": {"ip_list": []},
+        }
+        # 添加额外的job_params字段参数，参数名对应上述变量时取变量值，否则原样传入
+        for job_params_key, job_params_field in data.get_one_of_inputs("job_params").items():
+            args = [variables.get(str(arg)) or arg for arg in job_params_field["args"]]
+            job_params[job_params_key] = job_params_field["func"](*args)
+        return job_params
+
+    def build_group_job_params(self, data, bk_biz_id: int, job_group: Dict[str, Any]) -> Dict[str, Any]:
+        """根据聚合后的作业生成作业参数，打包的文件合并 pack_merge_fields 中的参数"""
+        job_params = self.build_job_params(data, bk_biz_id, *job_group["files"][0])
+        for file in job_group["files"][1:]:
+            for field in self.pack_merge_fields:
+                job_params[field].extend(self.build_job_params(data, bk_biz_id, *file)[field])
+        job_params["target_server"]["ip_list"] = [
+            {"bk_cloud_id": bk_cloud_id, "ip": ip} for bk_cloud_id, ip in job_group["hosts"]
+        ]
+        return job_params
+
+    def pack_files_by_host_key(self, to_be_executed_files: List) -> List[Dict[str, List]]:
+        """
+        按主机打包文件：同一主机上 generate_pack_key 相同的文件组成一个文件集合
+        同一主机上多个进程共用的同名同内容文件只下发一次，同名不同内容的文件拆分到不同的文件集合
+        :return: [{"files": 打包下发的文件, "members": 文件集合涉及的所有任务文件}]
+        """
+        host_file_sets: Dict[tuple, List[Dict]] = defaultdict(list)
+        for file in to_be_executed_files:
+            job_task, config_inst, __ = file
+            host_info = job_task.process_info["host"]
+            file_sets = host_file_sets[
+                (host_info["bk_cloud_id"], host_info["bk_host_innerip"], self.generate_pack_key(config_inst))
+            ]
+            file_name = config_inst["file_name"]
+            for file_set in file_sets:
+                same_name_file = file_set["files"].get(file_name)
+                if same_name_file is None or same_name_file[1]["sha256"] == config_inst["sha256"]:
+                    break
+            else:
+                file_set = {"files": {}, "members": []}
+                file_sets.append(file_set)
+            file_set["files"].setdefault(file_name, file)
+            file_set["members"].append(file)
+
+        return [
+            {"files": [file_set["files"][name] for name in sorted(file_set["files"])], "members": file_set["members"]}
+            for file_sets in host_file_sets.values()
+            for file_set in file_sets
+        ]
+
+    def group_files_to_jobs(self, to_be_executed_files: List) -> Dict[str, Dict[str, Any]]:
+        """
+        将配置文件聚合为作业
+        - 默认：路径、文件名、文件内容一致（generate_job_key 相同）的文件视为同一文件，目标主机合并到一个作业中
+        - 按主机打包：文件集合一致的主机合并到一个作业中，作业数取决于不同文件集合的数量
+        :param to_be_executed_files: [(job_task, config_inst, config_instance)]
+        :return: {job_key: {"job_id", "files", "hosts", "config_inst_ids_gby_job_task_id"}}
+        """
+        if self.pack_files_by_host:
+            file_sets = self.pack_files_by_host_key(to_be_executed_files)
+        else:
+            file_sets = [{"files": [file], "members": [file]} for file in to_be_executed_files]
+
+        job_groups: Dict[str, Dict[str, Any]] = {}
+        for file_set in file_sets:
+            files = file_set["files"]
+            job_keys = [
+                self.generate_job_key(config_inst, config_instance) for __, config_inst, config_instance in files
+            ]
+            if self.pack_files_by_host:
+                job_keys.insert(0, self.generate_pack_key(files[0][1]))
+            job_group = job_groups.setdefault(
+                "|".join(job_keys),
+                {
+                    "job_id": files[0][0].job_id,
+                    "files": files,
+                    # 按插入顺序去重的目标主机 {(bk_cloud_id, bk_host_innerip): None}
+                    "hosts": {},
+                    "config_inst_ids_gby_job_task_id": defaultdict(list),
+                },
+            )
+            for job_task, config_inst, __ in file_set["members"]:
+                host_info = job_task.process_info["host"]
+                host = (host_info["bk_cloud_id"], host_info["bk_host_innerip"])
+                job_group["hosts"][host] = None
+                job_group["config_inst_ids_gby_job_task_id"][int(job_task.id)].append(config_inst["id"])
+        return job_groups
+
+    def generate_pack_key(self, config_instance_info: Dict[str, Any]) -> str:
+        """生成文件打包键，同一作业中的文件需要目标路径、执行账户、系统类型一致"""
+        return f"{config_instance_info['path']}-{config_instance_info['user']}-{config_instance_info['os_type']}"
+
     def generate_job_key(self, config_instance_info: Dict[str, Any], config_instance_obj: ConfigInstance):
         """
         生成 Job 调用聚合键
@@ -471,7 +665,6 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
         bk_biz_id = data.get_one_of_inputs("bk_biz_id")
         data.outputs.job_instance_id__job_task_ids_map = {}
 
-        multi_job_params_map = {}
         job_tasks_config_template_ids_map = JobTask.get_job_tasks_config_template_ids_map(job_tasks)
         all_config_template_ids = set(itertools.chain.from_iterable(job_tasks_config_template_ids_map.values()))
 
@@ -480,8 +673,8 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
         ignored_job_task_ids = set()
         process_inst_map_key_tmpl = "{bk_process_id}-{inst_id}"
         for job_task in job_tasks:
-            bk_process_id = job_task.extra_data["process_info"]["process"]["bk_process_id"]
-            inst_id = job_task.extra_data["inst_id"]
+            bk_process_id = job_task.process_info["process"]["bk_process_id"]
+            inst_id = job_task.inst_id
             bk_process_ids.add(bk_process_id)
             process_inst_map[process_inst_map_key_tmpl.format(bk_process_id=bk_process_id, inst_id=inst_id)] = job_task
 
@@ -497,8 +690,29 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
             config_template.config_template_id: config_template
             for config_template in ConfigTemplate.objects.filter(config_template_id__in=all_config_template_ids)
         }
-        config_instance_id_content_map = {}
-        for config_instance in self.get_config_inst_queryset(all_config_template_ids, bk_process_ids):
+        config_instances_to_be_executed = list(self.get_config_inst_queryset(all_config_template_ids, bk_process_ids))
+        unchanged_config_inst_ids = self.get_unchanged_config_inst_ids(job_tasks, config_instances_to_be_executed)
+        unchanged_job_task_ids = set()
+        if unchanged_config_inst_ids:
+            for config_instance in config_instances_to_be_executed:
+                inst_job_task = process_inst_map.get(
+                    process_inst_map_key_tmpl.format(
+                        bk_process_id=config_instance.bk_process_id, inst_id=config_instance.inst_id
+                    )
+                )
+                if inst_job_task and config_instance.id in unchanged_config_inst_ids:
+                    unchanged_job_task_ids.add(inst_job_task.id)
+            config_instances_to_be_executed = [
+                config_instance
+                for config_instance in config_instances_to_be_executed
+                if config_instance.id not in unchanged_config_inst_ids
+            ]
+        ConfigContent.fill_contents(config_instances_to_be_executed)
+
+        # 待执行作业的配置文件 [(job_task, config_inst, config_instance)]
+        to_be_executed_files = []
+        to_be_updated_job_tasks: Dict[int, JobTask] = {}
+        for config_instance in config_instances_to_be_executed:
             inst_job_task: Optional[JobTask] = process_inst_map.get(
                 process_inst_map_key_tmpl.format(
                     bk_process_id=config_instance.bk_process_id, inst_id=config_instance.inst_id
@@ -518,80 +732,59 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
 
             # 更新config_instances
             config_instances = inst_job_task.extra_data["config_instances"]
-            config_instance_ids = {config_instance["id"] for config_instance in config_instances}
-
-            if config_instance.id not in config_instance_ids:
+            config_inst = next((inst for inst in config_instances if inst["id"] == config_instance.id), None)
+            if config_inst is None:
                 config_template = config_template_id_obj_map[config_instance.config_template_id]
-                config_instances.append(
-                    {
-                        "id": config_instance.id,
-                        "sha256": config_instance.sha256,
-                        "config_template_id": config_instance.config_template_id,
-                        "template_name": config_template.template_name,
-                        "user": config_template.owner,
-                        "file_name": config_instance.name,
-                        "inst_id": config_instance.inst_id,
-                        "path": config_instance.path,
-                        "os_type": JOB_TASK_OS_TYPE["linux"]
-                        if config_template.line_separator == ConfigTemplate.LineSeparator.LF
-                        else JOB_TASK_OS_TYPE["win"],
-                    }
-                )
-            config_instance_id_content_map[config_instance.id] = config_instance
-            inst_job_task.extra_data["config_instances"] = config_instances
-            inst_job_task.save(update_fields=["extra_data"])
+                config_inst = {
+                    "id": config_instance.id,
+                    "sha256": config_instance.sha256,
+                    "config_template_id": config_instance.config_template_id,
+                    "template_name": config_template.template_name,
+                    "user": config_template.owner,
+                    "file_name": config_instance.name,
+                    "inst_id": config_instance.inst_id,
+                    "path": config_instance.path,
+                    "os_type": JOB_TASK_OS_TYPE["linux"]
+                    if config_template.line_separator == ConfigTemplate.LineSeparator.LF
+                    else JOB_TASK_OS_TYPE["win"],
+                }
+                config_instances.append(config_inst)
+                to_be_updated_job_tasks[inst_job_task.id] = inst_job_task
+            to_be_executed_files.append((inst_job_task, config_inst, config_instance))
 
-            host_info = inst_job_task.extra_data["process_info"]["host"]
+        JobTask.objects.bulk_update(
+            to_be_updated_job_tasks.values(), fields=["extra_data"], batch_size=constants.ORM_BATCH_SIZE
+        )
 
-            for config_inst in config_instances:
-                if config_inst["id"] not in config_instance_id_content_map:
-                    continue
+        multi_job_params_map = {}
+        job_func = data.get_one_of_inputs("job_func")
+        for job_key, job_group in self.group_files_to_jobs(to_be_executed_files).items():
+            job_params = self.build_group_job_params(data, bk_biz_id, job_group)
+            config_inst_ids_gby_job_task_id = job_group["config_inst_ids_gby_job_task_id"]
+            multi_job_params_map[job_key] = {
+                "job_func": job_func,
+                "job_id": job_group["job_id"],
+                "job_task_ids": list(config_inst_ids_gby_job_task_id.keys()),
+                "config_inst_ids_gby_job_task_id": config_inst_ids_gby_job_task_id,
+                "job_params": job_params,
+                "pipeline_data": data,
+            }
 
-                file_target_path = config_inst["path"]
-                file_name = config_inst["file_name"]
-                user = config_inst["user"]
-                file_content = config_instance_id_content_map[config_inst["id"]].content
-                key = self.generate_job_key(config_inst, config_instance_id_content_map[config_inst["id"]])
-                os_type = config_inst["os_type"]
-                # 路径、文件名、文件内容一致，则认为是同一个文件，合并到一个作业中，提高执行效率
-                if key in multi_job_params_map:
-                    multi_job_params_map[key]["job_task_ids"].append(inst_job_task.id)
-                    multi_job_params_map[key]["job_params"]["target_server"]["ip_list"].append(
-                        {"bk_cloud_id": host_info["bk_cloud_id"], "ip": host_info["bk_host_innerip"]}
-                    )
-                else:
-                    multi_job_params_map[key] = {
-                        "job_func": data.get_one_of_inputs("job_func"),
-                        "job_id": inst_job_task.job_id,
-                        "job_task_ids": [inst_job_task.id],
-                        "config_inst_ids_gby_job_task_id": defaultdict(list),
-                        "job_params": {
-                            "os_type": os_type,
-                            "bk_biz_id": bk_biz_id,
-                            "account_alias": user,
-                            "target_server": {
-                                "ip_list": [
-                                    {"bk_cloud_id": host_info["bk_cloud_id"], "ip": host_info["bk_host_innerip"]}
-                                ]
-                            },
-                        },
-                        "pipeline_data": data,
-                    }
-                    # 添加额外的job_params字段参数
-                    job_params = data.get_one_of_inputs("job_params")
-                    for job_params_key in job_params:
-                        job_params_field = job_params[job_params_key]
-                        # 这里不能用列表推导式，会造成作用域更改
-                        args = []
-                        for arg in job_params_field["args"]:
-                            args.append(locals().get(str(arg)) or arg)
-                        multi_job_params_map[key]["job_params"].update(
-                            {job_params_key: job_params_field["func"](*args)}
-                        )
-
-                multi_job_params_map[key]["config_inst_ids_gby_job_task_id"][int(inst_job_task.id)].append(
-                    config_inst["id"]
-                )
+        if unchanged_job_task_ids:
+            # 所有配置均与现网一致的任务，无需执行作业
+            job_task_ids_to_be_executed = {
+                job_task_id
+                for job_params in multi_job_params_map.values()
+                for job_task_id in job_params["job_task_ids"]
+            }
+            unchanged_job_tasks = [
+                job_task
+                for job_task in job_tasks
+                if job_task.id in unchanged_job_task_ids
+                and job_task.id not in job_task_ids_to_be_executed
+                and job_task.id not in ignored_job_task_ids
+            ]
+            self.handle_unchanged_job_tasks(unchanged_job_tasks, list(unchanged_config_inst_ids))
 
         data.inputs.job_params = ""  # 由于pickle不能序列化lambda，所以需要清空
         if multi_job_params_map:
@@ -634,7 +827,7 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
                 {"bk_biz_id": bk_biz_id, "job_instance_id": job_instance_id, "return_ip_result": False}
             )
         except ApiResultError as err:
-            # 超过ESB频率限制，认为是running，等待下次查询
+            # 令牌桶冷却重试后仍超过ESB频率限制，认为是running，等待下次查询
             if err.code in EsbApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST:
                 return [constants.BkJobStatus.RUNNING]
             raise err
@@ -653,7 +846,9 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
             # 任务成功，记录状态，避免下次继续查询
             pipeline_data.outputs.job_instance_id__job_task_ids_map[job_instance_id]["status"] = job_status
 
-            for job_task in JobTask.objects.filter(id__in=job_task_ids):
+            job_tasks = list(JobTask.objects.filter(id__in=job_task_ids))
+            JobTask.fill_process_infos(job_tasks)
+            for job_task in job_tasks:
                 for config_inst in job_task.extra_data.get("config_instances", []):
                     succeeded_config_inst_ids.append(config_inst["id"])
                 succeeded_job_tasks.append(job_task)
@@ -676,7 +871,7 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
                 {"bk_biz_id": bk_biz_id, "job_instance_id": job_instance_id, "return_ip_result": True}
             )
         except ApiResultError as err:
-            # 超过ESB频率限制，认为是running，等待下次查询
+            # 令牌桶冷却重试后仍超过ESB频率限制，认为是running，等待下次查询
             if err.code in EsbApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST:
                 return [constants.BkJobStatus.RUNNING]
             raise err
@@ -686,11 +881,12 @@ class BulkExecuteJobPlatformService(MultiJobTaskBaseService):
         for ip_result in ip_results["step_instance_list"][0]["step_ip_result_list"]:
             cloud_ip_status_map[f'{ip_result["bk_cloud_id"]}-{ip_result["ip"]}'] = ip_result
 
-        job_tasks = JobTask.objects.filter(id__in=job_task_ids)
+        job_tasks = list(JobTask.objects.filter(id__in=job_task_ids))
+        JobTask.fill_process_infos(job_tasks)
 
         for job_task in job_tasks:
-            ip = job_task.extra_data["process_info"]["host"]["bk_host_innerip"]
-            cloud_id = job_task.extra_data["process_info"]["host"]["bk_cloud_id"]
+            ip = job_task.process_info["host"]["bk_host_innerip"]
+            cloud_id = job_task.process_info["host"]["bk_cloud_id"]
             cloud_ip = f"{cloud_id}-{ip}"
             try:
                 ip_result = cloud_ip_status_map[cloud_ip]
@@ -790,6 +986,25 @@ class BulkPushConfigService(BulkExecuteJobPlatformService):
     下发配置
     """
 
+    skip_unchanged_supported = True
+    pack_merge_fields = ["file_list"]
+
+    @property
+    def pack_files_by_host(self) -> bool:
+        return settings.CONFIG_RELEASE_PACK_FILES_BY_HOST
+
+    def handle_unchanged_job_tasks(self, job_tasks: List[JobTask], unchanged_config_inst_ids: List[int]):
+        # 现网内容已是最新，视为已下发
+        self.handle_succeeded_conf_inst_ids(unchanged_config_inst_ids)
+        JobTask.bulk_set_status(
+            job_tasks,
+            JobStatus.IGNORED,
+            extra_data_map={
+                job_task.id: {"failed_reason": str(ConfigInstanceUnchangedException().message), "retryable": False}
+                for job_task in job_tasks
+            },
+        )
+
     def generate_job_key(self, config_instance_info: Dict[str, Any], config_instance_obj: ConfigInstance):
         file_target_path = config_instance_info["path"]
         file_name = config_instance_info["file_name"]
@@ -799,7 +1014,9 @@ class BulkPushConfigService(BulkExecuteJobPlatformService):
 
     def handle_succeeded_conf_inst_ids(self, succeeded_config_inst_ids: List[int]):
         """处理成功的配置实例"""
-        ConfigInstance.objects.filter(id__in=succeeded_config_inst_ids).update(is_released=True)
+        ConfigInstance.objects.filter(id__in=succeeded_config_inst_ids).update(
+            is_released=True, released_at=timezone.now()
+        )
 
     @staticmethod
     def set_succeeded_job_task_status(job_task: JobTask):
@@ -854,6 +1071,9 @@ class BulkBackupConfigService(BulkExecuteJobPlatformService):
     配置文件备份
     """
 
+    # 与现网一致的配置不会被覆盖，无需备份
+    skip_unchanged_supported = True
+
     def generate_job_key(self, config_instance_info: Dict[str, Any], config_instance_obj: ConfigInstance):
         file_target_path = config_instance_info["path"]
         file_name = config_instance_info["file_name"]
@@ -942,9 +1162,9 @@ class BulkDiffConfigService(BulkExecuteJobPlatformService):
             all_config_inst_ids.extend(
                 [config_instance["id"] for config_instance in job_task.extra_data.get("config_instances") or []]
             )
-            ip = job_task.extra_data["process_info"]["host"]["bk_host_innerip"]
-            bk_cloud_id = job_task.extra_data["process_info"]["host"]["bk_cloud_id"]
-            bk_host_id = job_task.extra_data["process_info"]["host"]["bk_host_id"]
+            ip = job_task.process_info["host"]["bk_host_innerip"]
+            bk_cloud_id = job_task.process_info["host"]["bk_cloud_id"]
+            bk_host_id = job_task.process_info["host"]["bk_host_id"]
 
             # 同主机的不同进程被分配到同一个作业，说明调用脚本一致，这里需要进行去重
             if bk_host_id in record_host_ids:
@@ -979,8 +1199,8 @@ class BulkDiffConfigService(BulkExecuteJobPlatformService):
         }
 
         for job_task in job_tasks:
-            ip = job_task.extra_data["process_info"]["host"]["bk_host_innerip"]
-            bk_cloud_id = job_task.extra_data["process_info"]["host"]["bk_cloud_id"]
+            ip = job_task.process_info["host"]["bk_host_innerip"]
+            bk_cloud_id = job_task.process_info["host"]["bk_cloud_id"]
             job_instance_ip_log: Dict = cloud_ip__job_log_map[f"{bk_cloud_id}-{ip}"]
 
             # 上层逻辑确保同一个 job_instance_id 仅拉取一个配置
@@ -1027,6 +1247,8 @@ class BulkDiffConfigService(BulkExecuteJobPlatformService):
                 snapshot.job_instance_id = snapshot.job_instance_id
                 snapshot.content = config_snapshot_content
                 snapshot.sha256 = sha256sum
+                # bulk_update 不会触发 auto_now，需手动刷新快照时间
+                snapshot.updated_at = timezone.now()
                 to_be_updated_config_snapshots.append(snapshot)
             else:
                 snapshot: ConfigSnapshot = ConfigSnapshot(
@@ -1059,8 +1281,9 @@ class BulkDiffConfigService(BulkExecuteJobPlatformService):
                     newest_job_task.save(update_fields=["extra_data"])
 
         ConfigSnapshot.objects.bulk_create(to_be_created_config_snapshots)
+        ConfigContent.save_contents({snapshot.sha256: snapshot.content for snapshot in to_be_updated_config_snapshots})
         ConfigSnapshot.objects.bulk_update(
-            to_be_updated_config_snapshots, fields=["job_instance_id", "content", "sha256"]
+            to_be_updated_config_snapshots, fields=["job_instance_id", "inline_content", "sha256", "updated_at"]
         )
 
     @classmethod
@@ -10,7 +10,8 @@ See the License for the specific language governing permissions and limitations
 """
 import json
 import logging
-from typing import Dict
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
 
 from django.db.models import F
 from django.utils.translation import ugettext as _
@@ -18,9 +19,11 @@ from pipeline.component_framework.component import Component
 from pipeline.core.flow.activity import StaticIntervalGenerator
 
 from apps.api import GseApi
+from apps.gsekit.constants import ORM_BATCH_SIZE
 from apps.gsekit.job.models import JobProcInstStatusStatistics, JobTask, JobStatus
 from apps.gsekit.pipeline_plugins.components.collections.base import (
     JobTaskBaseService,
+    GSE_ADAPTIVE_POLLING_INTERVAL_RANGE,
     GSE_POLLING_INTERVAL as POLLING_INTERVAL,
     MultiJobTaskBaseService,
 )
@@ -162,6 +165,11 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
 
     __need_schedule__ = True
     interval = StaticIntervalGenerator(POLLING_INTERVAL)
+    adaptive_interval_range = GSE_ADAPTIVE_POLLING_INTERVAL_RANGE
+
+    def polling_scope(self, data) -> str:
+        # 不同进程操作的耗时差异较大（如 start 需等待 start_check_secs），按操作类型分别统计
+        return f"{super().polling_scope(data)}:{data.get_one_of_inputs('op_type')}"
 
     @staticmethod
     def is_op_cmd_configured(op_type, process_info, raise_exception: bool = False):
@@ -183,9 +191,9 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
     @classmethod
     def get_job_task_gse_result(cls, gse_api_result: Dict[str, Dict], job_task: JobTask) -> Dict:
         """GSE接口偶尔会出现IP进程不返回的情况，针对这种情况默认填充 GseDataErrorCode.RUNNING 状态"""
-        host_info = job_task.extra_data["process_info"]["host"]
-        process_info = job_task.extra_data["process_info"]["process"]
-        local_inst_id = job_task.extra_data["local_inst_id"]
+        host_info = job_task.process_info["host"]
+        process_info = job_task.process_info["process"]
+        local_inst_id = job_task.local_inst_id
         namespace = NAMESPACE.format(bk_biz_id=process_info["bk_biz_id"])
         uniq_key = (
             f"{host_info['bk_cloud_id']}:{host_info['bk_host_innerip']}:"
@@ -198,44 +206,68 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
         }
 
     @classmethod
-    def increment_inst_status_count(cls, job_task: JobTask, status: int, is_auto: bool):
-        increment_status_field = f"proc_inst_{PROC_STATUS_NAME_MAP[status]}_num"
-        increment_auto_field = f"proc_inst_{'auto' if is_auto else 'noauto'}_num"
-
-        update_params = {
-            increment_auto_field: F(increment_auto_field) + 1,
-            increment_status_field: F(increment_status_field) + 1,
-        }
-        # 查出 ID 再更新，避免按 job_id where..update 的情况下多行加锁导致死锁
-        statistics_id = JobProcInstStatusStatistics.objects.get(
-            job_id=job_task.job_id, bk_process_id=job_task.bk_process_id
-        ).id
-        JobProcInstStatusStatistics.objects.filter(id=statistics_id).update(**update_params)
+    def bulk_increment_inst_status_count(cls, job_id: int, proc_inst_states: List[Tuple[int, int, bool]]):
+        """
+        按进程聚合进程实例状态增量，每个进程仅更新一次统计
+        :param job_id: 任务ID
+        :param proc_inst_states: [(bk_process_id, process_status, is_auto), ...]
+        """
+        increments = defaultdict(lambda: defaultdict(int))
+        for bk_process_id, status, is_auto in proc_inst_states:
+            increments[bk_process_id][f"proc_inst_{PROC_STATUS_NAME_MAP[status]}_num"] += 1
+            increments[bk_process_id][f"proc_inst_{'auto' if is_auto else 'noauto'}_num"] += 1
+        if not increments:
+            return
+
+        statistics_ids = dict(
+            JobProcInstStatusStatistics.objects.filter(job_id=job_id, bk_process_id__in=increments.keys()).values_list(
+                "bk_process_id", "id"
+            )
+        )
+        # 查出 ID 后按 ID 顺序逐行更新，避免按 job_id where..update 的情况下多行加锁导致死锁
+        for bk_process_id in sorted(increments, key=lambda _bk_process_id: statistics_ids[_bk_process_id]):
+            JobProcInstStatusStatistics.objects.filter(id=statistics_ids[bk_process_id]).update(
+                **{field: F(field) + num for field, num in increments[bk_process_id].items()}
+            )
 
     @classmethod
-    def sync_status_to_proc(cls, job_task: JobTask):
-        statistics = JobProcInstStatusStatistics.objects.get(
-            job_id=job_task.job_id, bk_process_id=job_task.bk_process_id
-        )
+    def bulk_sync_status_to_proc(cls, job_id: int, bk_process_ids: Set[int]):
+        """根据进程实例状态统计汇总进程状态，更新参数相同的进程合并为一次更新"""
+        bk_process_ids_gby_update_params = defaultdict(list)
+        for statistics in JobProcInstStatusStatistics.objects.filter(job_id=job_id, bk_process_id__in=bk_process_ids):
+            update_params = {}
+            # 出现失败时整体进程状态为失败
+            if statistics.proc_inst_terminated_num > 0:
+                update_params["process_status"] = Process.ProcessStatus.TERMINATED
+            elif statistics.proc_inst_total_num == statistics.proc_inst_running_num:
+                update_params["process_status"] = Process.ProcessStatus.RUNNING
+
+            # 出现托管时，整体未托管
+            if statistics.proc_inst_noauto_num > 0:
+                update_params["is_auto"] = False
+            elif statistics.proc_inst_total_num == statistics.proc_inst_auto_num:
+                update_params["is_auto"] = True
+
+            if update_params:
+                bk_process_ids_gby_update_params[tuple(sorted(update_params.items()))].append(statistics.bk_process_id)
+
+        for update_params_items, to_be_updated_bk_process_ids in bk_process_ids_gby_update_params.items():
+            update_params = dict(update_params_items)
+            logger.info(
+                f"sync_status_to_proc[job:{job_id}, bk_process_ids:{to_be_updated_bk_process_ids}]-{update_params}"
+            )
+            Process.objects.filter(bk_process_id__in=to_be_updated_bk_process_ids).update(**update_params)
 
-        update_params = {}
-        # 出现失败时整体进程状态为失败
-        if statistics.proc_inst_terminated_num > 0:
-            update_params["process_status"] = Process.ProcessStatus.TERMINATED
-        elif statistics.proc_inst_total_num == statistics.proc_inst_running_num:
-            update_params["process_status"] = Process.ProcessStatus.RUNNING
-
-        # 出现托管时，整体未托管
-        if statistics.proc_inst_noauto_num > 0:
-            update_params["is_auto"] = False
-        elif statistics.proc_inst_total_num == statistics.proc_inst_auto_num:
-            update_params["is_auto"] = True
-
-        logger.info(
-            f"sync_status_to_proc[job_task:{job_task.id}, bk_process_id:{job_task.bk_process_id}]-{update_params}"
+    @classmethod
+    def get_proc_inst_map(cls, job_tasks: List[JobTask]) -> Dict[Tuple[int, int], ProcessInst]:
+        """批量查询任务对应的进程实例，返回 {(bk_process_id, local_inst_id): ProcessInst}"""
+        if not job_tasks:
+            return {}
+        proc_insts = ProcessInst.objects.filter(
+            bk_process_id__in={job_task.bk_process_id for job_task in job_tasks},
+            local_inst_id__in={job_task.local_inst_id for job_task in job_tasks},
         )
-        if update_params:
-            Process.objects.filter(bk_process_id=job_task.bk_process_id).update(**update_params)
+        return {(proc_inst.bk_process_id, proc_inst.local_inst_id): proc_inst for proc_inst in proc_insts}
 
     @classmethod
     def generate_proc_op_error_msg(cls, error_code: int, error_msg: str) -> str:
@@ -255,12 +287,12 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
         proc_operate_req = []
         for job_task in job_tasks:
 
-            host_info = job_task.extra_data["process_info"]["host"]
-            process_info = job_task.extra_data["process_info"]["process"]
-            set_info = job_task.extra_data["process_info"]["set"]
-            module_info = job_task.extra_data["process_info"]["module"]
-            inst_id = job_task.extra_data["inst_id"]
-            local_inst_id = job_task.extra_data["local_inst_id"]
+            host_info = job_task.process_info["host"]
+            process_info = job_task.process_info["process"]
+            set_info = job_task.process_info["set"]
+            module_info = job_task.process_info["module"]
+            inst_id = job_task.inst_id
+            local_inst_id = job_task.local_inst_id
 
             context = {
                 "inst_id": inst_id,
@@ -333,8 +365,10 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
             # 查询的任务等待执行中，还未入到redis，继续下一次查询
             return self.return_data(result=True)
 
+        succeeded_job_tasks = []
+        failed_job_tasks_gby_status = defaultdict(list)
+        failed_extra_data_map = {}
         for job_task in job_tasks:
-            local_inst_id = job_task.extra_data["local_inst_id"]
             task_result = self.get_job_task_gse_result(gse_api_result, job_task)
             error_code = task_result.get("error_code")
 
@@ -345,9 +379,27 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
             data.outputs.proc_op_status_map[str(job_task.id)] = error_code
 
             if error_code == GseDataErrorCode.SUCCESS:
-                process_inst = ProcessInst.objects.get(
-                    bk_process_id=job_task.bk_process_id, local_inst_id=local_inst_id
-                )
+                succeeded_job_tasks.append(job_task)
+
+            elif error_code != GseDataErrorCode.RUNNING:
+                # 操作失败，进入下一个原子查询并更新进程状态
+                error_msg = task_result.get("error_msg")
+                if GseDataErrorCode.need_ignore_err_code(op_type=op_type, error_code=error_code):
+                    job_status = JobStatus.IGNORED
+                else:
+                    job_status = JobStatus.FAILED
+                failed_job_tasks_gby_status[job_status].append(job_task)
+                failed_extra_data_map[job_task.id] = {
+                    "failed_reason": self.generate_proc_op_error_msg(error_code, error_msg),
+                    "err_code": error_code,
+                }
+
+        if succeeded_job_tasks:
+            proc_inst_map = self.get_proc_inst_map(succeeded_job_tasks)
+            to_be_updated_proc_insts = []
+            proc_inst_states = []
+            for job_task in succeeded_job_tasks:
+                process_inst = proc_inst_map[(job_task.bk_process_id, job_task.local_inst_id)]
                 # 操作成功，将进程更新到相应操作后的期望状态
                 process_status = OP_SUCCESS_PROC_STATUS_MAP.get(op_type, process_inst.process_status)
                 is_auto = OP_SUCCESS_PROC_AUTO_MAP.get(op_type, process_inst.is_auto)
@@ -355,30 +407,23 @@ class BulkGseOperateProcessService(MultiJobTaskBaseService):
                 if process_status != process_inst.process_status or is_auto != process_inst.is_auto:
                     process_inst.process_status = process_status
                     process_inst.is_auto = is_auto
-                    process_inst.save(update_fields=["is_auto", "process_status"])
+                    to_be_updated_proc_insts.append(process_inst)
+                proc_inst_states.append((job_task.bk_process_id, process_inst.process_status, process_inst.is_auto))
 
-                # 更新进程关联实例托管及状态统计
-                self.increment_inst_status_count(job_task, process_inst.process_status, process_inst.is_auto)
-                # 操作成功时inst状态立即变更，无需经过GseCheckProcessService查询状态，此时需要同步状态到Process
-                self.sync_status_to_proc(job_task)
+            ProcessInst.objects.bulk_update(
+                to_be_updated_proc_insts, fields=["is_auto", "process_status"], batch_size=ORM_BATCH_SIZE
+            )
+            # 更新进程关联实例托管及状态统计
+            job_id = succeeded_job_tasks[0].job_id
+            self.bulk_increment_inst_status_count(job_id, proc_inst_states)
+            # 操作成功时inst状态立即变更，无需经过GseCheckProcessService查询状态，此时需要同步状态到Process
+            self.bulk_sync_status_to_proc(job_id, {job_task.bk_process_id for job_task in succeeded_job_tasks})
 
-                # 设置任务成功
-                job_task.set_status(JobStatus.SUCCEEDED)
+            # 设置任务成功
+            JobTask.bulk_set_status(succeeded_job_tasks, JobStatus.SUCCEEDED)
 
-            elif error_code != GseDataErrorCode.RUNNING:
-                # 操作失败，进入下一个原子查询并更新进程状态
-                error_msg = task_result.get("error_msg")
-                if GseDataErrorCode.need_ignore_err_code(op_type=op_type, error_code=error_code):
-                    job_status = JobStatus.IGNORED
-                else:
-                    job_status = JobStatus.FAILED
-                job_task.set_status(
-                    job_status,
-                    extra_data={
-                        "failed_reason": self.generate_proc_op_error_msg(error_code, error_msg),
-                        "err_code": error_code,
-                    },
-                )
+        for job_status, failed_job_tasks in failed_job_tasks_gby_status.items():
+            JobTask.bulk_set_status(failed_job_tasks, job_status, extra_data_map=failed_extra_data_map)
 
         # 还有未完成的任务
         if GseDataErrorCode.RUNNING in data.outputs.proc_op_status_map.values():
@@ -424,8 +469,8 @@ class BulkGseCheckProcessService(BulkGseOperateProcessService):
             # 查询的任务等待执行中，还未入到redis，继续下一次查询
             return self.return_data(result=True)
 
+        proc_inst_states_map = {}
         for job_task in job_tasks:
-            local_inst_id = job_task.extra_data["local_inst_id"]
             task_result = self.get_job_task_gse_result(gse_api_result, job_task)
             error_code = task_result.get("error_code")
 
@@ -439,13 +484,25 @@ class BulkGseCheckProcessService(BulkGseOperateProcessService):
                     is_auto = False
                 # pid < 0 表示进程终止
                 process_status = Process.ProcessStatus.TERMINATED if pid < 0 else Process.ProcessStatus.RUNNING
-                # 更新进程状态
-                ProcessInst.objects.filter(bk_process_id=job_task.bk_process_id, local_inst_id=local_inst_id).update(
-                    process_status=process_status, is_auto=is_auto
-                )
-
-                self.increment_inst_status_count(job_task, process_status, is_auto)
-                self.sync_status_to_proc(job_task)
+                proc_inst_states_map[job_task.id] = (job_task.bk_process_id, process_status, is_auto)
+
+        if proc_inst_states_map:
+            checked_job_tasks = [job_task for job_task in job_tasks if job_task.id in proc_inst_states_map]
+            proc_inst_map = self.get_proc_inst_map(checked_job_tasks)
+            # 按目标状态分组批量更新进程状态
+            proc_inst_ids_gby_state = defaultdict(list)
+            for job_task in checked_job_tasks:
+                process_inst = proc_inst_map.get((job_task.bk_process_id, job_task.local_inst_id))
+                if process_inst is None:
+                    continue
+                __, process_status, is_auto = proc_inst_states_map[job_task.id]
+                proc_inst_ids_gby_state[(process_status, is_auto)].append(process_inst.id)
+            for (process_status, is_auto), proc_inst_ids in proc_inst_ids_gby_state.items():
+                ProcessInst.objects.filter(id__in=proc_inst_ids).update(process_status=process_status, is_auto=is_auto)
+
+            job_id = checked_job_tasks[0].job_id
+            self.bulk_increment_inst_status_count(job_id, list(proc_inst_states_map.values()))
+            self.bulk_sync_status_to_proc(job_id, {job_task.bk_process_id for job_task in checked_job_tasks})
 
         if GseDataErrorCode.RUNNING in set([result["error_code"] for key, result in gse_api_result["data"].items()]):
             # RUNNING 进入下一次轮询
@@ -15,7 +15,7 @@ from django.utils.translation import ugettext as _
 
 from apps.gsekit import constants
 from apps.gsekit.job.handlers import JobHandlers
-from apps.gsekit.job.models import Job, JobStatus, JobTask, JobErrCode
+from apps.gsekit.job.models import Job, JobProcessSnapshot, JobStatus, JobTask, JobErrCode
 from apps.gsekit.pipeline_plugins.exceptions import GsePriorityException
 from apps.gsekit.utils.notification_maker import JobNotificationMaker, ContentType, MsgType
 
@@ -77,16 +77,18 @@ def activity_failed_handler(pipeline_id, pipeline_activity_id, *args, **kwargs):
             if job_task is None:
                 return
 
-            priority = job_task.extra_data["process_info"]["process"]["priority"] or 0
-            bk_func_name = job_task.extra_data["process_info"]["process"]["bk_func_name"]
-            bk_process_name = job_task.extra_data["process_info"]["process"]["bk_process_name"]
+            priority = job_task.process_info["process"]["priority"] or 0
+            bk_func_name = job_task.process_info["process"]["bk_func_name"]
+            bk_process_name = job_task.process_info["process"]["bk_process_name"]
             if ProcessPipelineManager(job=job).get_op_type_order():
-                conditions = {"extra_data__process_info__process__priority__lt": priority}
+                bk_process_ids = JobProcessSnapshot.filter_bk_process_ids(job.id, process__priority__lt=priority)
+                conditions = {"bk_process_id__in": bk_process_ids}
                 failed_reason = _(
                     "优先级等于[{priority}]的进程({bk_func_name}-{bk_process_name})操作已失败，优先级小于此的进程操作不会被继续执行"
                 ).format(priority=priority, bk_func_name=bk_func_name, bk_process_name=bk_process_name)
             else:
-                conditions = {"extra_data__process_info__process__priority__gt": priority}
+                bk_process_ids = JobProcessSnapshot.filter_bk_process_ids(job.id, process__priority__gt=priority)
+                conditions = {"bk_process_id__in": bk_process_ids}
                 failed_reason = _(
                     "优先级等于[{priority}]的进程({bk_func_name}-{bk_process_name})操作已失败，优先级大于此的进程操作不会被继续执行"
                 ).format(priority=priority, bk_func_name=bk_func_name, bk_process_name=bk_process_name)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import base64
+import itertools
+import math
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from lxml import etree
+from mock import MagicMock, patch
+
+from apps.gsekit.cmdb.constants import BkSetEnv
+from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
+from apps.gsekit.configfile.handlers.config_version import ConfigVersionHandler
+from apps.gsekit.configfile.models import ConfigInstance, ConfigTemplate, ConfigTemplateVersion
+from apps.gsekit.job.models import JobErrCode, JobProcInstStatusStatistics, JobStatus, JobTask, JobTaskStatusStatistics
+from apps.gsekit.pipeline_plugins.components.collections import gse
+from apps.gsekit.pipeline_plugins.components.collections.base import AdaptiveIntervalGenerator, PollingStatistics
+from apps.gsekit.pipeline_plugins.components.collections.configfile import (
+    BulkGenerateConfigService,
+    BulkPushConfigService,
+)
+from apps.gsekit.process.models import Process, ProcessInst
+from pipeline.core.data.base import DataObject
+
+
+@override_settings(CONFIG_RELEASE_PACK_FILES_BY_HOST=True)
+class TestPackFilesByHost(TestCase):
+    def setUp(self):
+        self.service = BulkPushConfigService()
+        self.id_generator = itertools.count(1)
+
+    def make_file(self, job_task: JobTask, file_name: str, content: str):
+        config_instance = ConfigInstance(id=next(self.id_generator), sha256=f"sha256-of-{content}")
+        config_instance.content = content.encode()
+        config_inst = {
+            "id": config_instance.id,
+            "file_name": file_name,
+            "path": "/data",
+            "user": "root",
+            "os_type": 1,
+            "sha256": config_instance.sha256,
+        }
+        return job_task, config_inst, config_instance
+
+    @staticmethod
+    def make_job_task(job_task_id: int, ip: str) -> JobTask:
+        return JobTask(
+            id=job_task_id, job_id=1, extra_data={"process_info": {"host": {"bk_cloud_id": 0, "bk_host_innerip": ip}}}
+        )
+
+    def test_split_same_name_with_different_content(self):
+        job_task_1, job_task_2 = self.make_job_task(1, "127.0.0.1"), self.make_job_task(2, "127.0.0.1")
+        file_sets = self.service.pack_files_by_host_key(
+            [self.make_file(job_task_1, "a.conf", "v1"), self.make_file(job_task_2, "a.conf", "v2")]
+        )
+        self.assertEqual(len(file_sets), 2)
+        self.assertEqual([len(file_set["files"]) for file_set in file_sets], [1, 1])
+
+    def test_dedup_files_on_same_host(self):
+        job_task_1, job_task_2 = self.make_job_task(1, "127.0.0.1"), self.make_job_task(2, "127.0.0.1")
+        files = [
+            self.make_file(job_task_1, "a.conf", "v1"),
+            self.make_file(job_task_1, "b.conf", "v1"),
+            self.make_file(job_task_2, "a.conf", "v1"),
+        ]
+        file_sets = self.service.pack_files_by_host_key(files)
+        self.assertEqual(len(file_sets), 1)
+        # 多个进程共用的同名同内容文件只下发一次，但所有任务文件均需记录
+        self.assertEqual([file[1]["file_name"] for file in file_sets[0]["files"]], ["a.conf", "b.conf"])
+        self.assertEqual(file_sets[0]["members"], files)
+
+    def test_merge_file_list(self):
+        files = []
+        for job_task in [self.make_job_task(1, "127.0.0.1"), self.make_job_task(2, "127.0.0.2")]:
+            files.extend([self.make_file(job_task, "b.conf", "v1"), self.make_file(job_task, "a.conf", "v1")])
+        job_groups = self.service.group_files_to_jobs(files)
+        # 文件集合一致的主机合并到一个作业中
+        self.assertEqual(len(job_groups), 1)
+        job_group = list(job_groups.values())[0]
+        self.assertEqual(list(job_group["hosts"]), [(0, "127.0.0.1"), (0, "127.0.0.2")])
+        self.assertEqual(len(job_group["config_inst_ids_gby_job_task_id"][1]), 2)
+
+        data = MagicMock()
+        data.get_one_of_inputs.return_value = {
+            "file_list": {
+                "args": ["file_name", "file_content"],
+                "func": lambda file_name, file_content: [
+                    {"file_name": file_name, "content": base64.b64encode(file_content).decode()}
+                ],
+            },
+        }
+        job_params = self.service.build_group_job_params(data, 1, job_group)
+        self.assertEqual([file["file_name"] for file in job_params["file_list"]], ["a.conf", "b.conf"])
+        self.assertEqual(
+            job_params["target_server"]["ip_list"],
+            [{"bk_cloud_id": 0, "ip": "127.0.0.1"}, {"bk_cloud_id": 0, "ip": "127.0.0.2"}],
+        )
+
+
+class TestBulkGseOperateProcess(TestCase):
+    JOB_ID = 1
+    BK_BIZ_ID = 2
+
+    def setUp(self):
+        self.service = gse.BulkGseOperateProcessService()
+        for bk_process_id in [1, 2]:
+            Process.objects.create(
+                bk_biz_id=self.BK_BIZ_ID,
+                bk_host_innerip="127.0.0.1",
+                bk_cloud_id=0,
+                bk_set_env=BkSetEnv.FORMAL,
+                bk_set_id=1,
+                bk_module_id=1,
+                service_instance_id=bk_process_id,
+                bk_process_name=f"proc{bk_process_id}",
+                bk_process_id=bk_process_id,
+                process_template_id=0,
+            )
+            ProcessInst.objects.create(
+                bk_biz_id=self.BK_BIZ_ID,
+                bk_host_num=1,
+                bk_host_innerip="127.0.0.1",
+                bk_cloud_id=0,
+                bk_process_id=bk_process_id,
+                bk_module_id=1,
+                bk_process_name=f"proc{bk_process_id}",
+                inst_id=1,
+                local_inst_id=1,
+            )
+            JobProcInstStatusStatistics.objects.create(
+                job_id=self.JOB_ID, bk_process_id=bk_process_id, proc_inst_total_num=1
+            )
+            JobTask.objects.create(
+                job_id=self.JOB_ID,
+                bk_process_id=bk_process_id,
+                local_inst_id=1,
+                pipeline_id="",
+                status=JobStatus.RUNNING,
+                err_code=JobErrCode.RUNNING,
+                extra_data={
+                    "process_info": {
+                        "host": {"bk_cloud_id": 0, "bk_host_innerip": "127.0.0.1"},
+                        "process": {"bk_biz_id": self.BK_BIZ_ID, "bk_process_name": f"proc{bk_process_id}"},
+                    }
+                },
+            )
+        JobTaskStatusStatistics.rebuild(self.JOB_ID)
+
+    def gse_result_key(self, bk_process_id: int) -> str:
+        namespace = gse.NAMESPACE.format(bk_biz_id=self.BK_BIZ_ID)
+        return f"0:127.0.0.1:{namespace}:proc{bk_process_id}_1"
+
+    def test_sync_status_to_proc(self):
+        # 同一进程两个实例：一个运行托管、一个终止未托管
+        JobProcInstStatusStatistics.objects.filter(job_id=self.JOB_ID, bk_process_id=1).update(proc_inst_total_num=2)
+        self.service.bulk_increment_inst_status_count(
+            self.JOB_ID,
+            [
+                (1, Process.ProcessStatus.RUNNING, True),
+                (1, Process.ProcessStatus.TERMINATED, False),
+                (2, Process.ProcessStatus.RUNNING, True),
+            ],
+        )
+        statistics = JobProcInstStatusStatistics.objects.get(job_id=self.JOB_ID, bk_process_id=1)
+        self.assertEqual(
+            (
+                statistics.proc_inst_running_num,
+                statistics.proc_inst_terminated_num,
+                statistics.proc_inst_auto_num,
+                statistics.proc_inst_noauto_num,
+            ),
+            (1, 1, 1, 1),
+        )
+
+        self.service.bulk_sync_status_to_proc(self.JOB_ID, {1, 2})
+        self.assertDictEqual(
+            {
+                process.bk_process_id: (process.process_status, process.is_auto)
+                for process in Process.objects.filter(bk_process_id__in=[1, 2])
+            },
+            {1: (Process.ProcessStatus.TERMINATED, False), 2: (Process.ProcessStatus.RUNNING, True)},
+        )
+
+    def test_schedule(self):
+        job_tasks = list(JobTask.objects.filter(job_id=self.JOB_ID).order_by("bk_process_id"))
+        data = MagicMock()
+        data.get_one_of_inputs.side_effect = {"job_tasks": job_tasks, "op_type": gse.GseOpType.START}.get
+        data.get_one_of_outputs.return_value = "task_id"
+        data.outputs.proc_op_status_map = {str(job_task.id): gse.GseDataErrorCode.RUNNING for job_task in job_tasks}
+        gse_api_result = {
+            "code": 0,
+            "data": {
+                self.gse_result_key(1): {"error_code": gse.GseDataErrorCode.SUCCESS, "error_msg": "", "content": ""},
+                self.gse_result_key(2): {
+                    "error_code": gse.GseDataErrorCode.POST_CHECK_ERROR,
+                    "error_msg": "start failed",
+                    "content": "",
+                },
+            },
+        }
+        with patch.object(gse.GseApi, "get_proc_operate_result", return_value=gse_api_result):
+            result = self.service._schedule(data, MagicMock())
+        self.assertTrue(result["result"])
+        self.assertTrue(result["is_finished"])
+
+        self.assertDictEqual(
+            {
+                job_task.bk_process_id: (job_task.status, job_task.err_code)
+                for job_task in JobTask.objects.filter(job_id=self.JOB_ID)
+            },
+            {
+                1: (JobStatus.SUCCEEDED, JobErrCode.SUCCEEDED),
+                2: (JobStatus.FAILED, gse.GseDataErrorCode.POST_CHECK_ERROR),
+            },
+        )
+        statistics = JobTaskStatusStatistics.get_statistics(self.JOB_ID)
+        self.assertCountEqual(statistics, JobTaskStatusStatistics.rebuild(self.JOB_ID))
+
+        # 仅操作成功的进程更新实例状态及进程状态
+        proc_inst = ProcessInst.objects.get(bk_process_id=1)
+        self.assertEqual((proc_inst.process_status, proc_inst.is_auto), (Process.ProcessStatus.RUNNING, True))
+        process = Process.objects.get(bk_process_id=1)
+        self.assertEqual((process.process_status, process.is_auto), (Process.ProcessStatus.RUNNING, True))
+        self.assertEqual(Process.objects.get(bk_process_id=2).process_status, Process.ProcessStatus.TERMINATED)
+
+
+class TestBulkGenerateConfig(TestCase):
+    BK_BIZ_ID = 2
+    CC_XML_DOC = (
+        b'<Application><Set SetName="set1" bk_set_id="1">'
+        b'<Module ModuleName="module1" bk_module_id="1">'
+        b'<Host InnerIP="127.0.0.1" bk_cloud_id="0" bk_host_name="host1"/>'
+        b'<Host InnerIP="127.0.0.2" bk_cloud_id="0" bk_host_name="host2"/>'
+        b"</Module></Set></Application>"
+    )
+
+    def setUp(self):
+        ConfigTemplate.objects.create(
+            config_template_id=1,
+            bk_biz_id=self.BK_BIZ_ID,
+            template_name="template",
+            file_name="a.conf",
+            abs_path="/data",
+            owner="root",
+            group="root",
+            filemode="0644",
+            line_separator=ConfigTemplate.LineSeparator.LF,
+        )
+        self.config_version = ConfigTemplateVersion.objects.create(
+            config_template_id=1,
+            content='host_name=${this.cc_host.get("bk_host_name")}',
+            is_draft=False,
+            is_active=True,
+        )
+        self.job_task = JobTask.objects.create(
+            job_id=1,
+            bk_process_id=1,
+            inst_id=1,
+            local_inst_id=1,
+            pipeline_id="",
+            status=JobStatus.RUNNING,
+            extra_data={
+                "skip_unchanged": True,
+                "config_template_ids": [1],
+                "process_info": {
+                    "process": {
+                        "bk_biz_id": self.BK_BIZ_ID,
+                        "bk_process_id": 1,
+                        "bk_process_name": "nginx",
+                        "bk_func_name": "nginx",
+                        "work_path": "/data",
+                        "pid_file": "/data/nginx.pid",
+                    },
+                    "process_template": {"id": None},
+                    "service_instance": {"name": "service"},
+                    "set": {"bk_set_name": "set1", "bk_set_env": BkSetEnv.FORMAL},
+                    "module": {"bk_module_name": "module1"},
+                    "host": {"bk_host_innerip": "127.0.0.1", "bk_cloud_id": 0},
+                },
+            },
+        )
+        self.cc_context = etree.fromstring(self.CC_XML_DOC)
+
+    def generate(self):
+        data = MagicMock()
+        data.get_one_of_inputs.side_effect = {
+            "job_tasks": [JobTask.objects.get(id=self.job_task.id)],
+            "bk_username": "admin",
+            "bk_biz_id": self.BK_BIZ_ID,
+        }.get
+        with patch.object(ConfigVersionHandler, "get_cc_context", return_value=self.cc_context), patch.object(
+            CMDBHandler, "biz_global_variables", return_value={}
+        ):
+            self.assertTrue(BulkGenerateConfigService()._execute(data, MagicMock())["result"])
+        return list(ConfigInstance.objects.filter(bk_process_id=1).order_by("id"))
+
+    def test_skip_unchanged(self):
+        first_config_instance = self.generate()[-1]
+        self.assertEqual(first_config_instance.content, b"host_name=host1")
+
+        # 输入未变更，跳过渲染，保留原配置实例为最新
+        self.cc_context.find("Set/Module/Host[2]").set("bk_host_name", "host2-renamed")
+        config_instances = self.generate()
+        self.assertEqual([config_instance.id for config_instance in config_instances], [first_config_instance.id])
+        self.assertTrue(config_instances[0].is_latest)
+
+        # 所在主机属性变更，重新渲染
+        self.cc_context.find("Set/Module/Host[1]").set("bk_host_name", "host1-renamed")
+        config_instances = self.generate()
+        self.assertEqual(len(config_instances), 2)
+        self.assertEqual(
+            [(config_instance.is_latest, config_instance.content) for config_instance in config_instances],
+            [(False, b"host_name=host1"), (True, b"host_name=host1-renamed")],
+        )
+
+        # 模板变更，重新渲染
+        ConfigTemplateVersion.objects.filter(config_version_id=self.config_version.config_version_id).update(
+            content='name=${this.cc_host.get("bk_host_name")}'
+        )
+        config_instances = self.generate()
+        self.assertEqual(len(config_instances), 3)
+        self.assertEqual(config_instances[-1].content, b"name=host1-renamed")
+        self.assertListEqual([config_instance.is_latest for config_instance in config_instances], [False, False, True])
+
+
+class TestAdaptiveInterval(TestCase):
+    MIN_INTERVAL, MAX_INTERVAL = gse.GSE_ADAPTIVE_POLLING_INTERVAL_RANGE
+
+    def make_interval(self, **kwargs) -> int:
+        return AdaptiveIntervalGenerator(self.MIN_INTERVAL, self.MAX_INTERVAL, **kwargs).interval()
+
+    def test_clamp(self):
+        # 无历史耗时，首次轮询取最小间隔
+        self.assertEqual(self.make_interval(polling_time=0), self.MIN_INTERVAL)
+        # 预期完成时间较远或退避过长时，不超过最大间隔
+        self.assertEqual(self.make_interval(polling_time=0, expected_time=100), self.MAX_INTERVAL)
+        self.assertEqual(self.make_interval(polling_time=100), self.MAX_INTERVAL)
+
+    def test_throttled(self):
+        self.assertEqual(self.make_interval(polling_time=0, expected_time=3, is_throttled=True), self.MAX_INTERVAL)
+
+    def test_backoff(self):
+        # 超出预期完成时间后，间隔按超出时长的比例增长
+        intervals = [self.make_interval(polling_time=polling_time, expected_time=4) for polling_time in [4, 8, 12]]
+        self.assertEqual(intervals, [self.MIN_INTERVAL, 2, 4])
+
+    def test_expected_time_convergence(self):
+        scope = "TestAdaptiveInterval:1"
+        self.addCleanup(cache.delete, PollingStatistics.CACHE_KEY_TMPL.format(scope=scope))
+        PollingStatistics.record(scope, 2)
+        for __ in range(10):
+            PollingStatistics.record(scope, 6)
+        # 耗时稳定后，预期完成时间收敛到实际耗时
+        expected_time = PollingStatistics.get_expected_time(scope)
+        self.assertAlmostEqual(expected_time, 6, delta=0.2)
+
+        # 预期完成前直接等待到预期完成时间，一次调度即可查询到结果
+        service = gse.BulkGseOperateProcessService()
+        data = DataObject(inputs={}, outputs={"expected_polling_time": expected_time})
+        self.assertEqual(service.adapt_interval(data, polling_time=0), math.ceil(expected_time))
+        self.assertEqual(service.interval.next(), math.ceil(expected_time))
+        self.assertEqual(service.adapt_interval(data, polling_time=0, is_throttled=True), self.MAX_INTERVAL)
@@ -26,3 +26,10 @@ class ProcessInstAdmin(admin.ModelAdmin):
     list_display = [field.name for field in models.ProcessInst._meta.get_fields()]
     search_fields = ["bk_process_id", "bk_host_innerip"]
     list_filter = ["bk_biz_id", "process_status", "is_auto"]
+
+
+@admin.register(models.ProcessRelatedInfo)
+class ProcessRelatedInfoAdmin(admin.ModelAdmin):
+    list_display = ["bk_process_id", "bk_biz_id", "fingerprint"]
+    search_fields = ["bk_process_id"]
+    list_filter = ["bk_biz_id"]
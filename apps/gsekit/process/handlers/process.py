@@ -9,18 +9,18 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 import copy
+import hashlib
 import json
-import operator
 import time
 from collections import defaultdict
-from functools import reduce
 from itertools import groupby
-from typing import List, Dict, Union
+from typing import Dict, Iterable, Iterator, List, Set
 
 from django.db import transaction
 from django.db.models import Q, QuerySet
 
 from apps.api import CCApi, GseApi
+from apps.exceptions import AppBaseException
 from apps.gsekit import constants
 from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
 from apps.gsekit.configfile.models import ConfigTemplateBindingRelationship, ConfigTemplate
@@ -28,18 +28,187 @@ from apps.gsekit.pipeline_plugins.components.collections.gse import NAMESPACE, G
 from apps.gsekit.process import exceptions
 from apps.gsekit.process.exceptions import (
     ProcessDoseNotExistException,
-    DuplicateProcessInstException,
     ProcessNotMatchException,
 )
-from apps.gsekit.process.models import Process, ProcessInst
+from apps.gsekit.process.handlers.process_inst import ProcessInstReconciler
+from apps.gsekit.process.models import Process, ProcessInst, ProcessRelatedInfo
 from apps.gsekit.utils.expression_utils import match
 from apps.gsekit.utils.expression_utils.parse import parse_list2expr, BuildInChar
 from apps.gsekit.utils.expression_utils.serializers import gen_expression
 from apps.utils import APIModel
-from apps.utils.batch_request import batch_request, request_multi_thread
+from apps.utils.basic import list_slice
+from apps.utils.batch_request import batch_request, batch_request_iterator
+from apps.utils.local import get_request
 from apps.utils.mako_utils.render import mako_render
+from apps.utils.poller import AsyncPoller
 from common.log import logger
 
+# 进程状态查询的轮询超时时间（秒）
+PROC_STATUS_POLLING_TIMEOUT = 60
+# 进程状态同步的批量更新大小
+PROC_STATUS_UPDATE_BATCH_SIZE = 1000
+# 从本地副本分批读取进程关联信息的数量，与 CMDB 分页大小一致
+PROCESS_RELATED_INFO_CHUNK_SIZE = 500
+
+
+class ProcInstStatusChecker(object):
+    """
+    进程实例状态查询：下发 GSE 进程状态查询任务，并轮询汇总查询结果
+    """
+
+    def __init__(self, proc_inst_infos: List[Dict], _request=None):
+        self.proc_inst_infos = proc_inst_infos
+        self.base_params = {"_request": _request} if _request else {}
+        self.gse_task_id = None
+        self.begin_time = time.time()
+        self.poll_time = 0
+        self.meta_key_uniq_key_map: Dict[str, str] = {}
+        self.uniq_keys_recorded = set()
+        self.proc_inst_status_infos: List[Dict] = []
+
+    def build_proc_operate_req(self) -> List[Dict]:
+        proc_operate_req = []
+        for proc_inst_info in self.proc_inst_infos:
+            host_info = proc_inst_info["host_info"]
+            process_info = proc_inst_info["process_info"]
+            set_info = proc_inst_info["set_info"]
+            module_info = proc_inst_info["module_info"]
+            inst_id = proc_inst_info["inst_id"]
+            local_inst_id = proc_inst_info["local_inst_id"]
+            context = {
+                "inst_id": inst_id,
+                "inst_id_0": inst_id - 1,
+                "local_inst_id": local_inst_id,
+                "local_inst_id0": local_inst_id - 1,
+                "bk_set_name": set_info["bk_set_name"],
+                "bk_module_name": module_info["bk_module_name"],
+                "bk_process_name": process_info["bk_process_name"],
+                # 兼容老版本字段
+                "InstID": inst_id,
+                "InstID0": inst_id - 1,
+                "LocalInstID": local_inst_id,
+                "LocalInstID0": local_inst_id - 1,
+                "SetName": set_info["bk_set_name"],
+                "ModuleName": module_info["bk_module_name"],
+                "FuncID": process_info["bk_process_name"],
+            }
+            namespace = NAMESPACE.format(bk_biz_id=process_info["bk_biz_id"])
+            uniq_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
+                bk_host_innerip=host_info["bk_host_innerip"],
+                bk_cloud_id=host_info["bk_cloud_id"],
+                bk_process_name=process_info["bk_process_name"],
+                local_inst_id=local_inst_id,
+            )
+            meta_key = (
+                f"{host_info['bk_cloud_id']}:{host_info['bk_host_innerip']}:"
+                f"{namespace}:{process_info['bk_process_name']}_{local_inst_id}"
+            )
+
+            self.meta_key_uniq_key_map[meta_key] = uniq_key
+            proc_operate_req.append(
+                {
+                    "meta": {
+                        "namespace": namespace,
+                        "name": f"{process_info['bk_process_name']}_{local_inst_id}",
+                        "labels": {
+                            "bk_process_name": process_info["bk_process_name"],
+                            "bk_process_id": process_info["bk_process_id"],
+                        },
+                    },
+                    "op_type": GseOpType.CHECK,
+                    "hosts": [{"ip": host_info["bk_host_innerip"], "bk_cloud_id": host_info["bk_cloud_id"]}],
+                    "spec": {
+                        "identity": {
+                            "index_key": "",
+                            "proc_name": process_info["bk_func_name"],
+                            "setup_path": mako_render(process_info["work_path"] or "", context),
+                            "pid_path": mako_render(process_info["pid_file"] or "", context),
+                            "user": process_info["user"],
+                        },
+                        "control": {
+                            "start_cmd": mako_render(process_info["start_cmd"] or "", context),
+                            "stop_cmd": mako_render(process_info["stop_cmd"] or "", context),
+                            "restart_cmd": mako_render(process_info["restart_cmd"] or "", context),
+                            "reload_cmd": mako_render(process_info["reload_cmd"] or "", context),
+                            "kill_cmd": mako_render(process_info["face_stop_cmd"] or "", context),
+                        },
+                        "alive_monitor_policy": {
+                            "auto_type": GseAutoType.RESIDENT,
+                            # 缺省取gse接口设定的默认值
+                            "start_check_secs": process_info.get("bk_start_check_secs", 5),
+                            "op_timeout": process_info.get("timeout"),
+                        },
+                    },
+                }
+            )
+        return proc_operate_req
+
+    def start(self):
+        self.begin_time = time.time()
+        self.gse_task_id = GseApi.operate_proc_multi(
+            {"proc_operate_req": self.build_proc_operate_req(), **self.base_params}
+        )["task_id"]
+
+    def poll(self) -> bool:
+        """查询一次 GSE 任务结果，返回是否全部结束"""
+        self.poll_time = time.time() - self.begin_time
+        try:
+            gse_api_result = GseApi.get_proc_operate_result({"task_id": self.gse_task_id, **self.base_params})
+        except Exception as error:
+            logger.error(
+                "[sync_biz_process_status | get_proc_inst_status_infos] "
+                "gse_task_id: {gse_task_id}, error: {error}".format(gse_task_id=self.gse_task_id, error=str(error))
+            )
+            return False
+
+        for meta_key, task_result in gse_api_result.items():
+            uniq_key = self.meta_key_uniq_key_map[meta_key]
+            if uniq_key in self.uniq_keys_recorded:
+                continue
+            if task_result.get("error_code") == GseDataErrorCode.SUCCESS:
+                gse_ip_proc_info = json.loads(task_result["content"])
+                self.proc_inst_status_infos.append(
+                    {
+                        "is_auto": gse_ip_proc_info["process"][0]["instance"][0].get("isAuto", False),
+                        "status": (
+                            Process.ProcessStatus.RUNNING
+                            if gse_ip_proc_info["process"][0]["instance"][0].get("pid", -1) > 0
+                            else Process.ProcessStatus.TERMINATED
+                        ),
+                        "inst_uniq_key": uniq_key,
+                    }
+                )
+                self.uniq_keys_recorded.add(uniq_key)
+            elif task_result.get("error_code") != GseDataErrorCode.RUNNING:
+                self.uniq_keys_recorded.add(uniq_key)
+
+        return len(self.uniq_keys_recorded) == len(gse_api_result.keys())
+
+    def report(self):
+        if len(self.proc_inst_status_infos) != len(self.proc_inst_infos):
+            # TODO: 是否拉起异步任务重试
+            total_uniq_keys = set(self.meta_key_uniq_key_map.values())
+            success_uniq_keys = set([info["inst_uniq_key"] for info in self.proc_inst_status_infos])
+            logger.error(
+                "[sync_biz_process_status | get_proc_inst_status_infos] gse_task_id: {gse_task_id}, "
+                "check_number: {check_number}, failed_uniq_keys: {uniq_keys_failed}, "
+                "timeout: {uniq_keys_timeout}".format(
+                    gse_task_id=self.gse_task_id,
+                    check_number=len(total_uniq_keys),
+                    uniq_keys_failed=self.uniq_keys_recorded - success_uniq_keys,
+                    uniq_keys_timeout=total_uniq_keys - self.uniq_keys_recorded,
+                )
+            )
+        else:
+            logger.info(
+                "[sync_biz_process_status | get_proc_inst_status_infos] gse_task_id: {gse_task_id}, "
+                "poll_time: {poll_time}s, check_number: {check_number}".format(
+                    gse_task_id=self.gse_task_id,
+                    poll_time=self.poll_time,
+                    check_number=len(self.proc_inst_status_infos),
+                )
+            )
+
 
 class ProcessHandler(APIModel):
     def __init__(self, bk_biz_id: int, bk_process_id: int = None):
@@ -433,21 +602,81 @@ class ProcessHandler(APIModel):
         cmdb_handler = CMDBHandler(bk_biz_id=self.bk_biz_id)
         cmdb_handler.get_or_cache_bk_cloud_area(use_cache=False)
 
-        exist_process_id_list = set(
-            Process.objects.filter(bk_biz_id=self.bk_biz_id).values_list("bk_process_id", flat=True)
+        process_list = batch_request(CCApi.list_process_related_info, {"bk_biz_id": self.bk_biz_id})
+        self.sync_process(process_list)
+        self.create_process_inst(process_list)
+
+    def sync_biz_process_by_ids(self, bk_process_ids: Iterable[int]):
+        """
+        根据进程变更事件增量同步
+        进程实例编号在模块内按进程名分组计算，因此以变更进程变更前后所在的模块为范围进行同步
+        """
+        bk_process_ids = list(set(bk_process_ids))
+        bk_module_ids = set(
+            Process.objects.filter(bk_biz_id=self.bk_biz_id, bk_process_id__in=bk_process_ids).values_list(
+                "bk_module_id", flat=True
+            )
         )
+        for bk_process_ids_slice in list_slice(bk_process_ids, constants.ORM_BATCH_SIZE):
+            changed_process_list = batch_request(
+                CCApi.list_process_related_info,
+                {
+                    "bk_biz_id": self.bk_biz_id,
+                    "process_property_filter": {
+                        "condition": "AND",
+                        "rules": [{"field": "bk_process_id", "operator": "in", "value": bk_process_ids_slice}],
+                    },
+                },
+            )
+            bk_module_ids.update(process["module"]["bk_module_id"] for process in changed_process_list)
+
+        if not bk_module_ids:
+            return
+        self.sync_biz_process_by_module_ids(bk_module_ids)
+
+    def sync_biz_process_by_module_ids(self, bk_module_ids: Iterable[int]):
+        """同步指定模块下的进程及进程实例"""
+        bk_module_ids = set(bk_module_ids)
+        process_list = []
+        for bk_module_ids_slice in list_slice(list(bk_module_ids), constants.ORM_BATCH_SIZE):
+            process_list.extend(
+                batch_request(
+                    CCApi.list_process_related_info,
+                    {"bk_biz_id": self.bk_biz_id, "module": {"bk_module_ids": bk_module_ids_slice}},
+                )
+            )
+        self.sync_process(process_list, bk_module_ids=bk_module_ids)
+        self.create_process_inst(process_list, bk_module_ids=bk_module_ids)
+
+    def sync_process(self, process_list: List[Dict], bk_module_ids: Set[int] = None):
+        """
+        将 CMDB 进程写入本地
+        :param process_list: CMDB 进程列表
+        :param bk_module_ids: 同步范围，为空时同步整个业务，否则 process_list 需为这些模块下的全部进程
+        """
+        local_processes = Process.objects.filter(bk_biz_id=self.bk_biz_id)
+        if bk_module_ids is not None:
+            local_processes = local_processes.filter(bk_module_id__in=bk_module_ids)
+        exist_process_id_list = set(local_processes.values_list("bk_process_id", flat=True))
+        cmdb_process_id_list = {process["process"]["bk_process_id"] for process in process_list}
+        to_be_deleted_process = exist_process_id_list - cmdb_process_id_list
+        if bk_module_ids is not None:
+            # 从范围外移入的进程已存在于本地
+            exist_process_id_list.update(
+                Process.objects.filter(bk_process_id__in=cmdb_process_id_list - exist_process_id_list).values_list(
+                    "bk_process_id", flat=True
+                )
+            )
 
         to_be_created_process = []
-        to_be_deleted_process = []
         to_be_updated_process = []
-        cmdb_process_id_list = []
-        process_list = batch_request(CCApi.list_process_related_info, {"bk_biz_id": self.bk_biz_id})
 
-        module_id_service_template_id_map = self.get_module_id_service_template_id_map(process_list)
+        module_id_service_template_id_map = (
+            self.get_module_id_service_template_id_map(process_list) if process_list else {}
+        )
 
         for process in process_list:
             bk_process_id = process["process"]["bk_process_id"]
-            cmdb_process_id_list.append(bk_process_id)
 
             process_info = dict(
                 bk_biz_id=self.bk_biz_id,
@@ -477,287 +706,169 @@ class ProcessHandler(APIModel):
             else:
                 to_be_updated_process.append(Process(**process_info))
 
-        for process_id in exist_process_id_list:
-            # 删除无需保存的进程
-            if process_id not in cmdb_process_id_list:
-                to_be_deleted_process.append(process_id)
-
         Process.objects.bulk_create(to_be_created_process, batch_size=constants.ORM_BATCH_SIZE)
         Process.objects.bulk_update(
             to_be_updated_process,
             fields=["bk_set_id", "bk_set_env", "bk_module_id", "bk_process_name", "expression"],
             batch_size=constants.ORM_BATCH_SIZE,
         )
-        Process.objects.filter(bk_process_id__in=to_be_deleted_process).delete()
+        to_be_deleted_queryset = Process.objects.filter(bk_process_id__in=to_be_deleted_process)
+        if bk_module_ids is not None:
+            # 并行同步时，进程可能已被其它范围的同步移至范围外，不能误删
+            to_be_deleted_queryset = to_be_deleted_queryset.filter(bk_module_id__in=bk_module_ids)
+        deleted_process_ids = list(to_be_deleted_queryset.values_list("bk_process_id", flat=True))
+        to_be_deleted_queryset.delete()
+        self.sync_process_related_info(process_list, deleted_process_ids, is_full_sync=bk_module_ids is None)
 
         logger.info(
             "[sync_biz_process] bk_biz_id: {bk_biz_id}, "
+            "bk_module_ids: {bk_module_ids}, "
             "created_count: {created_count}, "
             "deleted_count:{deleted_count}".format(
                 bk_biz_id=self.bk_biz_id,
+                bk_module_ids=bk_module_ids,
                 created_count=len(to_be_created_process),
                 deleted_count=len(to_be_deleted_process),
             )
         )
 
-        self.create_process_inst(process_list)
-
-    def generate_process_inst_migrate_data(self, process_list: List) -> Dict:
-        """计算准备好变更实例所需的数据"""
+    def sync_process_related_info(
+        self, process_list: List[Dict], deleted_process_ids: List[int], is_full_sync: bool = False
+    ):
+        """
+        将 CMDB 进程关联信息写入本地副本，仅写入指纹变化的进程
+        :param process_list: CMDB 进程列表
+        :param deleted_process_ids: 本次同步删除的进程ID
+        :param is_full_sync: 是否为业务全量同步，全量同步时一并清理副本中多余的进程
+        """
+        process_related_info_map = {}
+        for process_related_info in process_list:
+            process_related_info_map[process_related_info["process"]["bk_process_id"]] = (
+                process_related_info,
+                hashlib.md5(json.dumps(process_related_info, sort_keys=True).encode()).hexdigest(),
+            )
 
-        local_inst_id_uniq_key_map = {}
-        change_uniq_info_process_ids = set()
-        # 本地缓存进程ID - 需保持一组进程实例唯一性信息 映射
-        # 背景：模板进程修改需保存唯一性的信息（例如进程别名），存量的进程实例没有删除
-        local_process_id_uniq_info_map: Dict[int, Dict[str, Union[str, int]]] = {}
-        host_num_key_map: Dict[Union[int, ProcessInst]] = defaultdict(
-            lambda: {"max_proc_num": ProcessInst.DEFAULT_PROC_NUM, "process": None}
-        )
-        # 本地数据中，模块下进程名对应最大的启动数量，用于判断模块下进程整体的 inst_id 和 local_inst_id 是否需要重建
-        local_module_proc_name_map: Dict[Dict[Dict[int]]] = defaultdict(
-            lambda: defaultdict(lambda: {"max_proc_num": ProcessInst.DEFAULT_PROC_NUM, "max_host_num": 0})
-        )
+        if is_full_sync:
+            exist_fingerprint_map = dict(
+                ProcessRelatedInfo.objects.filter(bk_biz_id=self.bk_biz_id).values_list("bk_process_id", "fingerprint")
+            )
+            deleted_process_ids = set(deleted_process_ids) | (
+                set(exist_fingerprint_map.keys()) - set(process_related_info_map.keys())
+            )
+        else:
+            exist_fingerprint_map = {}
+            for bk_process_ids in list_slice(list(process_related_info_map.keys()), constants.ORM_BATCH_SIZE):
+                exist_fingerprint_map.update(
+                    ProcessRelatedInfo.objects.filter(bk_process_id__in=bk_process_ids).values_list(
+                        "bk_process_id", "fingerprint"
+                    )
+                )
 
-        local_bk_process_ids = set()
-        # 把进程按不同规则做映射，方便后续进行判断处理
-        for local_process in ProcessInst.objects.filter(bk_biz_id=self.bk_biz_id):
+        to_be_created_infos = []
+        to_be_updated_infos = []
+        for bk_process_id, (related_info, fingerprint) in process_related_info_map.items():
+            if bk_process_id not in exist_fingerprint_map:
+                to_be_created_infos.append(
+                    ProcessRelatedInfo(
+                        bk_process_id=bk_process_id,
+                        bk_biz_id=self.bk_biz_id,
+                        related_info=related_info,
+                        fingerprint=fingerprint,
+                    )
+                )
+            elif exist_fingerprint_map[bk_process_id] != fingerprint:
+                to_be_updated_infos.append(
+                    ProcessRelatedInfo(
+                        bk_process_id=bk_process_id,
+                        bk_biz_id=self.bk_biz_id,
+                        related_info=related_info,
+                        fingerprint=fingerprint,
+                    )
+                )
 
-            bk_module_id = local_process.bk_module_id
-            bk_process_id = local_process.bk_process_id
-            bk_process_name = local_process.bk_process_name
+        with transaction.atomic():
+            for bk_process_ids in list_slice(list(deleted_process_ids), constants.ORM_BATCH_SIZE):
+                ProcessRelatedInfo.objects.filter(bk_process_id__in=bk_process_ids).delete()
+            ProcessRelatedInfo.objects.bulk_update(
+                to_be_updated_infos,
+                fields=["bk_biz_id", "related_info", "fingerprint"],
+                batch_size=constants.ORM_BATCH_SIZE,
+            )
+            ProcessRelatedInfo.objects.bulk_create(to_be_created_infos, batch_size=constants.ORM_BATCH_SIZE)
 
-            # 构造缓存进程实例唯一性信息
-            local_process_uniq_info = {"bk_process_name": bk_process_name, "bk_module_id": bk_module_id}
+        logger.info(
+            f"[sync_process_related_info] bk_biz_id: {self.bk_biz_id}, created_count: {len(to_be_created_infos)}, "
+            f"updated_count: {len(to_be_updated_infos)}, deleted_count: {len(deleted_process_ids)}"
+        )
 
-            if bk_process_id not in local_process_id_uniq_info_map:
-                local_process_id_uniq_info_map[bk_process_id] = local_process_uniq_info
-            else:
-                # 同ID进程唯一性信息不一致，说明缓存有脏数据，记录进程ID后续重建全部实例
-                if local_process_id_uniq_info_map[bk_process_id] != local_process_uniq_info:
-                    change_uniq_info_process_ids.add(bk_process_id)
-                    host_num_key_map.pop(local_process.bk_host_num_key, None)
-                    # 进程实例需要重建，无需对脏数据执行下列计算，create_process_inst 在无记录下会对实例进行重建
-                    continue
+    def is_process_related_info_replicated(self) -> bool:
+        """本地副本是否已覆盖业务下的全部进程，新接入或同步中的业务仍需从 CMDB 获取"""
+        process_count = Process.objects.filter(bk_biz_id=self.bk_biz_id).count()
+        return bool(process_count) and (
+            process_count == ProcessRelatedInfo.objects.filter(bk_biz_id=self.bk_biz_id).count()
+        )
 
-            local_inst_id_uniq_key_map[local_process.local_inst_id_uniq_key] = local_process
-            host_num_key_map[local_process.bk_host_num_key] = {
-                "max_proc_num": max(
-                    host_num_key_map[local_process.bk_host_num_key]["max_proc_num"], local_process.proc_num
-                ),
-                "process": local_process,
-            }
-            local_module_proc_name_map[bk_module_id][bk_process_name] = {
-                "max_proc_num": max(
-                    local_module_proc_name_map[bk_module_id][bk_process_name]["max_proc_num"], local_process.proc_num
-                ),
-                "max_host_num": max(
-                    local_module_proc_name_map[bk_module_id][bk_process_name]["max_host_num"], local_process.bk_host_num
-                ),
+    def iter_process_related_info(self, scope: Dict = None) -> Iterator[List[Dict]]:
+        """
+        分批获取进程关联信息，数据结构与 CCApi.list_process_related_info 一致
+        优先读取本地副本，副本未就绪时从 CMDB 分页拉取
+        :param scope: 进程范围，支持 bk_set_ids/bk_module_ids/bk_service_ids/bk_process_names/bk_process_ids，
+        与 CMDB 接口一致，空列表表示不过滤
+        """
+        scope = scope or {}
+        if not self.is_process_related_info_replicated():
+            params = {
+                "bk_biz_id": self.bk_biz_id,
+                "set": {"bk_set_ids": scope.get("bk_set_ids") or []},
+                "module": {"bk_module_ids": scope.get("bk_module_ids") or []},
+                "service_instance": {"ids": scope.get("bk_service_ids") or []},
             }
-            local_bk_process_ids.add(bk_process_id)
+            rules = [
+                {"field": field, "operator": "in", "value": scope[scope_key]}
+                for scope_key, field in [("bk_process_names", "bk_process_name"), ("bk_process_ids", "bk_process_id")]
+                if scope.get(scope_key)
+            ]
+            if rules:
+                params["process_property_filter"] = {"condition": "AND", "rules": rules}
+            yield from batch_request_iterator(CCApi.list_process_related_info, params)
+            return
 
-        # 根据进程名分组获取进程名在模块下对应的进程数量的最大值
-        cmdb_module_proc_name_map: Dict[Dict[Dict[Union[int, List]]]] = defaultdict(
-            lambda: defaultdict(lambda: {"max_proc_num": ProcessInst.DEFAULT_PROC_NUM, "processes": []})
+        filter_condition = {}
+        for scope_key, filter_key in [
+            ("bk_set_ids", "bk_set_id__in"),
+            ("bk_module_ids", "bk_module_id__in"),
+            ("bk_service_ids", "service_instance_id__in"),
+            ("bk_process_names", "bk_process_name__in"),
+            ("bk_process_ids", "bk_process_id__in"),
+        ]:
+            if scope.get(scope_key):
+                filter_condition[filter_key] = scope[scope_key]
+        bk_process_ids = list(
+            Process.objects.filter(bk_biz_id=self.bk_biz_id, **filter_condition)
+            .order_by("bk_process_id")
+            .values_list("bk_process_id", flat=True)
         )
-
-        # CMDB实时业务进程ID列表
-        cmdb_bk_process_ids = set()
-        # 找到每个进程中最大的进程启动数量
-        for cmdb_process in process_list:
-            bk_module_id = cmdb_process["module"]["bk_module_id"]
-            bk_process_id = cmdb_process["process"]["bk_process_id"]
-            bk_process_name = cmdb_process["process"]["bk_process_name"]
-            # 若CMDB进程未配置启动数量，则默认取 ProcessInst.DEFAULT_PROC_NUM
-            cmdb_process["process"]["proc_num"] = cmdb_process["process"]["proc_num"] or ProcessInst.DEFAULT_PROC_NUM
-            max_proc_num = max(
-                cmdb_module_proc_name_map[bk_module_id][bk_process_name]["max_proc_num"],
-                cmdb_process["process"]["proc_num"],
+        for bk_process_ids_slice in list_slice(bk_process_ids, PROCESS_RELATED_INFO_CHUNK_SIZE):
+            yield list(
+                ProcessRelatedInfo.objects.filter(bk_process_id__in=bk_process_ids_slice)
+                .order_by("bk_process_id")
+                .values_list("related_info", flat=True)
             )
-            cmdb_module_proc_name_map[bk_module_id][bk_process_name]["max_proc_num"] = max_proc_num
-            cmdb_module_proc_name_map[bk_module_id][bk_process_name]["processes"].append(cmdb_process)
-            cmdb_bk_process_ids.add(cmdb_process["process"]["bk_process_id"])
-
-            # 校验进程模板唯一性信息是否修改，如果修改需要重建该bk_process_id下的进程实例
-            local_process_uniq_info = local_process_id_uniq_info_map.get(bk_process_id)
-
-            if local_process_uniq_info != {"bk_process_name": bk_process_name, "bk_module_id": bk_module_id}:
-                change_uniq_info_process_ids.add(bk_process_id)
-
-        to_be_deleted_inst_condition = []
-        # 计算无效进程ID并删除关联的进程实例
-        # 无效进程ID：1. 存在于本地缓存但不存在于CMDB的进程ID 2. 唯一性字段变更（bk_process_name）
-        invalid_bk_process_ids = (local_bk_process_ids - cmdb_bk_process_ids) | change_uniq_info_process_ids
-        if invalid_bk_process_ids:
-            to_be_deleted_inst_condition.append(Q(bk_process_id__in=invalid_bk_process_ids))
 
-        return {
-            "local_module_proc_name_map": local_module_proc_name_map,
-            "local_inst_id_uniq_key_map": local_inst_id_uniq_key_map,
-            "host_num_key_map": host_num_key_map,
-            "cmdb_module_proc_name_map": cmdb_module_proc_name_map,
-            "to_be_deleted_inst_condition": to_be_deleted_inst_condition,
-        }
-
-    def create_process_inst(self, process_list: List):
-        """根据进程数量生成调整进程实例"""
-        migrate_data = self.generate_process_inst_migrate_data(process_list)
-        local_module_proc_name_map = migrate_data["local_module_proc_name_map"]
-        local_inst_id_uniq_key_map = migrate_data["local_inst_id_uniq_key_map"]
-        host_num_key_map = migrate_data["host_num_key_map"]
-        cmdb_module_proc_name_map = migrate_data["cmdb_module_proc_name_map"]
-        to_be_deleted_inst_condition = migrate_data["to_be_deleted_inst_condition"]
-
-        # 根据进程启动数量创建进程实例，规则如下：
-        # inst_id: 进程实例的作用域对应的实例 ID，从 1 开始顺序编号，不同服务器之间唯一
-        # bk_host_num: 主机编号，从 1 开始顺序编号
-        # max_proc_num: 当前拓扑结构下单机进程启动数最大值
-        # local_inst_id: 同一服务器内从 1 开始顺序编号，同一服务器内唯一，不同服务器间不唯一
-        # inst_id = (bk_host_num - 1) * max_proc_num + local_inst_id
-        to_be_created_inst = []
-        for bk_module_id, cmdb_process_name_map in cmdb_module_proc_name_map.items():
-            for process_name, processes in cmdb_process_name_map.items():
-                max_proc_num = processes["max_proc_num"]
-
-                if max_proc_num != local_module_proc_name_map[bk_module_id][process_name]["max_proc_num"]:
-                    # 若最大进程数量有调整，说明此进程的所有inst_id等需要重建
-                    to_be_deleted_inst_condition.append(
-                        Q(bk_module_id=bk_module_id, bk_biz_id=self.bk_biz_id, bk_process_name=process_name)
-                    )
-                    index = 0
-                    for cmdb_process in processes["processes"]:
-                        cmdb_proc_num = cmdb_process["process"]["proc_num"]
-                        for local_inst_id in range(1, cmdb_proc_num + 1):
-                            bk_host_num = index + 1
-                            inst_id = (bk_host_num - 1) * max_proc_num + local_inst_id
-                            local_inst_id_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
-                                bk_host_innerip=cmdb_process["host"]["bk_host_innerip"],
-                                bk_cloud_id=cmdb_process["host"]["bk_cloud_id"],
-                                bk_process_name=process_name,
-                                local_inst_id=local_inst_id,
-                            )
-                            to_be_created_inst.append(
-                                ProcessInst(
-                                    bk_biz_id=self.bk_biz_id,
-                                    bk_host_num=bk_host_num,
-                                    bk_module_id=cmdb_process["module"]["bk_module_id"],
-                                    bk_host_innerip=cmdb_process["host"]["bk_host_innerip"],
-                                    bk_cloud_id=cmdb_process["host"]["bk_cloud_id"],
-                                    bk_process_id=cmdb_process["process"]["bk_process_id"],
-                                    bk_process_name=cmdb_process["process"]["bk_process_name"],
-                                    inst_id=inst_id,
-                                    local_inst_id=local_inst_id,
-                                    local_inst_id_uniq_key=local_inst_id_key,
-                                    proc_num=cmdb_proc_num,
-                                )
-                            )
-                        index += 1
-                else:
-                    # 若最大进程数量没有调整，继续判断进程中的进程数量是否有变更
-                    max_host_num = local_module_proc_name_map[bk_module_id][process_name]["max_host_num"]
-                    for cmdb_process in processes["processes"]:
-                        bk_host_innerip = cmdb_process["host"]["bk_host_innerip"]
-                        bk_cloud_id = cmdb_process["host"]["bk_cloud_id"]
-                        host_num_key = ProcessInst.BK_HOST_NUM_KEY_TMPL.format(
-                            bk_host_innerip=bk_host_innerip, bk_cloud_id=bk_cloud_id, bk_process_name=process_name
-                        )
-
-                        cmdb_proc_num = cmdb_process["process"]["proc_num"]
-
-                        if host_num_key in host_num_key_map:
-                            # host num 已存在，若proc_num有调整，则进行调整
-                            local_process = host_num_key_map[host_num_key]["process"]
-                            local_max_proc_num = host_num_key_map[host_num_key]["max_proc_num"]
-
-                            # CMDB中增加进程数量
-                            if cmdb_proc_num > local_max_proc_num:
-                                for local_inst_id in range(1, cmdb_proc_num + 1):
-                                    inst_id = (local_process.bk_host_num - 1) * max_proc_num + local_inst_id
-                                    local_inst_id_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
-                                        bk_host_innerip=bk_host_innerip,
-                                        bk_cloud_id=bk_cloud_id,
-                                        bk_process_name=process_name,
-                                        local_inst_id=local_inst_id,
-                                    )
-                                    if local_inst_id_key not in local_inst_id_uniq_key_map:
-                                        to_be_created_inst.append(
-                                            ProcessInst(
-                                                bk_biz_id=self.bk_biz_id,
-                                                bk_host_num=local_process.bk_host_num,
-                                                bk_module_id=bk_module_id,
-                                                bk_host_innerip=bk_host_innerip,
-                                                bk_cloud_id=bk_cloud_id,
-                                                bk_process_id=cmdb_process["process"]["bk_process_id"],
-                                                bk_process_name=process_name,
-                                                inst_id=inst_id,
-                                                local_inst_id_uniq_key=local_inst_id_key,
-                                                local_inst_id=local_inst_id,
-                                                proc_num=cmdb_proc_num,
-                                            )
-                                        )
-
-                            # CMDB中减少进程数量，多余的需要被删除
-                            if cmdb_proc_num < local_max_proc_num:
-                                to_be_deleted_inst_condition.append(
-                                    Q(
-                                        bk_module_id=bk_module_id,
-                                        bk_host_innerip=bk_host_innerip,
-                                        bk_cloud_id=bk_cloud_id,
-                                        bk_process_name=process_name,
-                                        local_inst_id__gt=cmdb_proc_num,
-                                        local_inst_id__lte=local_max_proc_num,
-                                    )
-                                )
-                        else:
-                            # host num 不存在，从 max_host_num 开始新增
-                            for local_inst_id in range(1, cmdb_proc_num + 1):
-                                bk_host_num = max_host_num + 1
-                                inst_id = (bk_host_num - 1) * max_proc_num + local_inst_id
-                                local_inst_id_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
-                                    bk_host_innerip=bk_host_innerip,
-                                    bk_cloud_id=bk_cloud_id,
-                                    bk_process_name=process_name,
-                                    local_inst_id=local_inst_id,
-                                )
-                                to_be_created_inst.append(
-                                    ProcessInst(
-                                        bk_biz_id=self.bk_biz_id,
-                                        bk_host_num=bk_host_num,
-                                        bk_module_id=bk_module_id,
-                                        bk_host_innerip=bk_host_innerip,
-                                        bk_cloud_id=bk_cloud_id,
-                                        bk_process_id=cmdb_process["process"]["bk_process_id"],
-                                        bk_process_name=process_name,
-                                        inst_id=inst_id,
-                                        local_inst_id_uniq_key=local_inst_id_key,
-                                        local_inst_id=local_inst_id,
-                                        proc_num=cmdb_proc_num,
-                                    )
-                                )
-                        max_host_num += 1
-
-        # 检查待创建实例中不符合唯一键的项
-        uniq_key_set = set()
-        duplicate_proc_instances = set()
-        for inst in to_be_created_inst:
-            if inst.local_inst_id_uniq_key in uniq_key_set:
-                duplicate_proc_instances.add(inst.local_inst_id_uniq_key)
-                continue
-            uniq_key_set.add(inst.local_inst_id_uniq_key)
+    def list_process_related_info(self, scope: Dict = None) -> List[Dict]:
+        process_list = []
+        for process_related_info in self.iter_process_related_info(scope):
+            process_list.extend(process_related_info)
+        return process_list
 
-        # 存在重复进程实例
-        if duplicate_proc_instances:
-            raise DuplicateProcessInstException(uniq_key=duplicate_proc_instances)
-
-        with transaction.atomic():
-            if to_be_deleted_inst_condition:
-                ProcessInst.objects.filter(reduce(operator.or_, to_be_deleted_inst_condition)).delete()
-            ProcessInst.objects.bulk_create(to_be_created_inst, batch_size=constants.ORM_BATCH_SIZE)
+    def create_process_inst(self, process_list: List, bk_module_ids: Set[int] = None):
+        """根据进程数量对账调整进程实例，bk_module_ids 不为空时仅调整指定模块下的进程实例"""
+        ProcessInstReconciler(bk_biz_id=self.bk_biz_id, bk_module_ids=bk_module_ids).reconcile(process_list)
 
     def sync_proc_status_to_db(self, proc_status_infos=None):
         """
         同步业务进程状态
-        :return:
+        :return: {"updated_proc_inst_count": 更新的进程实例数, "updated_process_count": 更新的进程数}
         """
         # 不传proc_status_infos默认拉取sync_proc_status接口数据，该接口有5min状态延迟
         if not proc_status_infos:
@@ -777,290 +888,99 @@ class ProcessHandler(APIModel):
                     f"{'-'.join(proc_status_info['meta']['name'].rsplit('_', 1))}"
                 )
 
-        cmdb_proc_id_status_map = {}
-        cmdb_proc_id_is_auto_map = {}
-        all_bk_process_ids = []
-        for cmdb_proc in Process.objects.filter(bk_biz_id=self.bk_biz_id).values(
-            "process_status", "bk_process_id", "is_auto"
-        ):
-            cmdb_proc_id_status_map[cmdb_proc["bk_process_id"]] = cmdb_proc["process_status"]
-            cmdb_proc_id_is_auto_map[cmdb_proc["bk_process_id"]] = cmdb_proc["is_auto"]
-            all_bk_process_ids.append(cmdb_proc["bk_process_id"])
-
-        bk_process_ids_exists_inst = set()
-        inst_uniq_key_proc_id_map = {}
-        inst_uniq_key_is_auto_map = {}
-        inst_uniq_key_group_by_inst_status = defaultdict(list)
-        for proc_inst in ProcessInst.objects.filter(bk_biz_id=self.bk_biz_id).values(
-            "local_inst_id_uniq_key", "process_status", "bk_process_id", "is_auto"
-        ):
-            inst_uniq_key_proc_id_map[proc_inst["local_inst_id_uniq_key"]] = proc_inst["bk_process_id"]
-            inst_uniq_key_is_auto_map[proc_inst["local_inst_id_uniq_key"]] = proc_inst["is_auto"]
-            inst_uniq_key_group_by_inst_status[proc_inst["process_status"]].append(proc_inst["local_inst_id_uniq_key"])
-            bk_process_ids_exists_inst.add(proc_inst["bk_process_id"])
-
-        effective_uniq_keys = []
-        all_terminated_uniq_keys = []
-        proc_status_infos.sort(key=lambda proc_status: proc_status["status"])
-        proc_status_info_group_by_status = groupby(proc_status_infos, lambda proc_status: proc_status["status"])
-        # 只会有两个状态，RUNNING or TERMINATED
-        for status, proc_status_info_list in proc_status_info_group_by_status:
-            inst_uniq_keys_in_db = [proc_status_info["inst_uniq_key"] for proc_status_info in proc_status_info_list]
-            # sync_proc_status非即时接口，需要过滤掉不在DB的数据
-            inst_uniq_keys_in_db = [
-                uniq_key for uniq_key in inst_uniq_keys_in_db if uniq_key in inst_uniq_key_proc_id_map
-            ]
-            effective_uniq_keys.extend(inst_uniq_keys_in_db)
-            # 全部uniq_keys与某状态下原先的进程实例uniq_keys取差集，获得需要更新状态的进程实例
-            to_be_updated_proc_inst_status_uniq_keys = set(inst_uniq_keys_in_db) - set(
-                inst_uniq_key_group_by_inst_status[status]
-            )
-            ProcessInst.objects.filter(local_inst_id_uniq_key__in=to_be_updated_proc_inst_status_uniq_keys).update(
-                process_status=status
-            )
-
-            if status == Process.ProcessStatus.TERMINATED:
-                all_terminated_uniq_keys = inst_uniq_keys_in_db
-
-        # 获得所有状态为TERMINATED的进程后，可以反推汇总状态，同步规则如下：
-        # 1. 进程下任意实例终止，汇总状态为TERMINATED 2. 进程下无实例，汇总状态为TERMINATED
-        # 3. 排除掉1. 2. 两种情况，其他的进程状态都为RUNNING
-        all_terminated_proc_ids = set()
-        to_be_updated_terminated_proc_ids = set()
-        for uniq_key in all_terminated_uniq_keys:
-            bk_process_id = inst_uniq_key_proc_id_map[uniq_key]
-            # 统计所有存在终止进程实例的进程ID
-            all_terminated_proc_ids.add(bk_process_id)
-            # 与已有进程状态对比，统计需要变更汇总状态的进程ID
-            if cmdb_proc_id_status_map[bk_process_id] != Process.ProcessStatus.TERMINATED:
-                to_be_updated_terminated_proc_ids.add(bk_process_id)
-
-        # CMDB进程下无进程实例 or 任一实例为未运行，进程汇总状态为TERMINATED，其余情况都是RUNNING
-        all_without_inst_proc_ids = set(all_bk_process_ids) - bk_process_ids_exists_inst
-        Process.objects.filter(bk_process_id__in=all_without_inst_proc_ids | to_be_updated_terminated_proc_ids).update(
-            process_status=Process.ProcessStatus.TERMINATED
-        )
-
-        # 计算出gse.sync_proc_status查询不到的
-        proc_without_status_ids = set(
-            [
-                bk_process_id
-                for uniq_key, bk_process_id in inst_uniq_key_proc_id_map.items()
-                if uniq_key not in effective_uniq_keys
-            ]
-        )
-        # 计算出进程汇总状态为RUNNING的进程ID
-        all_running_proc_ids = (
-            set(all_bk_process_ids) - all_terminated_proc_ids - all_without_inst_proc_ids - proc_without_status_ids
-        )
-        to_be_updated_running_proc_ids = set()
-        for bk_process_id in all_running_proc_ids:
-            # 计算需要变更为RUNNING的进程ID
-            if cmdb_proc_id_status_map[bk_process_id] != Process.ProcessStatus.RUNNING:
-                to_be_updated_running_proc_ids.add(bk_process_id)
-        Process.objects.filter(bk_process_id__in=to_be_updated_running_proc_ids).update(
-            process_status=Process.ProcessStatus.RUNNING
-        )
+        # sync_proc_status非即时接口，不在DB的数据在聚合时自然被忽略；同一实例存在多条状态时以最后一条为准
+        uniq_key_status_info_map = {
+            proc_status_info["inst_uniq_key"]: proc_status_info for proc_status_info in proc_status_infos
+        }
 
-        effective_uniq_keys = set(effective_uniq_keys)
-        all_noauto_proc_ids = set()
-        to_be_updated_auto_field_uniq_keys = []
-        to_be_updated_noauto_proc_ids = set()
-        # 更新托管状态
-        for proc_status_info in proc_status_infos:
-            uniq_key = proc_status_info["inst_uniq_key"]
-            if uniq_key not in effective_uniq_keys:
+        # 单次遍历进程实例：计算需要更新的实例，同时按进程聚合 [实例数, 查询到状态的实例数, 存在终止实例, 存在未托管实例]
+        proc_id_inst_stat_map = defaultdict(lambda: [0, 0, False, False])
+        to_be_updated_proc_insts = []
+        for inst_pk, uniq_key, bk_process_id, process_status, is_auto in ProcessInst.objects.filter(
+            bk_biz_id=self.bk_biz_id
+        ).values_list("id", "local_inst_id_uniq_key", "bk_process_id", "process_status", "is_auto"):
+            inst_stat = proc_id_inst_stat_map[bk_process_id]
+            inst_stat[0] += 1
+            proc_status_info = uniq_key_status_info_map.get(uniq_key)
+            if proc_status_info is None:
                 continue
+            inst_stat[1] += 1
+            status, is_auto_now = proc_status_info["status"], bool(proc_status_info["is_auto"])
+            if status == Process.ProcessStatus.TERMINATED:
+                inst_stat[2] = True
+            if not is_auto_now:
+                inst_stat[3] = True
+            if status != process_status or is_auto_now != is_auto:
+                to_be_updated_proc_insts.append(ProcessInst(id=inst_pk, process_status=status, is_auto=is_auto_now))
+
+        # 汇总进程状态，规则如下：
+        # 1. 进程下无实例，汇总状态为TERMINATED，未托管
+        # 2. 进程下任意实例终止，汇总状态为TERMINATED；任意实例未托管，汇总为未托管
+        # 3. 进程下全部实例均查询到状态且不满足2.，汇总状态为RUNNING、托管，否则保持原状态
+        to_be_updated_processes = []
+        for bk_process_id, process_status, is_auto in Process.objects.filter(bk_biz_id=self.bk_biz_id).values_list(
+            "bk_process_id", "process_status", "is_auto"
+        ):
+            inst_count, effective_count, has_terminated, has_noauto = proc_id_inst_stat_map.get(
+                bk_process_id, (0, 0, False, False)
+            )
+            is_all_effective = inst_count == effective_count
+            if not inst_count:
+                status, is_auto_now = Process.ProcessStatus.TERMINATED, False
+            else:
+                if has_terminated:
+                    status = Process.ProcessStatus.TERMINATED
+                else:
+                    status = Process.ProcessStatus.RUNNING if is_all_effective else process_status
+                is_auto_now = False if has_noauto else (True if is_all_effective else is_auto)
+            if status != process_status or is_auto_now != is_auto:
+                to_be_updated_processes.append(
+                    Process(bk_process_id=bk_process_id, process_status=status, is_auto=is_auto_now)
+                )
 
-            bk_process_id = inst_uniq_key_proc_id_map[uniq_key]
-
-            if not proc_status_info["is_auto"]:
-                all_noauto_proc_ids.add(bk_process_id)
-
-            if proc_status_info["is_auto"] != inst_uniq_key_is_auto_map[uniq_key]:
-                to_be_updated_auto_field_uniq_keys.append(uniq_key)
-                if not proc_status_info["is_auto"] and cmdb_proc_id_is_auto_map[bk_process_id]:
-                    to_be_updated_noauto_proc_ids.add(bk_process_id)
-
-        # 更新进程实例状态
-        ProcessInst.objects.filter(local_inst_id_uniq_key__in=to_be_updated_auto_field_uniq_keys).update(
-            is_auto=Q(is_auto=False)
-        )
-
-        bk_process_ids_without_inst = set(all_bk_process_ids) - bk_process_ids_exists_inst
-        # 更新进程为未托管状态： 1. 变更为未托管的进程实例 2.不存在实例的进程
-        Process.objects.filter(bk_process_id__in=(to_be_updated_noauto_proc_ids | bk_process_ids_without_inst)).update(
-            is_auto=False
-        )
-
-        # 计算出gse.sync_proc_status查询不到的
-        bk_process_ids_no_found = set(
-            [
-                bk_process_id
-                for uniq_key, bk_process_id in inst_uniq_key_proc_id_map.items()
-                if uniq_key not in effective_uniq_keys
-            ]
-        )
-
-        all_auto_proc_ids = (
-            set(all_bk_process_ids) - bk_process_ids_no_found - bk_process_ids_without_inst - all_noauto_proc_ids
-        )
-        to_be_updated_auto_proc_ids = [
-            proc_id for proc_id in all_auto_proc_ids if not cmdb_proc_id_is_auto_map[proc_id]
-        ]
-        Process.objects.filter(bk_process_id__in=to_be_updated_auto_proc_ids).update(is_auto=True)
-
-    @staticmethod
-    def get_proc_inst_status_infos(proc_inst_infos, _request=None) -> List[Dict]:
-        base_params = {"_request": _request} if _request else {}
-        proc_operate_req_slice = []
-        meta_key_uniq_key_map = {}
-        for proc_inst_info in proc_inst_infos:
-            host_info = proc_inst_info["host_info"]
-            process_info = proc_inst_info["process_info"]
-            set_info = proc_inst_info["set_info"]
-            module_info = proc_inst_info["module_info"]
-            inst_id = proc_inst_info["inst_id"]
-            local_inst_id = proc_inst_info["local_inst_id"]
-            context = {
-                "inst_id": inst_id,
-                "inst_id_0": inst_id - 1,
-                "local_inst_id": local_inst_id,
-                "local_inst_id0": local_inst_id - 1,
-                "bk_set_name": set_info["bk_set_name"],
-                "bk_module_name": module_info["bk_module_name"],
-                "bk_process_name": process_info["bk_process_name"],
-                # 兼容老版本字段
-                "InstID": inst_id,
-                "InstID0": inst_id - 1,
-                "LocalInstID": local_inst_id,
-                "LocalInstID0": local_inst_id - 1,
-                "SetName": set_info["bk_set_name"],
-                "ModuleName": module_info["bk_module_name"],
-                "FuncID": process_info["bk_process_name"],
-            }
-            namespace = NAMESPACE.format(bk_biz_id=process_info["bk_biz_id"])
-            uniq_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
-                bk_host_innerip=host_info["bk_host_innerip"],
-                bk_cloud_id=host_info["bk_cloud_id"],
-                bk_process_name=process_info["bk_process_name"],
-                local_inst_id=local_inst_id,
+        # 按行写入状态及托管状态，批量生成 CASE WHEN 更新语句
+        with transaction.atomic():
+            ProcessInst.objects.bulk_update(
+                to_be_updated_proc_insts, fields=["process_status", "is_auto"], batch_size=PROC_STATUS_UPDATE_BATCH_SIZE
             )
-            meta_key = (
-                f"{host_info['bk_cloud_id']}:{host_info['bk_host_innerip']}:"
-                f"{namespace}:{process_info['bk_process_name']}_{local_inst_id}"
+            Process.objects.bulk_update(
+                to_be_updated_processes, fields=["process_status", "is_auto"], batch_size=PROC_STATUS_UPDATE_BATCH_SIZE
             )
+        return {
+            "updated_proc_inst_count": len(to_be_updated_proc_insts),
+            "updated_process_count": len(to_be_updated_processes),
+        }
 
-            meta_key_uniq_key_map[meta_key] = uniq_key
-            proc_operate_req_slice.append(
-                {
-                    "meta": {
-                        "namespace": namespace,
-                        "name": f"{process_info['bk_process_name']}_{local_inst_id}",
-                        "labels": {
-                            "bk_process_name": process_info["bk_process_name"],
-                            "bk_process_id": process_info["bk_process_id"],
-                        },
-                    },
-                    "op_type": GseOpType.CHECK,
-                    "hosts": [{"ip": host_info["bk_host_innerip"], "bk_cloud_id": host_info["bk_cloud_id"]}],
-                    "spec": {
-                        "identity": {
-                            "index_key": "",
-                            "proc_name": process_info["bk_func_name"],
-                            "setup_path": mako_render(process_info["work_path"] or "", context),
-                            "pid_path": mako_render(process_info["pid_file"] or "", context),
-                            "user": process_info["user"],
-                        },
-                        "control": {
-                            "start_cmd": mako_render(process_info["start_cmd"] or "", context),
-                            "stop_cmd": mako_render(process_info["stop_cmd"] or "", context),
-                            "restart_cmd": mako_render(process_info["restart_cmd"] or "", context),
-                            "reload_cmd": mako_render(process_info["reload_cmd"] or "", context),
-                            "kill_cmd": mako_render(process_info["face_stop_cmd"] or "", context),
-                        },
-                        "alive_monitor_policy": {
-                            "auto_type": GseAutoType.RESIDENT,
-                            # 缺省取gse接口设定的默认值
-                            "start_check_secs": process_info.get("bk_start_check_secs", 5),
-                            "op_timeout": process_info.get("timeout"),
-                        },
-                    },
-                }
-            )
+    @staticmethod
+    def get_proc_inst_status_infos(proc_inst_infos, _request=None) -> List[Dict]:
+        return ProcessHandler.batch_get_proc_inst_status_infos([proc_inst_infos], _request=_request)
 
-        gse_task_id = GseApi.operate_proc_multi({"proc_operate_req": proc_operate_req_slice, **base_params})["task_id"]
+    @staticmethod
+    def batch_get_proc_inst_status_infos(proc_inst_infos_slices: List[List[Dict]], _request=None) -> List[Dict]:
+        """
+        批量查询进程实例状态，各分片的 GSE 任务在同一事件循环中并发下发及轮询
+        :param proc_inst_infos_slices: 进程实例分片，每个分片对应一个 GSE 任务
+        :param _request:
+        """
+        poller = AsyncPoller(timeout=PROC_STATUS_POLLING_TIMEOUT)
+        checkers = []
+        for idx, proc_inst_infos in enumerate(proc_inst_infos_slices):
+            checker = ProcInstStatusChecker(proc_inst_infos, _request=_request)
+            poller.add(key=idx, poll=checker.poll, start=checker.start)
+            checkers.append(checker)
+        poller.run()
 
         proc_inst_status_infos = []
-        uniq_keys_recorded = set()
-        poll_time, interval, timeout = 0, 1.5, 60
-        while True:
-            try:
-                gse_api_result = GseApi.get_proc_operate_result({"task_id": gse_task_id, **base_params})
-            except Exception as error:
-                logger.error(
-                    "[sync_biz_process_status | get_proc_inst_status_infos] "
-                    "gse_task_id: {gse_task_id}, error: {error}".format(gse_task_id=gse_task_id, error=str(error))
-                )
-                poll_time += 2 * interval
-                if poll_time > timeout:
-                    break
-                time.sleep(interval)
-                continue
-
-            for meta_key, task_result in gse_api_result.items():
-                if meta_key_uniq_key_map[meta_key] in uniq_keys_recorded:
-                    continue
-                if task_result.get("error_code") == GseDataErrorCode.SUCCESS:
-                    gse_ip_proc_info = json.loads(task_result["content"])
-                    proc_inst_status_infos.append(
-                        {
-                            "is_auto": gse_ip_proc_info["process"][0]["instance"][0].get("isAuto", False),
-                            "status": (
-                                Process.ProcessStatus.RUNNING
-                                if gse_ip_proc_info["process"][0]["instance"][0].get("pid", -1) > 0
-                                else Process.ProcessStatus.TERMINATED
-                            ),
-                            "inst_uniq_key": meta_key_uniq_key_map[meta_key],
-                        }
-                    )
-                    uniq_keys_recorded.add(meta_key_uniq_key_map[meta_key])
-                elif task_result.get("error_code") != GseDataErrorCode.RUNNING:
-                    uniq_keys_recorded.add(meta_key_uniq_key_map[meta_key])
-
-            if any([len(uniq_keys_recorded) == len(gse_api_result.keys()), poll_time > timeout]):
-                break
-            time.sleep(interval)
-            poll_time += interval
-
-        if len(proc_inst_status_infos) != len(proc_inst_infos):
-            # TODO: 是否拉起异步任务重试
-            total_uniq_keys = set(meta_key_uniq_key_map.values())
-            success_uniq_keys = set([info["inst_uniq_key"] for info in proc_inst_status_infos])
-            logger.error(
-                "[sync_biz_process_status | get_proc_inst_status_infos] gse_task_id: {gse_task_id}, "
-                "check_number: {check_number}, failed_uniq_keys: {uniq_keys_failed}, "
-                "timeout: {uniq_keys_timeout}".format(
-                    gse_task_id=gse_task_id,
-                    check_number=len(total_uniq_keys),
-                    uniq_keys_failed=uniq_keys_recorded - success_uniq_keys,
-                    uniq_keys_timeout=total_uniq_keys - uniq_keys_recorded,
-                )
-            )
-        else:
-            logger.info(
-                "[sync_biz_process_status | get_proc_inst_status_infos] gse_task_id: {gse_task_id}, "
-                "poll_time: {poll_time}s, check_number: {check_number}".format(
-                    gse_task_id=gse_task_id, poll_time=poll_time, check_number=len(proc_inst_status_infos)
-                )
-            )
+        for checker in checkers:
+            checker.report()
+            proc_inst_status_infos.extend(checker.proc_inst_status_infos)
         return proc_inst_status_infos
 
     def sync_biz_process_status(self):
 
         begin_time = time.time()
 
-        process_related_infos = batch_request(CCApi.list_process_related_info, {"bk_biz_id": self.bk_biz_id})
+        process_related_infos = self.list_process_related_info()
         bk_process_ids = [process_info["process"]["bk_process_id"] for process_info in process_related_infos]
         proc_inst_map = defaultdict(list)
         for proc_inst in ProcessInst.objects.filter(bk_process_id__in=bk_process_ids).values(
@@ -1087,12 +1007,14 @@ class ProcessHandler(APIModel):
 
         # 片起始位置，分片大小
         limit = 1000
-        params_list = [
-            dict(proc_inst_infos=proc_inst_infos[start : start + limit])
-            for start in range(0, len(proc_inst_infos), limit)
-        ]
-        proc_status_infos = request_multi_thread(
-            self.get_proc_inst_status_infos, params_list, get_data=lambda x: x, get_request_target=lambda x: x
+        try:
+            _request = get_request()
+        except AppBaseException:
+            # celery下 无request对象
+            _request = None
+        proc_status_infos = self.batch_get_proc_inst_status_infos(
+            [proc_inst_infos[start : start + limit] for start in range(0, len(proc_inst_infos), limit)],
+            _request=_request,
         )
 
         # 更新进程实例状态并汇总到Process
@@ -1120,7 +1042,15 @@ class ProcessHandler(APIModel):
         )
 
     def process_info(self, bk_process_id):
+        process_related_info = (
+            ProcessRelatedInfo.objects.filter(bk_biz_id=self.bk_biz_id, bk_process_id=bk_process_id)
+            .values_list("related_info", flat=True)
+            .first()
+        )
+        if process_related_info:
+            return process_related_info
 
+        # 本地副本尚未同步到该进程，从 CMDB 获取
         process_list = (
             CCApi.list_process_related_info(
                 {
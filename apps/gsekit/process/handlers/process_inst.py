@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from apps.gsekit import constants
+from apps.gsekit.process.exceptions import DuplicateProcessInstException
+from apps.gsekit.process.models import ProcessInst
+from apps.utils.basic import list_slice
+from common.log import logger
+
+
+class ProcessInstReconciler(object):
+    """
+    进程实例对账
+    根据 CMDB 进程计算期望的进程实例，与本地实例按 local_inst_id_uniq_key 比对，仅写入新增、变更、删除的实例
+    编号规则：
+    inst_id: 进程实例的作用域对应的实例 ID，从 1 开始顺序编号，不同服务器之间唯一
+    bk_host_num: 主机编号，从 1 开始顺序编号
+    max_proc_num: 当前拓扑结构下单机进程启动数最大值
+    local_inst_id: 同一服务器内从 1 开始顺序编号，同一服务器内唯一，不同服务器间不唯一
+    inst_id = (bk_host_num - 1) * max_proc_num + local_inst_id
+    """
+
+    FIELDS = (
+        "bk_host_num",
+        "bk_module_id",
+        "bk_host_innerip",
+        "bk_cloud_id",
+        "bk_process_id",
+        "bk_process_name",
+        "inst_id",
+        "local_inst_id",
+        "proc_num",
+    )
+    # local_inst_id_uniq_key 相同时，主机、进程名及 local_inst_id 必然一致
+    UPDATE_FIELDS = ["bk_host_num", "bk_module_id", "bk_process_id", "inst_id", "proc_num"]
+
+    def __init__(self, bk_biz_id: int, bk_module_ids: Set[int] = None):
+        """
+        :param bk_biz_id: 业务ID
+        :param bk_module_ids: 对账范围，为空时对账整个业务
+        """
+        self.bk_biz_id = bk_biz_id
+        self.bk_module_ids = bk_module_ids
+
+    @staticmethod
+    def group_cmdb_processes(process_list: List[Dict]) -> Dict[int, Dict[str, Dict]]:
+        """
+        按模块及进程名对 CMDB 进程分组，并计算组内最大启动数量
+        :return: {bk_module_id: {bk_process_name: {"max_proc_num": 1, "processes": [...]}}}
+        """
+        cmdb_module_proc_name_map = defaultdict(
+            lambda: defaultdict(lambda: {"max_proc_num": ProcessInst.DEFAULT_PROC_NUM, "processes": []})
+        )
+        for cmdb_process in process_list:
+            # 若CMDB进程未配置启动数量，则默认取 ProcessInst.DEFAULT_PROC_NUM
+            cmdb_process["process"]["proc_num"] = cmdb_process["process"]["proc_num"] or ProcessInst.DEFAULT_PROC_NUM
+            group = cmdb_module_proc_name_map[cmdb_process["module"]["bk_module_id"]][
+                cmdb_process["process"]["bk_process_name"]
+            ]
+            group["max_proc_num"] = max(group["max_proc_num"], cmdb_process["process"]["proc_num"])
+            group["processes"].append(cmdb_process)
+        return cmdb_module_proc_name_map
+
+    def load_local_insts(self, process_list: List[Dict]) -> Dict[str, Tuple]:
+        """本地进程实例：{local_inst_id_uniq_key: (id, *FIELDS)}"""
+        local_insts = ProcessInst.objects.filter(bk_biz_id=self.bk_biz_id)
+        if self.bk_module_ids is not None:
+            # 进程可能从对账范围外的模块迁入，local_inst_id_uniq_key 在主机内唯一，需一并加载这些主机上的实例
+            bk_host_innerips = {cmdb_process["host"]["bk_host_innerip"] for cmdb_process in process_list}
+            local_insts = local_insts.filter(
+                Q(bk_module_id__in=self.bk_module_ids) | Q(bk_host_innerip__in=bk_host_innerips)
+            )
+        return {inst[0]: inst[1:] for inst in local_insts.values_list("local_inst_id_uniq_key", "id", *self.FIELDS)}
+
+    def generate_expected_insts(self, process_list: List[Dict], local_insts: Dict[str, Tuple]) -> Dict[str, Tuple]:
+        """
+        计算期望的进程实例：{local_inst_id_uniq_key: FIELDS}
+        组内最大启动数量变更时整组重新编号，否则沿用已有主机编号，新主机从组内最大主机编号开始递增
+        """
+        field_index = {field: index + 1 for index, field in enumerate(self.FIELDS)}
+        local_group_map = defaultdict(lambda: {"max_proc_num": ProcessInst.DEFAULT_PROC_NUM, "max_host_num": 0})
+        local_host_num_map = {}
+        for inst in local_insts.values():
+            group_key = (inst[field_index["bk_module_id"]], inst[field_index["bk_process_name"]])
+            bk_host_num = inst[field_index["bk_host_num"]]
+            local_group_map[group_key]["max_proc_num"] = max(
+                local_group_map[group_key]["max_proc_num"], inst[field_index["proc_num"]]
+            )
+            local_group_map[group_key]["max_host_num"] = max(local_group_map[group_key]["max_host_num"], bk_host_num)
+            local_host_num_map[
+                group_key + (inst[field_index["bk_host_innerip"]], inst[field_index["bk_cloud_id"]])
+            ] = bk_host_num
+
+        expected_insts = {}
+        duplicate_uniq_keys = set()
+        for bk_module_id, cmdb_process_name_map in self.group_cmdb_processes(process_list).items():
+            for bk_process_name, group in cmdb_process_name_map.items():
+                max_proc_num = group["max_proc_num"]
+                local_group = local_group_map[(bk_module_id, bk_process_name)]
+                is_renumbered = max_proc_num != local_group["max_proc_num"]
+                max_host_num = local_group["max_host_num"]
+
+                for index, cmdb_process in enumerate(group["processes"]):
+                    bk_host_innerip = cmdb_process["host"]["bk_host_innerip"]
+                    bk_cloud_id = cmdb_process["host"]["bk_cloud_id"]
+                    if is_renumbered:
+                        bk_host_num = index + 1
+                    else:
+                        host_key = (bk_module_id, bk_process_name, bk_host_innerip, bk_cloud_id)
+                        bk_host_num = local_host_num_map.get(host_key)
+                        if bk_host_num is None:
+                            max_host_num += 1
+                            bk_host_num = max_host_num
+
+                    proc_num = cmdb_process["process"]["proc_num"]
+                    for local_inst_id in range(1, proc_num + 1):
+                        local_inst_id_uniq_key = ProcessInst.LOCAL_INST_ID_UNIQ_KEY_TMPL.format(
+                            bk_host_innerip=bk_host_innerip,
+                            bk_cloud_id=bk_cloud_id,
+                            bk_process_name=bk_process_name,
+                            local_inst_id=local_inst_id,
+                        )
+                        if local_inst_id_uniq_key in expected_insts:
+                            duplicate_uniq_keys.add(local_inst_id_uniq_key)
+                            continue
+                        expected_insts[local_inst_id_uniq_key] = (
+                            bk_host_num,
+                            bk_module_id,
+                            bk_host_innerip,
+                            bk_cloud_id,
+                            cmdb_process["process"]["bk_process_id"],
+                            bk_process_name,
+                            (bk_host_num - 1) * max_proc_num + local_inst_id,
+                            local_inst_id,
+                            proc_num,
+                        )
+
+        # 存在重复进程实例
+        if duplicate_uniq_keys:
+            raise DuplicateProcessInstException(uniq_key=duplicate_uniq_keys)
+        return expected_insts
+
+    def reconcile(self, process_list: List[Dict]) -> Dict[str, int]:
+        local_insts = self.load_local_insts(process_list)
+        expected_insts = self.generate_expected_insts(process_list, local_insts)
+
+        inst_id_index = self.FIELDS.index("inst_id")
+        bk_module_id_index = self.FIELDS.index("bk_module_id")
+        # 对账范围外模块的实例仅用于迁入时更新，不在此删除
+        to_be_deleted_ids = [
+            local_inst[0]
+            for local_inst_id_uniq_key, local_inst in local_insts.items()
+            if local_inst_id_uniq_key not in expected_insts
+            and (self.bk_module_ids is None or local_inst[bk_module_id_index + 1] in self.bk_module_ids)
+        ]
+        to_be_created_insts = []
+        to_be_updated_insts = []
+        # 编号或模块变更的实例，先置为临时编号，避免更新过程中与组内其它实例的 inst_id 冲突
+        to_be_renumbered_insts = []
+        for local_inst_id_uniq_key, expected_inst in expected_insts.items():
+            local_inst = local_insts.get(local_inst_id_uniq_key)
+            if local_inst is None:
+                to_be_created_insts.append(
+                    ProcessInst(
+                        bk_biz_id=self.bk_biz_id,
+                        local_inst_id_uniq_key=local_inst_id_uniq_key,
+                        **dict(zip(self.FIELDS, expected_inst)),
+                    )
+                )
+                continue
+
+            inst_pk, local_fields = local_inst[0], local_inst[1:]
+            if local_fields == expected_inst:
+                continue
+            to_be_updated_insts.append(ProcessInst(id=inst_pk, **dict(zip(self.FIELDS, expected_inst))))
+            if (
+                local_fields[inst_id_index] != expected_inst[inst_id_index]
+                or local_fields[bk_module_id_index] != expected_inst[bk_module_id_index]
+            ):
+                to_be_renumbered_insts.append(ProcessInst(id=inst_pk, inst_id=-inst_pk))
+
+        with transaction.atomic():
+            for ids in list_slice(to_be_deleted_ids, constants.ORM_BATCH_SIZE):
+                ProcessInst.objects.filter(id__in=ids).delete()
+            ProcessInst.objects.bulk_update(
+                to_be_renumbered_insts, fields=["inst_id"], batch_size=constants.ORM_BATCH_SIZE
+            )
+            ProcessInst.objects.bulk_update(
+                to_be_updated_insts, fields=self.UPDATE_FIELDS, batch_size=constants.ORM_BATCH_SIZE
+            )
+            ProcessInst.objects.bulk_create(to_be_created_insts, batch_size=constants.ORM_BATCH_SIZE)
+
+        reconcile_result = {
+            "created_count": len(to_be_created_insts),
+            "updated_count": len(to_be_updated_insts),
+            "deleted_count": len(to_be_deleted_ids),
+        }
+        logger.info(
+            f"[ProcessInstReconciler] bk_biz_id: {self.bk_biz_id}, "
+            f"bk_module_ids: {self.bk_module_ids}, result: {reconcile_result}"
+        )
+        return reconcile_result
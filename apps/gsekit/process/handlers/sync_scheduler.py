@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import heapq
+import math
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from apps.api import CCApi
+from apps.gsekit import constants
+from apps.gsekit.cmdb.handlers.cmdb import CMDBHandler
+from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.models import Process
+from common.log import logger
+
+
+class ProcessSyncScheduler(object):
+    """
+    业务进程同步调度
+    - 进程数超过 PROCESS_SYNC_SHARD_SIZE 的业务按模块拆分为多个分片并行同步，进程实例按模块编号，分片间互不影响
+    - 分片结束时按模块记录耗时，下一轮以此为权重进行贪心装箱，使各分片耗时接近
+    - 同一业务上一轮的分片未全部结束时，跳过本轮同步
+    """
+
+    RUN_CACHE_TEMPLATE = "gsekit:process:biz:{bk_biz_id}:sync_run"
+    DISPATCH_LOCK_TEMPLATE = "gsekit:process:biz:{bk_biz_id}:sync_dispatch_lock"
+    SHARD_CACHE_TEMPLATE = "gsekit:process:biz:{bk_biz_id}:sync_run:{run_id}:shard:{shard_index}"
+    DISPATCH_LOCK_TIMEOUT = 60
+
+    def __init__(self, bk_biz_id: int):
+        self.bk_biz_id = bk_biz_id
+        self.run_cache_key = self.RUN_CACHE_TEMPLATE.format(bk_biz_id=bk_biz_id)
+
+    def shard_cache_key(self, run_id: str, shard_index: int) -> str:
+        return self.SHARD_CACHE_TEMPLATE.format(bk_biz_id=self.bk_biz_id, run_id=run_id, shard_index=shard_index)
+
+    def get_progress(self) -> Optional[Dict]:
+        """
+        最近一轮同步的进度
+        :return: {
+            "run_id": "xxx",
+            "shard_num": 3,
+            "started_at": 1600000000.0,
+            "finished_shards": {0: {"cost": 12.3, "is_success": True, "module_costs": {bk_module_id: 1.2}}}
+        }
+        """
+        run = cache.get(self.run_cache_key)
+        if not run:
+            return None
+        shard_index_map = {
+            self.shard_cache_key(run["run_id"], shard_index): shard_index for shard_index in range(run["shard_num"])
+        }
+        run["finished_shards"] = {
+            shard_index_map[cache_key]: shard_result
+            for cache_key, shard_result in cache.get_many(list(shard_index_map.keys())).items()
+        }
+        return run
+
+    @staticmethod
+    def is_running(progress: Optional[Dict]) -> bool:
+        if not progress:
+            return False
+        if time.time() > progress["started_at"] + settings.PROCESS_SYNC_RUN_TIMEOUT:
+            return False
+        return len(progress["finished_shards"]) < progress["shard_num"]
+
+    def list_module_ids(self) -> Set[int]:
+        module_nodes = []
+        CMDBHandler(bk_biz_id=self.bk_biz_id).list_target_obj_node_from_topo(
+            CCApi.search_biz_inst_topo({"bk_biz_id": self.bk_biz_id}), module_nodes, CMDBHandler.BK_MODULE_OBJ_ID
+        )
+        return {module_node["bk_inst_id"] for module_node in module_nodes}
+
+    def get_module_proc_count_map(self, bk_module_ids: List[int] = None) -> Dict[int, int]:
+        processes = Process.objects.filter(bk_biz_id=self.bk_biz_id)
+        if bk_module_ids is not None:
+            processes = processes.filter(bk_module_id__in=bk_module_ids)
+        return dict(processes.order_by().values_list("bk_module_id").annotate(count=Count("bk_process_id")))
+
+    def plan_shards(self, module_costs: Dict[int, float]) -> List[Optional[List[int]]]:
+        """
+        规划同步分片
+        :param module_costs: 上一轮同步各模块的耗时
+        :return: 各分片的模块ID列表，仅有一个分片时为 [None]，表示同步整个业务
+        """
+        module_proc_count_map = self.get_module_proc_count_map()
+        shard_num = min(
+            math.ceil(sum(module_proc_count_map.values()) / settings.PROCESS_SYNC_SHARD_SIZE),
+            settings.PROCESS_SYNC_MAX_SHARDS,
+        )
+        if shard_num <= 1:
+            return [None]
+
+        # 本地存在进程但拓扑中已不存在的模块同样需要同步，以便清理其中的进程
+        bk_module_ids = self.list_module_ids() | set(module_proc_count_map.keys())
+
+        # 无耗时记录的模块，按进程数及上一轮的平均单进程耗时估算
+        costed_module_ids = [bk_module_id for bk_module_id in module_costs if bk_module_id in bk_module_ids]
+        costed_proc_count = sum(module_proc_count_map.get(bk_module_id, 0) for bk_module_id in costed_module_ids)
+        proc_cost = 1
+        if costed_proc_count:
+            proc_cost = sum(module_costs[bk_module_id] for bk_module_id in costed_module_ids) / costed_proc_count
+        module_weights = {
+            bk_module_id: module_costs.get(bk_module_id, max(module_proc_count_map.get(bk_module_id, 0), 1) * proc_cost)
+            for bk_module_id in bk_module_ids
+        }
+
+        # 最长处理时间优先：按权重从大到小，依次放入当前负载最小的分片
+        shards = [[] for __ in range(shard_num)]
+        shard_loads = [(0, shard_index) for shard_index in range(shard_num)]
+        for bk_module_id in sorted(module_weights, key=lambda module_id: module_weights[module_id], reverse=True):
+            shard_load, shard_index = heapq.heappop(shard_loads)
+            shards[shard_index].append(bk_module_id)
+            heapq.heappush(shard_loads, (shard_load + module_weights[bk_module_id], shard_index))
+        return [shard for shard in shards if shard]
+
+    def dispatch(self) -> Optional[Tuple[str, List[Optional[List[int]]]]]:
+        """
+        开始新一轮同步
+        :return: (run_id, 各分片的模块ID列表)，上一轮同步未结束时返回 None
+        """
+        dispatch_lock_key = self.DISPATCH_LOCK_TEMPLATE.format(bk_biz_id=self.bk_biz_id)
+        if not cache.add(dispatch_lock_key, True, self.DISPATCH_LOCK_TIMEOUT):
+            logger.info(f"[ProcessSyncScheduler] bk_biz_id -> {self.bk_biz_id} is dispatching, skip.")
+            return None
+
+        try:
+            progress = self.get_progress()
+            if self.is_running(progress):
+                logger.info(
+                    f"[ProcessSyncScheduler] bk_biz_id -> {self.bk_biz_id} run -> {progress['run_id']} "
+                    f"is still running, finished shards: {len(progress['finished_shards'])}/{progress['shard_num']}"
+                )
+                return None
+
+            module_costs = {}
+            for shard_result in (progress or {}).get("finished_shards", {}).values():
+                module_costs.update(shard_result["module_costs"])
+            CMDBHandler(bk_biz_id=self.bk_biz_id).get_or_cache_bk_cloud_area(use_cache=False)
+            shards = self.plan_shards(module_costs)
+
+            run_id = uuid.uuid4().hex
+            cache.set(
+                self.run_cache_key,
+                {"run_id": run_id, "shard_num": len(shards), "started_at": time.time()},
+                constants.CacheExpire.DAY,
+            )
+        finally:
+            cache.delete(dispatch_lock_key)
+
+        logger.info(f"[ProcessSyncScheduler] bk_biz_id -> {self.bk_biz_id} run -> {run_id} shard_num: {len(shards)}")
+        return run_id, shards
+
+    def run_shard(self, run_id: str, shard_index: int, bk_module_ids: Optional[List[int]]):
+        """执行同步分片，无论成功与否均记录耗时，失败时异常继续抛出"""
+        begin_time = time.time()
+        is_success = False
+        try:
+            if bk_module_ids is None:
+                ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+            else:
+                ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process_by_module_ids(bk_module_ids)
+            is_success = True
+        finally:
+            cost = time.time() - begin_time
+            # 分片耗时按进程数分摊到模块，作为下一轮的装箱权重
+            module_proc_count_map = self.get_module_proc_count_map(bk_module_ids)
+            module_weights = {
+                bk_module_id: max(module_proc_count_map.get(bk_module_id, 0), 1)
+                for bk_module_id in (module_proc_count_map.keys() if bk_module_ids is None else bk_module_ids)
+            }
+            total_weight = sum(module_weights.values()) or 1
+            cache.set(
+                self.shard_cache_key(run_id, shard_index),
+                {
+                    "cost": cost,
+                    "is_success": is_success,
+                    "module_costs": {
+                        bk_module_id: cost * weight / total_weight for bk_module_id, weight in module_weights.items()
+                    },
+                },
+                constants.CacheExpire.DAY,
+            )
+            logger.info(
+                f"[ProcessSyncScheduler] bk_biz_id -> {self.bk_biz_id} run -> {run_id} shard -> {shard_index} "
+                f"module_count: {len(module_weights)}, is_success: {is_success}, cost: {cost:.3f}s"
+            )
@@ -8,16 +8,21 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and limitations under the License.
 """
+import copy
 import random
 from typing import List, Dict
 
-from mock import patch
+from django.test import override_settings
+from mock import MagicMock, patch
 
 from apps.utils.test_utils.tests import MyTestCase
 from apps.gsekit.process import models as proc_models
 from apps.gsekit.cmdb.views.tests import CmdbMockClient
 from apps.gsekit.cmdb import mock_data as cmdb_mock_data
+from apps.gsekit.cmdb.constants import BkSetEnv
 from apps.gsekit.process.handlers.process import ProcessHandler
+from apps.gsekit.process.handlers.process_inst import ProcessInstReconciler
+from apps.gsekit.process.handlers.sync_scheduler import ProcessSyncScheduler
 
 
 class TestProcessHandler(MyTestCase):
@@ -27,6 +32,7 @@ class TestProcessHandler(MyTestCase):
     def setUp(self) -> None:
         super(TestProcessHandler, self).setUp()
         patch(self.CC_API_MOCK_PATH, self.cmdb_mock_client).start()
+        patch("apps.gsekit.process.handlers.sync_scheduler.CCApi", self.cmdb_mock_client).start()
 
     @staticmethod
     def cal_proc_inst_num(proc_related_infos: List[Dict]) -> int:
@@ -58,3 +64,201 @@ class TestProcessHandler(MyTestCase):
             proc_models.ProcessInst.objects.all().count(),
             self.cal_proc_inst_num(cmdb_mock_data.LIST_PROCESS_RELATED_INFO),
         )
+
+    def test_process_related_info_replica(self):
+        ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+        self.assertTrue(ProcessHandler(bk_biz_id=self.bk_biz_id).is_process_related_info_replicated())
+
+        # 副本就绪后从本地读取，不再请求 CMDB
+        with patch.object(self.cmdb_mock_client, "list_process_related_info", MagicMock()) as cmdb_api:
+            process_list = ProcessHandler(bk_biz_id=self.bk_biz_id).list_process_related_info()
+            cmdb_api.assert_not_called()
+        self.assertEqual(
+            sorted(process["process"]["bk_process_id"] for process in process_list),
+            sorted(process["process"]["bk_process_id"] for process in cmdb_mock_data.LIST_PROCESS_RELATED_INFO),
+        )
+
+        # CMDB 无变更时不写入副本
+        with patch.object(proc_models.ProcessRelatedInfo.objects, "bulk_update") as bulk_update:
+            ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+            self.assertEqual(bulk_update.call_args[0][0], [])
+
+    def test_sync_biz_process_by_ids(self):
+        ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+        all_process_ids = list(proc_models.Process.objects.all().values_list("bk_process_id", flat=True))
+
+        del_proc_ids = all_process_ids[: random.randint(1, len(all_process_ids))]
+        proc_models.Process.objects.filter(bk_process_id__in=del_proc_ids).delete()
+        proc_models.ProcessInst.objects.filter(bk_process_id__in=del_proc_ids).delete()
+
+        # 按变更进程所在模块增量同步
+        ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process_by_ids(del_proc_ids)
+        self.assertEqual(proc_models.Process.objects.all().count(), len(cmdb_mock_data.LIST_PROCESS_RELATED_INFO))
+        self.assertEqual(
+            proc_models.ProcessInst.objects.all().count(),
+            self.cal_proc_inst_num(cmdb_mock_data.LIST_PROCESS_RELATED_INFO),
+        )
+
+    def test_sync_proc_status_to_db(self):
+        proc_models.Process.objects.all().delete()
+        proc_models.ProcessInst.objects.all().delete()
+        running, terminated = proc_models.Process.ProcessStatus.RUNNING, proc_models.Process.ProcessStatus.TERMINATED
+
+        # 进程ID -> (进程状态, 托管状态, 各实例的 [(实例状态, 托管状态)])
+        process_status_map = {
+            # 存在终止实例
+            1: (running, True, [(running, True), (running, True)]),
+            # 部分实例未查询到状态
+            2: (terminated, False, [(terminated, False), (terminated, False)]),
+            # 无实例
+            3: (running, True, []),
+            # 未托管且状态未变更的实例
+            4: (running, True, [(running, False)]),
+        }
+        for bk_process_id, (process_status, is_auto, inst_status_list) in process_status_map.items():
+            proc_models.Process.objects.create(
+                bk_biz_id=self.bk_biz_id,
+                bk_host_innerip="127.0.0.1",
+                bk_cloud_id=0,
+                bk_set_env=BkSetEnv.FORMAL,
+                bk_set_id=1,
+                bk_module_id=1,
+                service_instance_id=bk_process_id,
+                bk_process_name=f"process_{bk_process_id}",
+                bk_process_id=bk_process_id,
+                process_template_id=1,
+                process_status=process_status,
+                is_auto=is_auto,
+            )
+            for local_inst_id, (inst_status, inst_is_auto) in enumerate(inst_status_list, 1):
+                proc_models.ProcessInst.objects.create(
+                    bk_biz_id=self.bk_biz_id,
+                    bk_host_num=1,
+                    bk_host_innerip="127.0.0.1",
+                    bk_cloud_id=0,
+                    bk_process_id=bk_process_id,
+                    bk_module_id=1,
+                    bk_process_name=f"process_{bk_process_id}",
+                    inst_id=local_inst_id,
+                    local_inst_id=local_inst_id,
+                    local_inst_id_uniq_key=f"127.0.0.1-0-process_{bk_process_id}-{local_inst_id}",
+                    process_status=inst_status,
+                    is_auto=inst_is_auto,
+                )
+
+        proc_status_infos = [
+            {"inst_uniq_key": "127.0.0.1-0-process_1-1", "status": running, "is_auto": True},
+            {"inst_uniq_key": "127.0.0.1-0-process_1-2", "status": terminated, "is_auto": True},
+            {"inst_uniq_key": "127.0.0.1-0-process_2-1", "status": running, "is_auto": True},
+            {"inst_uniq_key": "127.0.0.1-0-process_4-1", "status": running, "is_auto": False},
+        ]
+        result = ProcessHandler(bk_biz_id=self.bk_biz_id).sync_proc_status_to_db(proc_status_infos)
+        # 仅状态或托管状态发生变化的实例及进程写入
+        self.assertEqual(result, {"updated_proc_inst_count": 2, "updated_process_count": 3})
+
+        self.assertEqual(
+            dict(proc_models.ProcessInst.objects.values_list("local_inst_id_uniq_key", "process_status")),
+            {
+                "127.0.0.1-0-process_1-1": running,
+                "127.0.0.1-0-process_1-2": terminated,
+                "127.0.0.1-0-process_2-1": running,
+                "127.0.0.1-0-process_2-2": terminated,
+                "127.0.0.1-0-process_4-1": running,
+            },
+        )
+        self.assertEqual(
+            {
+                bk_process_id: (process_status, is_auto)
+                for bk_process_id, process_status, is_auto in proc_models.Process.objects.values_list(
+                    "bk_process_id", "process_status", "is_auto"
+                )
+            },
+            {
+                # 任意实例终止，汇总为终止
+                1: (terminated, True),
+                # 部分实例未查询到状态，保持原状态
+                2: (terminated, False),
+                # 无实例，汇总为终止、未托管
+                3: (terminated, False),
+                # 任意实例未托管，汇总为未托管
+                4: (running, False),
+            },
+        )
+
+    def test_reconcile_process_inst(self):
+        ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+        proc_models.ProcessInst.objects.all().update(process_status=proc_models.Process.ProcessStatus.RUNNING)
+
+        # 进程无变更时不产生写入，且保留进程实例状态
+        process_list = copy.deepcopy(cmdb_mock_data.LIST_PROCESS_RELATED_INFO)
+        result = ProcessInstReconciler(bk_biz_id=self.bk_biz_id).reconcile(process_list)
+        self.assertEqual(result, {"created_count": 0, "updated_count": 0, "deleted_count": 0})
+        self.assertFalse(
+            proc_models.ProcessInst.objects.exclude(process_status=proc_models.Process.ProcessStatus.RUNNING).exists()
+        )
+
+        # 调整启动数量后，仅对差异实例进行写入
+        process_list[0]["process"]["proc_num"] = (process_list[0]["process"]["proc_num"] or 1) + 1
+        ProcessInstReconciler(bk_biz_id=self.bk_biz_id).reconcile(process_list)
+        self.assertEqual(proc_models.ProcessInst.objects.all().count(), self.cal_proc_inst_num(process_list))
+        self.assertEqual(
+            proc_models.ProcessInst.objects.filter(
+                bk_process_id=process_list[0]["process"]["bk_process_id"],
+                process_status=proc_models.Process.ProcessStatus.RUNNING,
+            ).count(),
+            process_list[0]["process"]["proc_num"] - 1,
+        )
+
+    def test_reconcile_process_inst_moved_module(self):
+        ProcessHandler(bk_biz_id=self.bk_biz_id).sync_biz_process()
+        inst_count = proc_models.ProcessInst.objects.all().count()
+
+        # 进程迁入对账范围外的模块，按目标模块对账时沿用原实例，不违反主机内唯一约束
+        cmdb_process = copy.deepcopy(cmdb_mock_data.LIST_PROCESS_RELATED_INFO[0])
+        cmdb_process["module"]["bk_module_id"] = 999999
+        result = ProcessInstReconciler(bk_biz_id=self.bk_biz_id, bk_module_ids={999999}).reconcile([cmdb_process])
+        self.assertEqual(result["created_count"], 0)
+        self.assertEqual(result["deleted_count"], 0)
+        self.assertEqual(proc_models.ProcessInst.objects.all().count(), inst_count)
+        self.assertFalse(
+            proc_models.ProcessInst.objects.filter(bk_process_id=cmdb_process["process"]["bk_process_id"])
+            .exclude(bk_module_id=999999)
+            .exists()
+        )
+
+    @override_settings(PROCESS_SYNC_SHARD_SIZE=1, PROCESS_SYNC_MAX_SHARDS=3)
+    def test_sharded_sync_biz_process(self):
+        scheduler = ProcessSyncScheduler(bk_biz_id=self.bk_biz_id)
+        # 首次同步无本地进程，整个业务作为一个分片
+        run_id, shards = scheduler.dispatch()
+        self.assertEqual(shards, [None])
+        scheduler.run_shard(run_id, 0, shards[0])
+
+        def list_process_related_info(params, *args, **kwargs):
+            bk_module_ids = params.get("module", {}).get("bk_module_ids")
+            process_list = [
+                process
+                for process in copy.deepcopy(cmdb_mock_data.LIST_PROCESS_RELATED_INFO)
+                if bk_module_ids is None or process["module"]["bk_module_id"] in bk_module_ids
+            ]
+            return {"info": process_list, "count": len(process_list)}
+
+        proc_models.ProcessInst.objects.all().delete()
+        run_id, shards = scheduler.dispatch()
+        self.assertTrue(all(shards))
+        self.assertEqual(len({bk_module_id for shard in shards for bk_module_id in shard}), sum(map(len, shards)))
+
+        with patch.object(
+            self.cmdb_mock_client, "list_process_related_info", MagicMock(side_effect=list_process_related_info)
+        ):
+            # 分片未全部结束时，跳过新一轮同步
+            scheduler.run_shard(run_id, 0, shards[0])
+            if len(shards) > 1:
+                self.assertIsNone(scheduler.dispatch())
+            for shard_index, bk_module_ids in enumerate(shards[1:], 1):
+                scheduler.run_shard(run_id, shard_index, bk_module_ids)
+        self.assertFalse(scheduler.is_running(scheduler.get_progress()))
+        self.assertEqual(
+            proc_models.ProcessInst.objects.all().count(),
+            self.cal_proc_inst_num(cmdb_mock_data.LIST_PROCESS_RELATED_INFO),
+        )
@@ -134,3 +134,19 @@ class ProcessInst(models.Model):
         ]
         verbose_name = _("进程实例（ProcessInst）")
         verbose_name_plural = _("进程实例（ProcessInst）")
+
+
+class ProcessRelatedInfo(models.Model):
+    """
+    CMDB 进程关联信息（主机、集群、模块、服务实例、进程属性等）的本地副本，结构与 list_process_related_info 一致
+    随 Process 同步写入，由周期同步全量校准、由资源监听按模块增量刷新
+    """
+
+    bk_process_id = models.IntegerField(_("进程ID"), primary_key=True)
+    bk_biz_id = models.IntegerField(_("业务ID"), db_index=True)
+    related_info = models.JSONField(_("进程关联信息"), default=dict)
+    fingerprint = models.CharField(_("关联信息指纹"), max_length=32, default="")
+
+    class Meta:
+        verbose_name = _("进程关联信息（ProcessRelatedInfo）")
+        verbose_name_plural = _("进程关联信息（ProcessRelatedInfo）")
@@ -20,6 +20,34 @@ job_model_updates = Counter(
     namespace=NAMESPACE,
 )
 
+mako_template_cache = Counter(
+    "mako_template_cache_total",
+    "Number of mako template cache lookups by result.",
+    ["result"],
+    namespace=NAMESPACE,
+)
+
+api_http_requests = Counter(
+    "api_http_requests_total",
+    "Number of http requests sent to component apis by host.",
+    ["host"],
+    namespace=NAMESPACE,
+)
+
+api_http_new_connections = Counter(
+    "api_http_new_connections_total",
+    "Number of http connections established to component apis by host.",
+    ["host"],
+    namespace=NAMESPACE,
+)
+
+api_rate_limit_waits = Counter(
+    "api_rate_limit_waits_total",
+    "Number of component api requests delayed by the token bucket rate limiter.",
+    ["api"],
+    namespace=NAMESPACE,
+)
+
 
 def export_job_prometheus_mixin():
     """任务模型埋点"""
@@ -8,16 +8,56 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and limitations under the License.
 """
+import itertools
 import time
-from concurrent.futures import as_completed
+from collections import deque
+from concurrent.futures import Future, as_completed
 from concurrent.futures.thread import ThreadPoolExecutor
-from multiprocessing.pool import ThreadPool
+from typing import Any, Dict
 
 from django.conf import settings
 from django.db import connections
 
-from apps.exceptions import AppBaseException
+from apps.exceptions import ApiRequestError, ApiResultError, AppBaseException
 from apps.utils.local import get_request
+from common.log import logger
+
+
+# batch_request 的并发请求数
+BATCH_REQUEST_MAX_WORKERS = 20
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """仅网络异常及平台频率限制可重试，权限、参数等错误重试无意义"""
+    # 模块间存在循环引用，在调用时导入
+    from apps.api.modules.esb import _ESBApi
+
+    if isinstance(error, ApiRequestError):
+        return True
+    if isinstance(error, ApiResultError):
+        try:
+            return int(error.code) in _ESBApi.ErrorCode.RATE_LIMIT_EXCEEDED_ERR_LIST
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def request_page(func, params: Dict, max_retries: int = None) -> Any:
+    """
+    请求单页数据，网络异常或触发频率限制时按指数退避重试，单页失败不影响其余分页
+    DataAPI 及连接池已对超时、连接失败、频率限制进行过重试，此处仅在其重试耗尽后兜底，默认重试次数较少
+    """
+    max_retries = settings.BATCH_REQUEST_PAGE_MAX_RETRIES if max_retries is None else max_retries
+    retry_times = 0
+    while True:
+        try:
+            return func(params)
+        except Exception as error:
+            if retry_times >= max_retries or not is_retryable_error(error):
+                raise
+            retry_times += 1
+            logger.warning(f"[batch_request] request page -> {params['page']} failed: {error}, retry: {retry_times}")
+            time.sleep(settings.BATCH_REQUEST_PAGE_RETRY_INTERVAL * 2 ** (retry_times - 1))
 
 
 def batch_request(
@@ -41,36 +81,70 @@ def batch_request(
     if not get_count:
         return sync_batch_request(func, params, get_data, limit)
 
+    data = []
+    for page_data in batch_request_iterator(
+        func, params, get_data=get_data, get_count=get_count, limit=limit, max_workers=BATCH_REQUEST_MAX_WORKERS
+    ):
+        data.extend(page_data)
+    return data
+
+
+def batch_request_iterator(
+    func,
+    params,
+    get_data=lambda x: x["info"],
+    get_count=lambda x: x["count"],
+    limit=500,
+    max_workers: int = None,
+    start: int = 0,
+):
+    """
+    分页并发请求接口，按分页顺序逐页返回数据，调用方可边请求边处理
+    - 在途及已完成未消费的分页不超过 max_workers，数据不会无限堆积在内存中
+    - 单页请求失败时单独重试，重试耗尽后抛出异常。此时调用方已消费 N 页，则可从 start + N * limit 处重新拉取
+    :param func: 请求方法
+    :param params: 请求参数
+    :param get_data: 获取数据函数
+    :param get_count: 获取总数函数
+    :param limit: 一次请求数量
+    :param max_workers: 并发请求数
+    :param start: 起始位置，用于从上次中断处续传
+    :return: 分页数据迭代器
+    """
+    max_workers = max_workers or settings.CONCURRENT_NUMBER
+
     # 请求第一次获取总数
-    first_params = dict(page={"start": 0, "limit": limit, "return_total": True}, **params)
-    result = func(first_params)
+    result = request_page(func, dict(page={"start": start, "limit": limit, "return_total": True}, **params))
     count = int(get_count(result))
-    data = get_data(result)
-    start = limit
+    yield get_data(result)
 
-    # 根据请求总数并发请求
-    pool = ThreadPool(20)
-    futures = []
     try:
         params["_request"] = get_request()
     except AppBaseException:
         # celery下 无request对象
         pass
 
-    while start < count:
-        request_params = dict(page={"limit": limit, "start": start}, **params)
-        futures.append(pool.apply_async(func, args=(request_params,)))
-
-        start += limit
-
-    pool.close()
-    pool.join()
-
-    # 取值
-    for future in futures:
-        data.extend(get_data(future.get()))
-
-    return data
+    starts = iter(range(start + limit, count, limit))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(page_start: int) -> Future:
+            return executor.submit(request_page, func, dict(page={"limit": limit, "start": page_start}, **params))
+
+        futures = deque((page_start, submit(page_start)) for page_start in itertools.islice(starts, max_workers))
+        while futures:
+            page_start, future = futures.popleft()
+            try:
+                result = future.result()
+            except Exception:
+                logger.exception(f"[batch_request] request page failed, resume from start -> {page_start}")
+                for __, pending_future in futures:
+                    pending_future.cancel()
+                raise
+            # 每消费一页，补充提交一页
+            next_start = next(starts, None)
+            if next_start is not None:
+                futures.append((next_start, submit(next_start)))
+            yield get_data(result)
 
 
 def sync_batch_request(func, params, get_data=lambda x: x["info"], limit=500):
@@ -106,17 +180,16 @@ def request_multi_thread(
     params_list,
     get_data=lambda x: x.get("info", []) if x else [],
     get_request_target=lambda x: x.get("params", {}),
-    interval: float = 0,
     extend_result: bool = True,
 ):
     """
     并发请求接口，每次按不同参数请求最后叠加请求结果
+    请求频率由 DataAPI 的令牌桶统一控制，并发线程在令牌不足时阻塞等待，无需按固定间隔提交任务
     :param func: 请求方法
     :param params_list: 参数列表
     :param get_data: 获取数据函数
     :param extend_result: 是否展开结果
     :param get_request_target:
-    :param interval: 任务提交间隔
     :return: 请求结果累计
     """
     # 参数预处理，添加request_id
@@ -131,11 +204,7 @@ def request_multi_thread(
 
     result = []
     with ThreadPoolExecutor(max_workers=settings.CONCURRENT_NUMBER) as ex:
-        tasks = []
-        for idx, params in enumerate(params_list):
-            if idx and interval:
-                time.sleep(interval)
-            tasks.append(ex.submit(func, **params))
+        tasks = [ex.submit(func, **params) for params in params_list]
     for future in as_completed(tasks):
         if extend_result:
             result.extend(get_data(future.result()))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from mako.template import Template
+
+from apps.prometheus.models import mako_template_cache
+
+
+class TemplateCache(object):
+    """
+    mako 编译模板进程内缓存，以模板内容 sha256 为键的有界 LRU
+    编译生成的模块源码可直接执行，不写入进程间共享的缓存，各 worker 按模板内容自行编译
+    """
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._templates: "OrderedDict[str, Template]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def uri(digest: str) -> str:
+        return f"memory:{digest}"
+
+    def _incr(self, name: str):
+        self._stats[name] += 1
+        mako_template_cache.labels(name).inc()
+
+    def get_or_compile(self, content: str) -> Template:
+        digest = self.digest(content)
+        with self._lock:
+            template = self._templates.get(digest)
+            if template is not None:
+                self._templates.move_to_end(digest)
+                self._incr("hits")
+                return template
+            self._incr("misses")
+
+        # 编译放在锁外，避免阻塞其它线程的命中查询
+        template = Template(content, uri=self.uri(digest))
+
+        with self._lock:
+            self._templates[digest] = template
+            self._templates.move_to_end(digest)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+                self._incr("evictions")
+        return template
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._templates), max_size=self.max_size)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
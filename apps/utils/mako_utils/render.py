@@ -9,27 +9,25 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 See the License for the specific language governing permissions and limitations under the License.
 """
 
+from django.conf import settings
 from django.utils.translation import ugettext as _
 from mako.exceptions import MakoException, RichTraceback
 from mako.template import Template
 
 from apps.gsekit.configfile.exceptions import ConfigVersionRenderException
+from apps.utils.mako_utils.cache import TemplateCache
 from apps.utils.mako_utils.checker import clean_mako_content
 from apps.utils.mako_utils.context import MakoSandbox
 from common.log import logger
 
-TEMPLATE_CACHE = {}
+TEMPLATE_CACHE = TemplateCache(max_size=settings.MAKO_TEMPLATE_CACHE_MAX_SIZE)
 
 
 def get_cache_template(content: str) -> Template:
     content = clean_mako_content(content)
 
     # 缓存template，避免重复构造耗时
-    template = TEMPLATE_CACHE.get(content)
-    if not template:
-        template = Template(content)
-        TEMPLATE_CACHE[content] = template
-    return template
+    return TEMPLATE_CACHE.get_or_compile(content)
 
 
 def mako_render(content, context):
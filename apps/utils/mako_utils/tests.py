@@ -11,6 +11,7 @@ See the License for the specific language governing permissions and limitations
 
 from django.test import TestCase
 
+from .cache import TemplateCache
 from .exceptions import ForbiddenMakoTemplateException
 from .visitor import MakoNodeVisitor
 from .checker import check_mako_template_safety
@@ -113,3 +114,23 @@ class TestMakoUtils(TestCase):
             """,
             expect_safe=True,
         )
+
+
+class TestTemplateCache(TestCase):
+    def test_lru_eviction(self):
+        template_cache = TemplateCache(max_size=2)
+        for content in ["${a}", "${b}", "${a}", "${c}"]:
+            template_cache.get_or_compile(content)
+        stats = template_cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 2)
+
+    def test_process_local(self):
+        # 编译结果仅缓存在进程内，新的缓存实例（如其它 worker）需按模板内容重新编译
+        TemplateCache().get_or_compile("${a + 1}")
+        template_cache = TemplateCache()
+        template = template_cache.get_or_compile("${a + 1}")
+        self.assertEqual(template.render(a=1), "2")
+        self.assertEqual(template_cache.stats()["misses"], 1)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import asyncio
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from django.conf import settings
+
+from common.log import logger
+
+
+class PollTask(object):
+    def __init__(self, key: Hashable, poll: Callable[[], bool], start: Optional[Callable[[], Any]] = None):
+        """
+        :param key: 任务标识
+        :param poll: 查询一次任务结果，返回任务是否结束
+        :param start: 提交任务，在首次轮询前执行，可选
+        """
+        self.key = key
+        self.poll = poll
+        self.start = start
+
+
+class AsyncPoller(object):
+    """
+    基于 asyncio 的多任务轮询器
+    所有任务在同一个事件循环中复用，等待间隔不占用线程，仅在调用阻塞接口时借用线程池中的线程
+    轮询间隔从 min_interval 开始按 backoff_factor 指数增长，至多为 max_interval
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60,
+        min_interval: float = 0.5,
+        max_interval: float = 5,
+        backoff_factor: float = 1.5,
+        max_workers: int = None,
+    ):
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.max_workers = max_workers or settings.CONCURRENT_NUMBER
+        self.tasks: Dict[Hashable, PollTask] = {}
+
+    def add(self, key: Hashable, poll: Callable[[], bool], start: Optional[Callable[[], Any]] = None):
+        if key in self.tasks:
+            raise ValueError(f"poll task key: {key} is duplicate.")
+        self.tasks[key] = PollTask(key=key, poll=poll, start=start)
+
+    async def _run_task(self, executor: ThreadPoolExecutor, task: PollTask) -> bool:
+        loop = asyncio.get_event_loop()
+        begin_time = loop.time()
+        if task.start is not None:
+            try:
+                await loop.run_in_executor(executor, task.start)
+            except Exception as error:
+                logger.exception(f"[AsyncPoller] start task -> {task.key} failed: {error}")
+                return False
+
+        interval = self.min_interval
+        while True:
+            try:
+                is_finished = await loop.run_in_executor(executor, task.poll)
+            except Exception as error:
+                logger.error(f"[AsyncPoller] poll task -> {task.key} failed: {error}")
+                is_finished = False
+
+            if is_finished:
+                return True
+            if loop.time() - begin_time + interval > self.timeout:
+                logger.error(f"[AsyncPoller] poll task -> {task.key} timeout after {self.timeout}s")
+                return False
+            await asyncio.sleep(interval)
+            interval = min(interval * self.backoff_factor, self.max_interval)
+
+    async def _run(self) -> Dict[Hashable, bool]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = await asyncio.gather(*[self._run_task(executor, task) for task in self.tasks.values()])
+        return dict(zip(self.tasks.keys(), results))
+
+    def run(self) -> Dict[Hashable, bool]:
+        """
+        执行全部轮询任务，阻塞至所有任务结束或超时
+        :return: {key: 是否在超时前结束}
+        """
+        if not self.tasks:
+            return {}
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self._run())
+        finally:
+            loop.close()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸 (Blueking) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and limitations under the License.
+"""
+import random
+import threading
+import time
+
+from django.test import TestCase, override_settings
+
+from apps.exceptions import ApiRequestError, ApiResultError
+from apps.utils.batch_request import batch_request_iterator, request_page
+from apps.utils.poller import AsyncPoller
+
+
+class MockPageApi(object):
+    """按 page 参数返回 [start, start + limit) 的分页接口，请求耗时随机，模拟分页乱序完成"""
+
+    def __init__(self, count: int, failed_starts=None):
+        self.count = count
+        # 请求失败的分页：{start: 剩余失败次数}
+        self.failed_starts = dict(failed_starts or {})
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, params):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(random.random() * 0.01)
+        with self._lock:
+            self.in_flight -= 1
+        start, limit = params["page"]["start"], params["page"]["limit"]
+        with self._lock:
+            if self.failed_starts.get(start):
+                self.failed_starts[start] -= 1
+                raise ApiRequestError("connection reset")
+        return {"count": self.count, "info": list(range(start, min(start + limit, self.count)))}
+
+
+class FakeChecker(object):
+    """第 finished_at 次轮询时结束，failed_polls 中的轮询次数抛出异常，finished_at 为 None 时始终不结束"""
+
+    def __init__(self, finished_at=1, failed_polls=(), start_error: Exception = None):
+        self.finished_at = finished_at
+        self.failed_polls = set(failed_polls)
+        self.start_error = start_error
+        self.calls = []
+
+    def start(self):
+        self.calls.append("start")
+        if self.start_error:
+            raise self.start_error
+
+    def poll(self) -> bool:
+        self.calls.append("poll")
+        poll_times = self.calls.count("poll")
+        if poll_times in self.failed_polls:
+            raise ApiRequestError("connection reset")
+        return self.finished_at is not None and poll_times >= self.finished_at
+
+
+@override_settings(CONCURRENT_NUMBER=4)
+class TestAsyncPoller(TestCase):
+    def make_poller(self, timeout: float = 1) -> AsyncPoller:
+        return AsyncPoller(timeout=timeout, min_interval=0.01, max_interval=0.05)
+
+    def test_start(self):
+        poller = self.make_poller()
+        checkers = {"with_start": FakeChecker(finished_at=2), "without_start": FakeChecker(finished_at=1)}
+        poller.add("with_start", checkers["with_start"].poll, start=checkers["with_start"].start)
+        poller.add("without_start", checkers["without_start"].poll)
+        self.assertEqual(poller.run(), {"with_start": True, "without_start": True})
+        # 各任务的 start 仅执行一次，且在首次轮询前执行
+        self.assertEqual(checkers["with_start"].calls, ["start", "poll", "poll"])
+        self.assertEqual(checkers["without_start"].calls, ["poll"])
+
+    def test_start_failed(self):
+        poller = self.make_poller()
+        checker = FakeChecker(start_error=ApiResultError("submit failed"))
+        poller.add("task", checker.poll, start=checker.start)
+        # 提交失败的任务直接结束，不再轮询
+        self.assertEqual(poller.run(), {"task": False})
+        self.assertEqual(checker.calls, ["start"])
+
+    def test_poll_raise(self):
+        poller = self.make_poller()
+        checker = FakeChecker(finished_at=3, failed_polls=[1, 2])
+        poller.add("task", checker.poll)
+        # 轮询异常视为未结束，继续轮询
+        self.assertEqual(poller.run(), {"task": True})
+        self.assertEqual(checker.calls.count("poll"), 3)
+
+    def test_timeout(self):
+        poller = self.make_poller(timeout=0.2)
+        unfinished_checker, finished_checker = FakeChecker(finished_at=None), FakeChecker(finished_at=1)
+        poller.add("unfinished", unfinished_checker.poll)
+        poller.add("finished", finished_checker.poll)
+        begin_time = time.time()
+        self.assertEqual(poller.run(), {"unfinished": False, "finished": True})
+        # 超时的任务不影响其它任务结果，且在超时时间内返回
+        self.assertLess(time.time() - begin_time, 0.5)
+        self.assertGreater(unfinished_checker.calls.count("poll"), 1)
+
+
+@override_settings(BATCH_REQUEST_PAGE_MAX_RETRIES=1, BATCH_REQUEST_PAGE_RETRY_INTERVAL=0)
+class TestBatchRequest(TestCase):
+    def test_batch_request_iterator(self):
+        api = MockPageApi(count=1050)
+        pages = list(batch_request_iterator(api, {}, limit=100, max_workers=3))
+        # 按分页顺序逐页返回
+        self.assertEqual([len(page) for page in pages], [100] * 10 + [50])
+        self.assertEqual(sum(pages, []), list(range(1050)))
+        # 在途分页不超过并发数
+        self.assertLessEqual(api.max_in_flight, 3)
+
+    def test_request_page_retry(self):
+        # 网络异常重试后成功
+        api = MockPageApi(count=10, failed_starts={0: 1})
+        self.assertEqual(request_page(api, {"page": {"start": 0, "limit": 10}})["info"], list(range(10)))
+
+        # 重试耗尽
+        api = MockPageApi(count=10, failed_starts={0: 2})
+        with self.assertRaises(ApiRequestError):
+            request_page(api, {"page": {"start": 0, "limit": 10}})
+
+        # 权限、参数等错误不重试
+        calls = []
+
+        def no_permission_api(params):
+            calls.append(params)
+            raise ApiResultError("no permission", code=9900403)
+
+        with self.assertRaises(ApiResultError):
+            request_page(no_permission_api, {"page": {"start": 0, "limit": 10}})
+        self.assertEqual(len(calls), 1)
+
+    def test_batch_request_iterator_resume(self):
+        api = MockPageApi(count=1050, failed_starts={500: 2})
+        pages = []
+        with self.assertRaises(ApiRequestError):
+            for page in batch_request_iterator(api, {}, limit=100, max_workers=3):
+                pages.append(page)
+        self.assertEqual(len(pages), 5)
+
+        # 从最后成功的位置续传
+        pages.extend(batch_request_iterator(api, {}, limit=100, max_workers=3, start=len(pages) * 100))
+        self.assertEqual(sum(pages, []), list(range(1050)))
@@ -261,6 +261,50 @@ CACHES["default"] = {
     "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_FREQUENCY": 10},
 }
 
+# mako 编译模板进程内 LRU 容量
+MAKO_TEMPLATE_CACHE_MAX_SIZE = get_type_env("BKAPP_MAKO_TEMPLATE_CACHE_MAX_SIZE", _type=int, default=2048)
+
+# 配置生成的渲染进程数，小于等于 1 时在当前进程中顺序渲染；多线程 worker 中不会 fork，始终顺序渲染
+CONFIG_GENERATE_PROCESSES = get_type_env("BKAPP_CONFIG_GENERATE_PROCESSES", _type=int, default=0)
+# 配置生成的渲染分片大小，任务数超过该值才会使用进程池
+CONFIG_GENERATE_SHARD_SIZE = get_type_env("BKAPP_CONFIG_GENERATE_SHARD_SIZE", _type=int, default=50)
+# 配置下发时，将同一主机同一路径下的多个配置文件打包到一个作业中
+CONFIG_RELEASE_PACK_FILES_BY_HOST = get_type_env("BKAPP_CONFIG_RELEASE_PACK_FILES_BY_HOST", _type=bool, default=True)
+
+# 组件 API 连接池：缓存的 host 连接池数量及单个 host 的最大长连接数
+API_HTTP_POOL_CONNECTIONS = get_type_env("BKAPP_API_HTTP_POOL_CONNECTIONS", _type=int, default=10)
+API_HTTP_POOL_MAXSIZE = get_type_env("BKAPP_API_HTTP_POOL_MAXSIZE", _type=int, default=50)
+# 组件 API 连接失败及网关错误的重试次数与退避系数
+API_HTTP_MAX_RETRIES = get_type_env("BKAPP_API_HTTP_MAX_RETRIES", _type=int, default=3)
+API_HTTP_RETRY_BACKOFF_FACTOR = get_type_env("BKAPP_API_HTTP_RETRY_BACKOFF_FACTOR", _type=float, default=0.2)
+
+# 组件 API 令牌桶限速后端：local 为进程内限速，cache 通过 Django 缓存在 worker 间共享预算（仅缓存后端为 Redis 时生效）
+API_RATE_LIMIT_BACKEND = get_type_env("BKAPP_API_RATE_LIMIT_BACKEND", _type=str, default="local")
+# 获取令牌的最长等待时间（秒），超时后直接放行，由 ESB 频率限制兜底
+API_RATE_LIMIT_MAX_WAIT = get_type_env("BKAPP_API_RATE_LIMIT_MAX_WAIT", _type=float, default=60)
+# 触发 ESB 频率限制后，对应令牌桶的冷却时间（秒）
+API_RATE_LIMIT_COOLDOWN = get_type_env("BKAPP_API_RATE_LIMIT_COOLDOWN", _type=float, default=1)
+# 作业平台、管控平台单个 API 及单个业务下单个 API 的每秒请求预算，0 表示不限速
+JOB_API_RATE_LIMIT = get_type_env("BKAPP_JOB_API_RATE_LIMIT", _type=int, default=50)
+JOB_API_BIZ_RATE_LIMIT = get_type_env("BKAPP_JOB_API_BIZ_RATE_LIMIT", _type=int, default=20)
+GSE_API_RATE_LIMIT = get_type_env("BKAPP_GSE_API_RATE_LIMIT", _type=int, default=50)
+GSE_API_BIZ_RATE_LIMIT = get_type_env("BKAPP_GSE_API_BIZ_RATE_LIMIT", _type=int, default=20)
+# 服务模板差异检查接口的每秒请求预算
+CC_SERVICE_TEMPLATE_DIFFERENCE_RATE_LIMIT = get_type_env(
+    "BKAPP_CC_SERVICE_TEMPLATE_DIFFERENCE_RATE_LIMIT", _type=int, default=30
+)
+
+# 分页请求中单页因网络异常、频率限制失败的重试次数及首次重试间隔（秒），重试间隔按指数增长
+# DataAPI 及连接池已有重试，此处仅兜底，避免重试次数层层叠加
+BATCH_REQUEST_PAGE_MAX_RETRIES = get_type_env("BKAPP_BATCH_REQUEST_PAGE_MAX_RETRIES", _type=int, default=1)
+BATCH_REQUEST_PAGE_RETRY_INTERVAL = get_type_env("BKAPP_BATCH_REQUEST_PAGE_RETRY_INTERVAL", _type=float, default=1)
+
+# 进程同步分片：业务进程数超过分片大小时按模块拆分为多个分片并行同步，分片数不超过上限
+PROCESS_SYNC_SHARD_SIZE = get_type_env("BKAPP_PROCESS_SYNC_SHARD_SIZE", _type=int, default=5000)
+PROCESS_SYNC_MAX_SHARDS = get_type_env("BKAPP_PROCESS_SYNC_MAX_SHARDS", _type=int, default=10)
+# 单次进程同步的最长持有时间（秒），超时未结束的同步不再阻塞下一轮
+PROCESS_SYNC_RUN_TIMEOUT = get_type_env("BKAPP_PROCESS_SYNC_RUN_TIMEOUT", _type=int, default=30 * 60)
+
 # 设置DB连接超时时间，配合django_dbconn_retry，解决因DB不稳定导致的各种问题，如：
 # 1. 接口偶现超时 2. pipeline任务执行偶现不执行 等问题
 MAX_DBCONN_RETRY_TIMES = 100